@@ -23,6 +23,42 @@ var updateTurnCount = function (inc = 1) {
     $("#turn-count").text("Turn Count: " + turn_count);
 }
 
+// Images are encoded with the server's display codec profile
+var imageMime = function (response) {
+    return response["mime"] || "image/png";
+}
+
+// Full resolution (height, width), the displayed image may be a preview
+var imageShape = null;
+var fullImageUrl = "";
+
+// Shows the preview, then swaps in the full resolution image once loaded
+var showImage = function (response) {
+    $("#image").attr("src", "data:" + imageMime(response) + ";base64," + response["b64_img_str"]);
+    imageShape = response["image_shape"] && response["image_shape"].length ? response["image_shape"] : null;
+    fullImageUrl = response["full_img_url"] || "";
+    if (fullImageUrl) {
+        var url = fullImageUrl;
+        var full = new Image();
+        full.onload = function () {
+            // A later response may have replaced the image meanwhile
+            if (url === fullImageUrl) {
+                $("#image").attr("src", url);
+            }
+        };
+        full.src = url;
+    }
+}
+
+// Scale from displayed image pixels to full resolution pixels
+var imageScale = function () {
+    var i = $("#image").get(0);
+    if (imageShape == null || !i.naturalHeight) {
+        return [1, 1];
+    }
+    return [imageShape[0] / i.naturalHeight, imageShape[1] / i.naturalWidth];
+}
+
 var submitRequest = function (user_utterance) {
 
     var data = {}
@@ -47,7 +83,13 @@ var submitRequest = function (user_utterance) {
 
     if ($("#object_mask_str_mode").is(":checked")) {
         if (bb_cors != null) {
-            data["object_mask_str"] = JSON.stringify(bb_cors);
+            var scale = imageScale();
+            data["object_mask_str"] = JSON.stringify({
+                "top": Math.round(bb_cors["top"] * scale[0]),
+                "left": Math.round(bb_cors["left"] * scale[1]),
+                "height": Math.round(bb_cors["height"] * scale[0]),
+                "width": Math.round(bb_cors["width"] * scale[1])
+            });
             editor.clear_all();
         }
         $("#object_mask_str_mode").prop("checked", false);
@@ -61,7 +103,7 @@ var submitRequest = function (user_utterance) {
 
     toggleLoading(true);
     $.post(stepUrl, data, function (response) {
-        $("#image").attr("src", "data:image/png;base64," + response["b64_img_str"]);
+        showImage(response);
 
         var sys_utt = response["system_utterance"];
         var last_execute_result = response["last_execute_result"];
@@ -93,8 +135,7 @@ var sampleGoal = function (goal_idx = -1) {
     }
     toggleLoading(true);
     $.post(sampleUrl, data, function (response) {
-        var b64_img_str = response["b64_img_str"];
-        $("#image").attr("src", "data:image/png;base64," + b64_img_str);
+        showImage(response);
 
         var goal = response["goal"];
         var object_mask_img_str = goal["object_mask_img_str"];
@@ -121,7 +162,7 @@ var submitReset = function () {
     toggleLoading(true);
     $.post(resetUrl, data, function (response) {
         console.log("reset");
-        $("#image").attr("src", "data:image/png;base64," + response["b64_img_str"]);
+        showImage(response);
         $("#system_utterance").text(response["system_utterance"])
         updateTurnCount(-turn_count);
     }).always(function () {
@@ -192,8 +233,9 @@ $(document).ready(function () {
             client_ycor = (event.pageX - offsetLeft);
             client_xcor = (event.pageY - offsetTop);
             console.log("Client X Coordinate: " + client_xcor + ", Y Coordinate: " + client_ycor);
-            xcor = Math.round(client_xcor * naturalHeight / clientHeight);
-            ycor = Math.round(client_ycor * naturalWidth / clientWidth);
+            var scale = imageScale();
+            xcor = Math.round(client_xcor * naturalHeight * scale[0] / clientHeight);
+            ycor = Math.round(client_ycor * naturalWidth * scale[1] / clientWidth);
             console.log("X Coordinate: " + xcor + ", Y Coordinate: " + ycor);
         } else {
             xcor = -1;
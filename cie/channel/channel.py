@@ -163,7 +163,7 @@ class MultimodalChannel(object):
                             "object_mask_str", "gesture_click",
                             "original_b64_img_str"
                     ]:
-                        slot_msg = slot["slot"] + "=" + slot["value"][:5]
+                        slot_msg = slot["slot"] + "=" + str(slot["value"])[:5]
                     elif slot["slot"] == "mask_strs":
                         slot_msg = slot["slot"] + "=" + len(slot["value"])
                     else:
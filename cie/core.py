@@ -204,6 +204,9 @@ class PhotoshopAct:
 
     ADJUST = "adjust"
     ADJUST_COLOR = "adjust_color"
+    FILTER = "filter"
+    CROP = "crop"
+    ROTATE = "rotate"
 
     @staticmethod
     def control_acts():
@@ -216,4 +219,7 @@ class PhotoshopAct:
 
     @staticmethod
     def edit_acts():
-        return [PhotoshopAct.ADJUST, PhotoshopAct.ADJUST_COLOR]
+        return [
+            PhotoshopAct.ADJUST, PhotoshopAct.ADJUST_COLOR,
+            PhotoshopAct.FILTER, PhotoshopAct.CROP, PhotoshopAct.ROTATE
+        ]
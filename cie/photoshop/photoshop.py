@@ -1,13 +1,11 @@
-import json
 import logging
 import os
-import requests
-from urllib.parse import urljoin
 
 from .sps import SimplePhotoshop
+from .transport import HTTPTransport, SharedMemoryTransport
 
 from ..core import SystemAct, PhotoshopAct
-from ..util import find_slot_with_key, img_to_b64, build_slot_dict, slots_to_args, imread
+from ..util import find_slot_with_key, build_slot_dict, build_lazy_slot_dict, slots_to_args, imread, to_mask, region_from_json, blob_store, is_blob_ref
 
 logger = logging.getLogger(__name__)
 
@@ -22,9 +20,15 @@ def PhotoshopPortal(photoshop_config):
         return SuperficialPhotoshopAgent()
     elif photoshop_type == "SimplePhotoshop":
         if not use_client:
-            return SimplePhotoshopAgent()
+            return SimplePhotoshopAgent(
+                tiles=photoshop_config.get("tiles", {}),
+                history=photoshop_config.get("history", {}),
+                hsv_buffer=photoshop_config.get("hsv_buffer", False))
         else:
-            return SimplePhotoshopClient(uri)
+            return SimplePhotoshopClient(
+                uri, photoshop_config.get("shm_address"),
+                shm_authkey=photoshop_config.get("shm_authkey"),
+                http=photoshop_config.get("http", {}))
     else:
         raise NotImplementedError
 
@@ -39,6 +43,9 @@ class SuperficialPhotoshopAgent(object):
         self.action_slot_dict = {
             "open": ["image_path"],
             "adjust": ["object_mask_str", "attribute", "adjust_value"],
+            "filter": ["filter_type"],
+            "crop": ["object_mask_str"],
+            "rotate": ["degree"],
             "redo": [],
             "close": [],
             "undo": []
@@ -108,7 +115,7 @@ class SuperficialPhotoshopAgent(object):
     def act_execute(self, intent, slots):
 
         execute_result = True
-        if intent in ["open", "adjust"]:
+        if intent in ["open", "adjust", "filter", "crop", "rotate"]:
             required_slot_names = self.action_slot_dict[intent]
             for slot_name in required_slot_names:
                 s = find_slot_with_key(slot_name, slots)
@@ -116,8 +123,8 @@ class SuperficialPhotoshopAgent(object):
                     execute_result = False
                     break
 
-            # Needs to open an image before adjusting
-            if intent == "adjust" and self.original_b64_img_str is None:
+            # Needs to open an image before editing
+            if intent != "open" and self.original_b64_img_str is None:
                 execute_result = False
 
             if intent == "open" and execute_result:
@@ -126,8 +133,7 @@ class SuperficialPhotoshopAgent(object):
                 if not os.path.exists(image_path):
                     raise ValueError
                 image = imread(image_path)
-                b64_img_str = img_to_b64(image)
-                self.original_b64_img_str = b64_img_str
+                self.original_b64_img_str = blob_store.put_image(image)
 
             if execute_result:
                 self.ptr += 1
@@ -156,18 +162,18 @@ class SimplePhotoshopAgent(SimplePhotoshop):
     An agent that loads SimplePhotoshop directly
     """
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         """
         Calls parent class for initialization
         """
-        super(SimplePhotoshopAgent, self).__init__()
+        super(SimplePhotoshopAgent, self).__init__(**kwargs)
 
     def reset(self):
         """
         Reset
         """
         self.observation = {}
-        self.masks.clear()
+        self.masks = list()
         self.last_execute_result = False
         self.last_execute_message = ""
 
@@ -224,38 +230,45 @@ class SimplePhotoshopAgent(SimplePhotoshop):
     def act_inform(self):
         """
         Informs the user, basically what the user sees.
+        Images are passed as blob_store handles
+        original_b64_img_str
         b64_img_str
         masked_b64_img_str
-        mask_strs 
+        mask_strs: list of (mask_idx, Region)
+        Image slots are lazy and cached per image & mask version,
+        so turns without edits don't re-render or re-intern anything
         """
         # Get slots
         ps_act = {}
         slots = []
-        if self.get_image(False) is None:
-            original_b64_img_str = ""
-            b64_img_str = ""
-            masked_b64_img_str = ""
-
-        else:
-            original_image = self.background
-            original_b64_img_str = img_to_b64(original_image)
-
-            image = self.get_image(False)
-            b64_img_str = img_to_b64(image)
-
-            masked_image = self.get_image(True)
-            masked_b64_img_str = img_to_b64(masked_image)
 
-        original_b64_img_str_slot = build_slot_dict('original_b64_img_str',
-                                                    original_b64_img_str, 1.0)
-        b64_img_str_slot = build_slot_dict('b64_img_str', b64_img_str, 1.0)
-        masked_b64_img_str_slot = build_slot_dict('masked_b64_img_str',
-                                                  masked_b64_img_str, 1.0)
-
-        mask_strs = []
-        for mask_idx, mask in self.get_masks():
-            mask_str = img_to_b64(mask)
-            mask_strs.append((mask_idx, mask_str))
+        # Snapshot current versions, slots may be read after later edits
+        # Parametric layers are only rendered if an image slot is read
+        background, img_fn, masks = self.background, self.image_fn(), \
+            self.get_masks()
+        background_version = self.background_version
+        img_version = self.img_version
+        masked_version = (self.img_version, self.masks_version)
+
+        def intern(name, version, image_fn):
+            if background is None:
+                return lambda: ""
+            return lambda: self.get_cached(
+                name, version, lambda: blob_store.put_image(image_fn()))
+
+        original_b64_img_str_slot = build_lazy_slot_dict(
+            'original_b64_img_str',
+            intern('original_handle', background_version, lambda: background),
+            1.0)
+        b64_img_str_slot = build_lazy_slot_dict(
+            'b64_img_str', intern('image_handle', img_version, img_fn), 1.0)
+        masked_b64_img_str_slot = build_lazy_slot_dict(
+            'masked_b64_img_str',
+            intern('masked_image_handle', masked_version,
+                   lambda: self.get_overlay(img_fn(), masks, masked_version)),
+            1.0)
+
+        mask_strs = list(masks)
 
         mask_strs_slot = build_slot_dict('mask_strs', mask_strs, 1.0)
 
@@ -275,30 +288,76 @@ class SimplePhotoshopAgent(SimplePhotoshop):
 
         return ps_act
 
-    def to_json(self):
+    def to_json(self, blobs=None):
+        """
+        Args:
+            blobs (PersistentStore): images & masks are written once as
+                                     blobs and only referenced, see cie.util.persist
+        """
+        def encode_mask(mask):
+            if blobs is None:
+                return mask.to_json()
+            return blobs.put_json(mask.to_json())
+
         obj = {}
-        obj["history"] = self.history.to_json()
-        obj["masks"] = [[m_idx, img_to_b64(m)] for m_idx, m in self.masks]
+        history_version = (self.history.version, self.background_version,
+                           id(blobs))
+        obj["history"] = self.get_cached(
+            'history_json', history_version,
+            lambda: self.history.to_json(blobs))
+        obj["masks"] = self.get_cached(
+            'masks_json', (self.masks_version, id(blobs)),
+            lambda: [[m_idx, encode_mask(m)] for m_idx, m in self.masks])
         obj["state"] = self.state
         return obj
 
-    def from_json(self, obj):
-        self.history.from_json(obj["history"])
-        self.masks = obj["masks"]
+    def from_json(self, obj, blobs=None):
+        """
+        Args:
+            blobs (PersistentStore): resolves blob references
+        """
+        self.history.from_json(obj["history"], blobs)
+        masks = []
+        for m_idx, m in obj["masks"]:
+            if isinstance(m, dict):
+                mask = region_from_json(m)
+            elif is_blob_ref(m):
+                mask = region_from_json(blobs.get_json(m))
+            else:  # Legacy b64 mask string
+                mask = to_mask(m)
+            masks.append((m_idx, mask))
+        self.masks = masks
         self.state = obj["state"]
 
 
 class SimplePhotoshopClient(object):
     """
     Client interface to SimplePhotoshop
+    Uses shared memory if a SharedMemoryPhotoshopServer runs on this host,
+    HTTP otherwise
     """
 
-    def __init__(self, photoshop_uri):
+    def __init__(self, photoshop_uri, shm_address=None, shm_authkey=None,
+                 http={}):
         """
+        Args:
+            photoshop_uri (str): HTTP server
+            shm_address (str): unix socket of a SharedMemoryPhotoshopServer
+            shm_authkey (str): key of the socket, defaults to the
+                               CIE_PHOTOSHOP_AUTHKEY environment variable
+            http (dict): timeout, retries, backoff, pool_size & profile
+                         of HTTPTransport
         """
         # Configuration
         self.photoshop_uri = photoshop_uri
-        self.action_uri = urljoin(photoshop_uri, 'action')
+        self.http = HTTPTransport(photoshop_uri, **http)
+        self.transport = self.http
+        if shm_address is not None:
+            try:
+                self.transport = SharedMemoryTransport(shm_address, shm_authkey)
+            except (OSError, EOFError) as e:
+                logger.warning("Shared memory transport unavailable, "
+                               "using HTTP: {}".format(e))
 
         self.observation = {}
 
@@ -312,13 +371,40 @@ class SimplePhotoshopClient(object):
     def observe(self, observation):
         self.observation = observation
 
+    def batch(self, commands):
+        """
+        Executes commands and checks the images in one round trip,
+        falls back to HTTP if the shared memory server goes away
+        Args:
+            commands (list): list of (action, intent, args)
+        Returns:
+            img (str): image handle
+            masked_img (str)
+        """
+        try:
+            responses, img, masked_img = self.transport.batch(commands)
+        except (OSError, EOFError) as e:
+            if self.transport is self.http:
+                raise
+            logger.warning("Shared memory transport failed, "
+                           "using HTTP: {}".format(e))
+            self.transport = self.http
+            responses, img, masked_img = self.transport.batch(commands)
+        for (_, intent, _), response in zip(commands, responses):
+            if "error" in response:
+                logger.warning("{} failed: {}".format(intent,
+                                                      response["error"]))
+        return img, masked_img
+
     def act(self):
         """
-        POST load_mask_strs if any of photoshop actions belong to load_mask_strs
-        POST action if EXECUTE is observed
+        load_mask_strs if any of photoshop actions belong to load_mask_strs
+        action if EXECUTE is observed
+        Commands & the image check are sent as one batch
         """
         # Get all system actions
         system_acts = self.observation.get('system_acts', list())
+        commands = []
 
         for sys_act in system_acts:
             sys_dialogue_act = sys_act['dialogue_act']['value']
@@ -334,23 +420,19 @@ class SimplePhotoshopClient(object):
                         mask_str_slots.append(slot)
 
                 # Process mask_str_slot to SimplePhotoshop arg format
+                # Regions are encoded by the transport
                 mask_strs = []
                 for idx, mask_slot in enumerate(mask_str_slots):
-                    tup = (str(idx), mask_slot['value'])
+                    tup = (str(idx), to_mask(mask_slot['value']))
                     mask_strs.append(tup)
 
                 args = {}
                 args['mask_strs'] = mask_strs
 
-                data = {}
-                data['action'] = 'control'
-                data['intent'] = PhotoshopAct.LOAD_MASK_STRS
-                data['args'] = json.dumps(args)
-
-                logger.info("POST {} Number of masks {}".format(
+                logger.info("{} Number of masks {}".format(
                     PhotoshopAct.LOAD_MASK_STRS, len(mask_strs)))
-                res = requests.post(self.action_uri, data=data)
-                res.raise_for_status()
+                commands.append(
+                    ('control', PhotoshopAct.LOAD_MASK_STRS, args))
 
             # Execute actions
             if sys_dialogue_act == SystemAct.EXECUTE:
@@ -363,7 +445,7 @@ class SimplePhotoshopClient(object):
                 else:
                     action = "edit"
 
-                # Build data
+                # Build data, regions & image handles are encoded by the transport
                 args = {}
                 for slot in sys_act['slots']:
                     # Exclude mask_strs
@@ -372,24 +454,12 @@ class SimplePhotoshopClient(object):
                         slot_value = slot.get('value')
                         args[slot_name] = slot_value
 
-                data = {}
-                data['action'] = action
-                data['intent'] = intent
-                data['args'] = json.dumps(args)
-
                 # Execute action
-                logger.info("POST {}".format(intent))
-                res = requests.post(self.action_uri, data=data)
-                res.raise_for_status()
-
-        # Retrieve Image
-        data = {'action': 'control', 'intent': 'check', 'args': json.dumps({})}
-        res = requests.post(self.action_uri, data=data)
-        res.raise_for_status()
-        check_obj = res.json()
-
-        b64_img_str = check_obj.get("b64_img_str", "")
-        masked_b64_img_str = check_obj.get("masked_b64_img_str", "")
+                logger.info("{}".format(intent))
+                commands.append((action, intent, args))
+
+        # Execute & retrieve Image, interned as handles
+        b64_img_str, masked_b64_img_str = self.batch(commands)
 
         # Build return object
         photoshop_act = {}
@@ -18,6 +18,10 @@ class PSAct:
     class Edit:
         ADJUST = "adjust"
         ADJUST_COLOR = "adjust_color"
+        BATCH = "batch"
+        FILTER = "filter"
+        CROP = "crop"
+        ROTATE = "rotate"
 
 
 class PSArgs:
@@ -33,3 +37,7 @@ class PSArgs:
     ATTRIBUTE = "attribute"
     ADJUST_VALUE = "adjust_value"
     COLOR = "color"
+    EDITS = "edits"
+    FILTER_TYPE = "filter_type"
+    BBOX = "bbox"
+    DEGREE = "degree"
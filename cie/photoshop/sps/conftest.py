@@ -0,0 +1,44 @@
+"""
+    Images & selections shared by the photoshop tests
+"""
+import cv2
+import numpy as np
+import pytest
+
+from ...util import Mask
+
+
+def make_image(height=60, width=80, seed=0, smooth=False):
+    """
+    Args:
+        smooth (bool): interpolated colours instead of noise,
+                       so HSV edits mostly stay within the value range
+    Returns:
+        img (np.ndarray): RGB image
+    """
+    rng = np.random.RandomState(seed)
+    if not smooth:
+        return rng.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    img = rng.randint(30, 226, (6, 8, 3)).astype(np.uint8)
+    return cv2.resize(img, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def make_ellipse_mask(height=60, width=80):
+    """
+    Returns:
+        mask (Mask): centred ellipse, half the width & two thirds the height
+    """
+    arr = np.zeros((height, width), dtype=np.uint8)
+    cv2.ellipse(arr, (width // 2, height // 2), (width // 4, height // 3),
+                0, 0, 360, 1, -1)
+    return Mask.from_array(arr)
+
+
+@pytest.fixture
+def random_image():
+    return make_image
+
+
+@pytest.fixture
+def ellipse_mask():
+    return make_ellipse_mask
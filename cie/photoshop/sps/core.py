@@ -2,6 +2,7 @@ import copy
 from collections import defaultdict
 import itertools
 import json
+import logging
 import os
 
 import cv2
@@ -10,12 +11,17 @@ from skimage.measure import find_contours
 
 from .actions import PSAct, PSArgs
 from .cvengine import CVEngineClient
-from .edit import adjust, adjust_color
-from .history import EditHistory
+from .edit import adjust, adjust_color, adjust_batch, add_hsv_channel, HSV_CHANNELS
+from .edit import add_filter, filter_overlap, crop, crop_box, rotate
+from .history import make_history
+from .hsv import HSVRun
 from .selector import Selector
 from .state import object_state_factory
+from .tiles import TileScheduler
 from . import utils
 
+logger = logging.getLogger(__name__)
+
 
 class SimplePhotoshop(object):
     """
@@ -25,6 +31,14 @@ class SimplePhotoshop(object):
     """
 
     def __init__(self, **kwargs):
+        # Version counters, bumped whenever the attribute is reassigned
+        self.background_version = 0
+        self.img_version = 0
+        self.masks_version = 0
+
+        # Encoded values cached per version, name -> (version, value)
+        self._encoded = dict()
+
         # Background image
         self.background = None
         self.img = None
@@ -32,10 +46,30 @@ class SimplePhotoshop(object):
         # CVEngineClient
         self.cvengine = CVEngineClient()
 
-        # List of tuples: [(noun1, mask1), (noun2, mask2)...]
+        # List of tuples: [(noun1, Region1), (noun2, Region2)...]
         self.masks = list()
 
-        self.history = EditHistory()
+        # num_threads, min_pixels & min_rows, see TileScheduler.
+        # Not tiled unless num_threads is configured
+        self.tiles = TileScheduler(**kwargs.get("tiles", {}))
+
+        # mode, keyframe_interval, max_bytes & cache_frames, see make_history
+        self.history = make_history(replay=self.replay_edit,
+                                    **kwargs.get("history", {}))
+
+        # Keep an HSV working image for hue, saturation & lightness edits,
+        # see execute_hsv. Runs of HSV edits don't drift, and are only
+        # converted back to RGB when read.
+        # Replayed edits must give the stored pixels,
+        # so only the delta history is supported.
+        self.hsv_buffer = kwargs.get("hsv_buffer", False)
+        if self.hsv_buffer and \
+                kwargs.get("history", {}).get("mode", "delta") != "delta":
+            raise ValueError("hsv_buffer needs the delta history")
+        self._hsv = None
+
+        # Output buffer reused by edits of a region of interest, see scratch
+        self._scratch = None
 
         # User and dialogue manager sees this
         self.state = defaultdict(lambda: object_state_factory())
@@ -47,10 +81,88 @@ class SimplePhotoshop(object):
         """Resets the image, history and state
         """
         self.background = self.img = None
-        self.masks.clear()
+        self.masks = list()
         self.history.reset()
         self.state.clear()
 
+    @property
+    def background(self):
+        return self._background
+
+    @background.setter
+    def background(self, background):
+        self._background = background
+        self.background_version += 1
+
+    @property
+    def img(self):
+        if self._img is None and self._render is not None:
+            self._img = self._render()
+            self._render = None
+        return self._img
+
+    @img.setter
+    def img(self, img):
+        """
+        Args:
+            img (np.ndarray | function): image, or a function rendering it
+                                         the first time it is read
+        """
+        if callable(img):
+            self._img, self._render = None, img
+        else:
+            self._img, self._render = img, None
+        self._hsv = None  # Ends the HSVRun, see execute_hsv
+        self.img_version += 1
+
+    def image_fn(self):
+        """Function returning the current image, without rendering it now
+        """
+        if self._img is None and self._render is not None:
+            return self._render
+        img = self._img
+        return lambda: img
+
+    @property
+    def masks(self):
+        """
+        Reassign instead of mutating in place, so that masks_version is bumped
+        """
+        return self._masks
+
+    @masks.setter
+    def masks(self, masks):
+        # Masks of the same content, e.g. restored by from_json on each
+        # request, keep their version and the images cached for it
+        previous = getattr(self, '_masks', None)
+        self._masks = masks
+        if previous is None or \
+                [tuple(mask) for mask in masks] != \
+                [tuple(mask) for mask in previous]:
+            self.masks_version += 1
+
+    def get_cached(self, name, version, compute):
+        """
+        Caches encoded images & masks until their version changes
+        Args:
+            name (str): cache entry
+            version: versions the value depends on
+            compute (function): computes the value if stale
+        Returns:
+            value
+        """
+        cached = self._encoded.get(name)
+        if cached is None or cached[0] != version:
+            cached = (version, compute())
+            self._encoded[name] = cached
+        return cached[1]
+
+    def get_b64_img(self):
+        """Base64 PNG of the current image for external services
+        """
+        return self.get_cached('b64_img', self.img_version,
+                               lambda: utils.img_to_b64(self.img))
+
     def get_state(self):
         """Returns photoshop state, see state.py for more details
         """
@@ -59,15 +171,59 @@ class SimplePhotoshop(object):
     def get_image(self, plot_mask=True):
         """Returns image with selection mask & id if present
         """
-        img = self.img
+        if plot_mask:
+            version = (self.img_version, self.masks_version)
+            return self.get_overlay(self.img, self.get_masks(), version)
+        return self.img
+
+    def get_overlay(self, img, masks, version):
+        """Image with mask contours, cached per image & mask version
+        Args:
+            img (np.ndarray)
+            masks (list): list of (mask_id, Region)
+            version (tuple): (img_version, masks_version) of img & masks
+        """
+        return self.get_cached('overlay', version,
+                               lambda: self.draw_masks(img, masks))
 
-        if plot_mask and len(self.get_masks()) > 0:
-            masks = self.get_masks()
-            colors = utils.random_colors(len(masks))
-            for (mask_id, mask), color in zip(masks, colors):
-                img = Selector.apply_polygon(img, mask, color)
-                #img = Selector.apply_caption(img, mask, str(mask_id), color)
-        return img
+    @staticmethod
+    def draw_masks(img, masks):
+        """Draws mask contours on top of img
+        Args:
+            img (np.ndarray)
+            masks (list): list of (mask_id, Region)
+        """
+        if img is None or len(masks) == 0:
+            return img
+        colors = utils.random_colors(len(masks))
+        regions = [mask for mask_id, mask in masks]
+        return Selector.apply_polygons(img, regions, colors)
+
+    def get_preview(self, max_side, plot_mask=True):
+        """Downscaled image for display, cached per image & mask version
+        Edits still apply to the full resolution image
+        Args:
+            max_side (int): longest side of the preview
+            plot_mask (bool)
+        """
+        img = self.get_image(plot_mask)
+        if img is None:
+            return None
+        version = (self.img_version, plot_mask and self.masks_version, max_side)
+        return self.get_cached('preview', version,
+                               lambda: utils.downscale(img, max_side))
+
+    def get_preview_b64(self, max_side, profile="png", plot_mask=True):
+        """Base64 of the preview encoded with the codec profile, "" if no image
+        """
+        if self.img is None:
+            return ""
+        version = (self.img_version, plot_mask and self.masks_version,
+                   max_side, profile)
+        return self.get_cached(
+            'preview_b64', version,
+            lambda: utils.img_to_b64(self.get_preview(max_side, plot_mask),
+                                     profile))
 
     def get_masks(self):
         return self.masks
@@ -129,7 +285,7 @@ class SimplePhotoshop(object):
     def control_load(self, arguments):
         try:
             b64_img_str = arguments.get(PSArgs.B64_IMG_STR)
-            img = utils.b64_to_img(b64_img_str)
+            img = utils.resolve_image(b64_img_str)  # handle or b64 str
             self.reset()
             self.history._background = self.background = self.img = img
             self.state['global'] = object_state_factory()
@@ -151,6 +307,7 @@ class SimplePhotoshop(object):
             msg = "Error occured when executing \"redo\": no next history"
             return False, msg
         (action_type, arguments), self.img = self.history.redo()
+        self.drop_stale_masks()
         return True, "success"
 
     def control_undo(self, arguments={}):
@@ -159,6 +316,7 @@ class SimplePhotoshop(object):
             msg = "Error occured when executing \"undo\": no previous history"
             return False, msg
         (action_type, arguments), self.img = self.history.undo()
+        self.drop_stale_masks()
         return True, "success"
 
     def control_select_object(self, arguments):
@@ -167,7 +325,7 @@ class SimplePhotoshop(object):
             noun = arguments.get('object')
             masks = []
 
-            mask_arrs = self.cvengine.select(self.img, noun)
+            mask_arrs = self.cvengine.select(self.get_b64_img(), noun)
 
             for mask_idx, mask in enumerate(mask_arrs, 0):
                 tup = (str(mask_idx), mask)
@@ -210,11 +368,11 @@ class SimplePhotoshop(object):
     def control_load_mask_strs(self, arguments):
         try:
             mask_strs = arguments.get(PSArgs.MASK_STRS,
-                                      list())  # list of b64_img_str
+                                      list())  # list of Region or b64_img_str
 
             masks = []
             for mask_idx, mask_str in mask_strs:
-                mask = utils.b64_to_img(mask_str)
+                mask = utils.to_mask(mask_str)
                 if not Selector.validate_mask(self, mask):
                     print("LOAD_MASK_STRS: Invalid mask!")
                     raise ValueError
@@ -229,9 +387,17 @@ class SimplePhotoshop(object):
         finally:
             return result, message
 
+    def drop_stale_masks(self):
+        """Deselects if undo or redo changed the image size, e.g. of a crop
+        The size comes from the history, parametric images aren't rendered
+        """
+        if len(self.masks) and \
+                tuple(self.masks[0][1].shape) != self.history.image_shape():
+            self.masks = list()
+
     def control_deselect(self, arguments={}):
         if len(self.masks):
-            self.masks.clear()
+            self.masks = list()
             return True, "success"
         else:
             return False, "failure"
@@ -246,6 +412,14 @@ class SimplePhotoshop(object):
         3. Update state
         4. Clear masks
         """
+        if edit_type == PSAct.Edit.CROP:
+            return self.execute_crop(arguments)
+        if self.history.parametric:
+            return self.execute_layer(edit_type, arguments)
+        if self.hsv_buffer and edit_type == PSAct.Edit.ADJUST and \
+                arguments.get(PSArgs.ATTRIBUTE) in HSV_CHANNELS:
+            return self.execute_hsv(arguments)
+
         # Edit the image w/o mask
         edited_img = self.edit(edit_type, arguments)
 
@@ -260,42 +434,283 @@ class SimplePhotoshop(object):
         if result is True:
             self.img = edited_img
             self.state_update(edit_type, arguments)
-            self.history.add(edit_type, arguments, self.img)
+            self.history.add(edit_type, arguments, self.img, self.masks)
             # self.masks.clear()
         return result, msg
 
+    def execute_hsv(self, arguments):
+        """
+        Adjusts hue, saturation or lightness on the HSV working image.
+        Runs of HSV edits convert RGB to HSV once, instead of a round trip
+        per edit that accumulates quantisation error.
+        The image & its history frame are converted back to RGB only when
+        read, e.g. by the next RGB edit, undo or saving the history.
+        Pixels outside of the run's selections are left untouched.
+        """
+        run = self._hsv
+        try:
+            attribute = arguments.get(PSArgs.ATTRIBUTE)
+            adjust_value = arguments.get(PSArgs.ADJUST_VALUE)
+            # Invalid edits fail on a single pixel, as they would on the image
+            add_hsv_channel(np.zeros((1, 1, 3), dtype=np.uint8), attribute,
+                            adjust_value)
+            if run is None:
+                img = self.img
+                if img is None:
+                    return False, "failure"
+                run = HSVRun(img, self.tiles)
+            selection = None
+            if len(self.masks):
+                _, inverse, bbox = Selector.get_selection(self, run.img.shape)
+                selection = (inverse, bbox)
+        except Exception as e:
+            logger.exception("Failed to adjust {}".format(arguments))
+            return False, "failure"
+
+        image_fn = run.add(attribute, adjust_value, selection)
+        self.img = image_fn
+        self._hsv = run
+        self.state_update(PSAct.Edit.ADJUST, arguments)
+        self.history.add(PSAct.Edit.ADJUST, arguments, image_fn, self.masks)
+        return True, "success"
+
+    def execute_crop(self, arguments):
+        """
+        Crops the image to the bbox argument, or to the selection.
+        The cropped image is a view of the previous image, no pixels are
+        copied. The selection is cropped alongside, so it can still be edited.
+        """
+        img = self.img
+        if img is None:
+            return False, "failure"
+        bbox = arguments.get(PSArgs.BBOX)
+        if bbox is None and len(self.masks):
+            bbox = Selector.get_selection(self)[2]
+        try:
+            bbox = crop_box(img.shape, bbox)
+        except Exception as e:
+            bbox = None
+        if bbox is None:
+            return False, "failure"
+
+        # Replays crop the recorded rectangle, whatever the selection
+        arguments = dict(arguments)
+        arguments[PSArgs.BBOX] = list(bbox)
+        top, left, bottom, right = bbox
+        masks = [(name, utils.to_mask(mask.crop(top, left, bottom, right)))
+                 for name, mask in self.masks]
+
+        self.state_update(PSAct.Edit.CROP, arguments)
+        if self.history.parametric:
+            self.history.add(PSAct.Edit.CROP, arguments, None, ())
+            self.img = self.history.image_fn()
+        else:
+            self.img = self.edit_img(PSAct.Edit.CROP, arguments, img)
+            self.history.add(PSAct.Edit.CROP, arguments, self.img, ())
+        self.masks = masks
+        return True, "success"
+
+    def execute_layer(self, edit_type, arguments):
+        """
+        Pushes the edit onto the parametric layer stack,
+        the image is only rendered when read
+        """
+        # Invalid edits fail on a single pixel, as they would on the image
+        probe = np.zeros((1, 1, 3), dtype=np.uint8)
+        if self.background is None or \
+                self.edit_tile(edit_type, arguments, probe) is None:
+            return False, "failure"
+
+        self.state_update(edit_type, arguments)
+        self.history.add(edit_type, arguments, None, self.masks)
+        self.img = self.history.image_fn()
+        return True, "success"
+
+    def execute_batch(self, edits, record="single"):
+        """
+        Executes several edits on the current selection
+        Args:
+            edits (list): list of (edit_type, arguments)
+            record (str): "single" fuses compatible consecutive edits
+                          and adds one history entry for the batch,
+                          "each" executes & records the edits one by one
+        Returns:
+            result (bool): True if all edits succeeded
+            msg (str)
+        """
+        if record == "each":
+            for edit_type, arguments in edits:
+                result, msg = self.execute(edit_type, arguments)
+                if not result:
+                    return result, msg
+            return True, "success"
+        elif record == "single":
+            if len(edits) == 0:
+                return False, "failure"
+            edits = [list(edit) for edit in edits]
+            return self.execute(PSAct.Edit.BATCH, {PSArgs.EDITS: edits})
+        else:
+            raise ValueError("Unknown record mode: {}".format(record))
+
     @Selector.mask_region
-    def edit(self, edit_type, arguments):
+    def edit(self, edit_type, arguments, img=None):
         """
         Args:
             edit_type (str)
             arguments (dict)
+            img (np.ndarray): image or region of interest to edit,
+                              defaults to the whole image
         Returns:
             result (bool)
             msg (str)
         """
+        if img is None:
+            return self.edit_img(edit_type, arguments, self.img)
+        # Region of interest, Selector copies the edited region out
+        return self.edit_img(edit_type, arguments, img,
+                             self.scratch(edit_type, img))
+
+    # Rows of context each edit reads around a pixel, see TileScheduler.run
+    # None if the edit needs the whole image
+    TILE_OVERLAP = {
+        PSAct.Edit.ADJUST: 0,
+        PSAct.Edit.ADJUST_COLOR: 0,
+        PSAct.Edit.BATCH: 0,
+        PSAct.Edit.CROP: None,
+        PSAct.Edit.ROTATE: None
+    }
+
+    # Edits writing into an output buffer, see scratch
+    SCRATCH_EDITS = (PSAct.Edit.ROTATE,)
+
+    def edit_overlap(self, edit_type, arguments):
+        """Pixels of context an edit reads around each pixel, see TILE_OVERLAP
+        """
+        if edit_type == PSAct.Edit.FILTER:
+            return filter_overlap(arguments.get(PSArgs.FILTER_TYPE))
+        return self.TILE_OVERLAP.get(edit_type)
+
+    def scratch(self, edit_type, img):
+        """
+        Output buffer for edits of a region of interest,
+        reused as long as the region keeps its shape.
+        Edited regions are only read while blending them into a new image,
+        images that are kept, e.g. by the history, are never scratch.
+        Returns:
+            dst (np.ndarray): None if the edit allocates its own output
+        """
+        if edit_type not in self.SCRATCH_EDITS:
+            return None
+        dst = self._scratch
+        if dst is None or dst.shape != img.shape or dst.dtype != img.dtype:
+            dst = self._scratch = np.empty_like(img)
+        return dst
+
+    def edit_img(self, edit_type, arguments, img, dst=None):
+        """
+        Edits img, ignoring the selection
+        Large images are edited in bands by the tile scheduler
+        Args:
+            dst (np.ndarray): output buffer, see scratch
+        Returns:
+            edited_img (np.ndarray): None on failure
+        """
+        overlap = self.edit_overlap(edit_type, arguments)
+        if overlap is not None:  # Bands can't share an output buffer
+            dst = None
+        return self.tiles.run(
+            img, lambda tile: self.edit_tile(edit_type, arguments, tile, dst),
+            overlap)
+
+    def edit_tile(self, edit_type, arguments, img, dst=None):
+        """
+        Edits a band of the image, or the whole image
+        Returns:
+            edited_img (np.ndarray): None on failure
+        """
         if edit_type == PSAct.Edit.ADJUST:
-            edited_img = self.edit_adjust(arguments)
+            edited_img = self.edit_adjust(arguments, img)
         elif edit_type == PSAct.Edit.ADJUST_COLOR:
-            edited_img = self.edit_adjust_color(arguments)
+            edited_img = self.edit_adjust_color(arguments, img)
+        elif edit_type == PSAct.Edit.BATCH:
+            edited_img = self.edit_batch(arguments, img)
+        elif edit_type == PSAct.Edit.FILTER:
+            edited_img = self.edit_filter(arguments, img)
+        elif edit_type == PSAct.Edit.CROP:
+            edited_img = self.edit_crop(arguments, img)
+        elif edit_type == PSAct.Edit.ROTATE:
+            edited_img = self.edit_rotate(arguments, img, dst)
         else:
             # print("Unknown edit_type: {}".format(edit_type))
             edited_img = None
         return edited_img
 
-    def edit_adjust(self, arguments):
+    def replay_edit(self, img, masks, edit_type, arguments):
+        """
+        Edits img with a recorded selection, as edit did on the photoshop
+        Args:
+            img (np.ndarray)
+            masks (list): list of (name, Region)
+        Returns:
+            edited_img (np.ndarray): None on failure
+        """
+        # Crops record their rectangle, not their selection
+        if len(masks) == 0 or edit_type == PSAct.Edit.CROP:
+            return self.edit_img(edit_type, arguments, img)
+
+        def edit_func(roi):
+            return self.edit_img(edit_type, arguments, roi,
+                                 self.scratch(edit_type, roi))
+        selection = Selector.composite([mask for _, mask in masks],
+                                       img.shape[:2])
+        margin = self.edit_overlap(edit_type, arguments) or 0
+        return Selector.edit_selection(img, selection, edit_func, margin)
+
+    def edit_adjust(self, arguments, img):
         try:
             attribute = arguments.get(PSArgs.ATTRIBUTE)
             adjust_value = arguments.get(PSArgs.ADJUST_VALUE)
-            edited_img = adjust(self.img, attribute, adjust_value)
+            edited_img = adjust(img, attribute, adjust_value)
         except Exception as e:
             edited_img = None
         return edited_img
 
-    def edit_adjust_color(self, arguments):
+    def edit_adjust_color(self, arguments, img):
         try:
             color = arguments.get(PSArgs.COLOR)
-            edited_img = adjust_color(self.img, color)
+            edited_img = adjust_color(img, color)
+        except Exception as e:
+            edited_img = None
+        return edited_img
+
+    def edit_batch(self, arguments, img):
+        try:
+            edits = arguments.get(PSArgs.EDITS)
+            edited_img = adjust_batch(img, edits)
+        except Exception as e:
+            edited_img = None
+        return edited_img
+
+    def edit_filter(self, arguments, img):
+        try:
+            filter_type = arguments.get(PSArgs.FILTER_TYPE)
+            edited_img = add_filter(img, filter_type)
+        except Exception as e:
+            edited_img = None
+        return edited_img
+
+    def edit_crop(self, arguments, img):
+        try:
+            top, left, bottom, right = arguments.get(PSArgs.BBOX)
+            edited_img = crop(img, top, bottom, left, right)
+        except Exception as e:
+            edited_img = None
+        return edited_img
+
+    def edit_rotate(self, arguments, img, dst=None):
+        try:
+            degree = float(arguments.get(PSArgs.DEGREE))
+            edited_img = rotate(img, degree, dst)
         except Exception as e:
             edited_img = None
         return edited_img
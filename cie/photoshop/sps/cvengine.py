@@ -2,7 +2,7 @@ from urllib.parse import urljoin
 
 import requests
 
-from .utils import img_to_b64, b64_to_img
+from .utils import to_mask
 
 
 class CVEngineClient(object):
@@ -11,16 +11,16 @@ class CVEngineClient(object):
         # Endpoints
         self.selection_uri = urljoin(uri, 'selection')
 
-    def select(self, img, noun):
+    def select(self, b64_img_str, noun):
         """ 
         Calls Server and returns mask array
+        Args:
+            b64_img_str (str): base64 PNG image, see SimplePhotoshop.get_b64_img
+            noun (str)
         Returns:
-            masks (list): list of mask strings
+            masks (list): list of Mask
         """
         print('noun', noun)
-        # Convert to base64 str
-        b64_img_str = img_to_b64(img)
-
         # Post request and get results
         data = {
             'imgstr': b64_img_str,
@@ -39,7 +39,7 @@ class CVEngineClient(object):
         # Get mask array
         masks = []
         for mask_str in results:
-            mask = b64_to_img(mask_str)
+            mask = to_mask(mask_str)
             masks.append(mask)
 
         return masks
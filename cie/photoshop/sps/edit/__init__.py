@@ -1,2 +1,6 @@
-from .adjust import adjust
-from .adjust_color import adjust_color
\ No newline at end of file
+from .adjust import adjust, add_hsv_channel, HSV_CHANNELS
+from .adjust_color import adjust_color
+from .batch import adjust_batch
+from .crop import crop, crop_box
+from .filter import add_filter, filter_overlap
+from .transform import rotate
@@ -5,10 +5,17 @@
     - Hue
     - Saturation
     - Lightness
+    Every adjustment is a per channel 256 entry lookup table,
+    tables are computed once per (attribute, value).
 """
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
+# Channel of HSV images touched by each attribute
+HSV_CHANNELS = {"hue": 0, "saturation": 1, "lightness": 2}
+
 
 def adjust(img, attribute, value):
     assert abs(value) <= 100, "Adjustment value should be less than 100!"
@@ -27,40 +34,68 @@ def adjust(img, attribute, value):
     return img
 
 
+@lru_cache(maxsize=None)
+def brightness_contrast_lut(brightness, contrast):
+    """
+    Returns:
+        lut (np.ndarray): read-only (256,) uint8 table
+    """
+    lut = np.arange(256, dtype=np.int16)
+    lut = lut * (contrast / 127 + 1) - contrast + brightness
+    lut = np.clip(lut, 0, 255)
+    lut = np.uint8(lut)
+    lut.flags.writeable = False
+    return lut
+
+
+@lru_cache(maxsize=None)
+def hsv_lut(value):
+    """
+    Saturating add of value to a single HSV channel
+    Returns:
+        lut (np.ndarray): read-only (256,) uint8 table
+    """
+    lut = np.clip(np.arange(256, dtype=np.int16) + value, 0, 255)
+    lut = lut.astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
 def adjust_brightness_contrast(img, brightness=0, contrast=0):
     """Adjust brightness or contrast
     """
-    img = np.int16(img)
-    img = img * (contrast / 127 + 1) - contrast + brightness
-    img = np.clip(img, 0, 255)
-    img = np.uint8(img)
-    return img
+    return cv2.LUT(img, brightness_contrast_lut(brightness, contrast))
+
+
+def adjust_hsv(img, attribute, value):
+    """Adds value to one HSV channel, the other channels are left untouched
+    """
+    hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+    add_hsv_channel(hsv, attribute, value)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
 
 
-def adjust_hsv_decorator(method):
-    def func_wrapper(img, value):
-        hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
-        h, s, v = cv2.split(hsv)
-        h, s, v = method(h, s, v, value)
-        final_hsv = cv2.merge([h, s, v])
-        img = cv2.cvtColor(final_hsv, cv2.COLOR_HSV2RGB)
-        return img
-    return func_wrapper
+def add_hsv_channel(hsv, attribute, value):
+    """Adds value to one channel of an HSV image in place
+    Args:
+        hsv (np.ndarray): HSV image
+        attribute (str): hue | saturation | lightness
+        value (int)
+    """
+    assert abs(value) <= 100, "Adjustment value should be less than 100!"
+    channel = HSV_CHANNELS[attribute]
+    adjusted = cv2.LUT(cv2.extractChannel(hsv, channel), hsv_lut(value))
+    cv2.insertChannel(adjusted, hsv, channel)
+    return hsv
 
 
-@adjust_hsv_decorator
-def adjust_hue(h, s, v, value):
-    h = cv2.add(h, value)
-    return h, s, v
+def adjust_hue(img, value):
+    return adjust_hsv(img, "hue", value)
 
 
-@adjust_hsv_decorator
-def adjust_saturation(h, s, v, value):
-    s = cv2.add(s, value)
-    return h, s, v
+def adjust_saturation(img, value):
+    return adjust_hsv(img, "saturation", value)
 
 
-@adjust_hsv_decorator
-def adjust_lightness(h, s, v, value):
-    v = cv2.add(v, value)
-    return h, s, v
+def adjust_lightness(img, value):
+    return adjust_hsv(img, "lightness", value)
@@ -1,35 +1,39 @@
-import cv2
-import numpy as np
-
-from ..utils import random_colors
+from ..utils import blend_color
+
+# RGB color codes, the blend tables are cached per color
+COLOR_CODES = {
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+    "yellow": (255, 255, 0),
+    "cyan": (0, 255, 255),
+    "magenta": (255, 0, 255),
+    "orange": (255, 165, 0),
+    "purple": (128, 0, 128),
+    "pink": (255, 192, 203),
+    "brown": (165, 42, 42),
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "gray": (128, 128, 128),
+    "grey": (128, 128, 128)
+}
 
 
 def get_color_code(color_name):
-    color_code_dict = {
-        "red": [255, 0, 0],
-        "green": [0, 255, 0],
-        "blue": [0, 0, 255]
-    }
-    return color_code_dict.get(color_name, None)
+    return COLOR_CODES.get(color_name, None)
 
 
-def adjust_color(image, color_name, alpha=0.5):
+def adjust_color(image, color_name, alpha=0.5, mask=None, out=None):
     """
     Applies color onto the image given the color code
     Args:
         color (ColorCode)
         alpha (float): parameter between image and color
+        mask (np.ndarray): 2D selection, colors the whole image if None
+        out (np.ndarray): output buffer, may be image itself
     """
     color = get_color_code(color_name)
     if color is None:
         return None
 
-    colored_image = image.astype(np.uint32).copy()
-
-    for c in range(3):
-        colored_image[:, :, c] = image[:, :, c] * \
-            (1 - alpha) + alpha * color[c]
-
-    colored_image = colored_image.astype(np.uint8)
-
-    return colored_image
+    return blend_color(image, color, alpha, mask=mask, out=out)
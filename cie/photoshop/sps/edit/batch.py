@@ -0,0 +1,121 @@
+"""
+    Fuses consecutive edits into as few passes over the image as possible
+    - brightness, contrast & adjust_color: one composed RGB lookup table
+    - hue, saturation & lightness: one RGB <-> HSV conversion,
+      one composed lookup table per touched HSV channel
+"""
+import cv2
+import numpy as np
+
+from .adjust import HSV_CHANNELS, brightness_contrast_lut, hsv_lut
+from .adjust_color import get_color_code
+from ..utils import blend_lut
+
+RGB_STAGE = "rgb"
+HSV_STAGE = "hsv"
+
+
+def identity_lut():
+    """
+    Returns:
+        lut (np.ndarray): (256, 1, 3) uint8 table
+    """
+    lut = np.arange(256, dtype=np.uint8).reshape(256, 1, 1)
+    return np.repeat(lut, 3, axis=2)
+
+
+def compose_lut(first, second):
+    """
+    Table of applying first, then second, per channel
+    """
+    lut = np.empty_like(first)
+    for c in range(first.shape[2]):
+        lut[:, 0, c] = second[:, 0, c][first[:, 0, c]]
+    return lut
+
+
+def edit_stage(edit_type, arguments):
+    """
+    Args:
+        edit_type (str): adjust | adjust_color
+        arguments (dict)
+    Returns:
+        stage (str): rgb | hsv
+        lut (np.ndarray): (256, 1, 3) table, on RGB or HSV channels
+    Raises:
+        ValueError: if the edit is not supported
+    """
+    if edit_type == "adjust":
+        attribute = arguments.get("attribute")
+        value = arguments.get("adjust_value")
+        if value is None or abs(value) > 100:
+            raise ValueError("Invalid adjust_value: {}".format(value))
+        lut = identity_lut()
+        if attribute == "brightness":
+            lut[:, 0, :] = brightness_contrast_lut(value, 0)[:, np.newaxis]
+            return RGB_STAGE, lut
+        elif attribute == "contrast":
+            lut[:, 0, :] = brightness_contrast_lut(0, value)[:, np.newaxis]
+            return RGB_STAGE, lut
+        elif attribute in HSV_CHANNELS:
+            lut[:, 0, HSV_CHANNELS[attribute]] = hsv_lut(value)
+            return HSV_STAGE, lut
+        raise ValueError("Unknown attribute: {}".format(attribute))
+    elif edit_type == "adjust_color":
+        color = get_color_code(arguments.get("color"))
+        if color is None:
+            raise ValueError("Unknown color: {}".format(arguments.get("color")))
+        return RGB_STAGE, blend_lut(tuple(float(c) for c in color), 0.5)
+    raise ValueError("Unknown edit_type: {}".format(edit_type))
+
+
+def plan(edits):
+    """
+    Groups consecutive edits of the same stage into a single table
+    Args:
+        edits (list): list of (edit_type, arguments)
+    Returns:
+        stages (list): list of (stage, lut)
+    """
+    stages = []
+    for edit_type, arguments in edits:
+        stage, lut = edit_stage(edit_type, arguments)
+        if len(stages) > 0 and stages[-1][0] == stage:
+            stages[-1] = (stage, compose_lut(stages[-1][1], lut))
+        else:
+            stages.append((stage, lut))
+    return stages
+
+
+def run_stages(img, stages):
+    for stage, lut in stages:
+        if stage == RGB_STAGE:
+            if (lut == lut[:, :, :1]).all():  # Same table on every channel
+                lut = np.ascontiguousarray(lut[:, 0, 0])
+            img = cv2.LUT(img, lut)
+        else:
+            hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+            identity = np.arange(256, dtype=np.uint8)
+            for channel in range(3):
+                channel_lut = lut[:, 0, channel]
+                if (channel_lut == identity).all():
+                    continue  # Untouched channel
+                adjusted = cv2.LUT(cv2.extractChannel(hsv, channel),
+                                   np.ascontiguousarray(channel_lut))
+                cv2.insertChannel(adjusted, hsv, channel)
+            img = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+    return img
+
+
+def adjust_batch(img, edits):
+    """
+    Applies a list of edits with fused passes
+    RGB edits give the same pixels as applying them one by one,
+    HSV edits skip the lossy round trips to RGB between them.
+    Args:
+        img (np.ndarray)
+        edits (list): list of (edit_type, arguments)
+    Returns:
+        img (np.ndarray)
+    """
+    return run_stages(img, plan(edits))
@@ -1,5 +1,27 @@
 import cv2
 
+
+def crop_box(shape, bbox):
+    """Clips a crop rectangle to the image
+    Args:
+        shape (tuple): shape of the image
+        bbox (list): (top, left, bottom, right)
+    Returns:
+        bbox (tuple): (top, left, bottom, right), None if empty
+    """
+    height, width = shape[:2]
+    top, left, bottom, right = [int(v) for v in bbox]
+    top, bottom = max(top, 0), min(bottom, height)
+    left, right = max(left, 0), min(right, width)
+    if bottom <= top or right <= left:
+        return None
+    return top, left, bottom, right
+
+
 def crop(img, top, bottom, left, right):
+    """
+    Returns:
+        cropped_img (np.ndarray): view of img, no pixels are copied
+    """
     cropped_img = img[top:bottom, left:right, :]
     return cropped_img
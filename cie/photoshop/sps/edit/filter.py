@@ -5,17 +5,34 @@
 """
 import cv2
 
+GAUSSIAN_KSIZE = (5, 5)
+
+
+def filter_overlap(filter_type):
+    """Rows of context a filter reads around each output row
+    Returns:
+        overlap (int): None if the filter depends on the whole image,
+                       e.g. Otsu's threshold of black_and_white
+    """
+    if filter_type == "gaussian":
+        return GAUSSIAN_KSIZE[0] // 2
+    return None
+
 
 def add_filter(img, filter_type, value=10):
     """Apply a filter to the image
+    Returns:
+        filtered_img (np.ndarray): same shape as img,
+                                   black and white images are grey RGB
     """
     if filter_type == "black_and_white":
         # Convert to black and white scale
         grey_img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
         (_, filtered_img) = cv2.threshold(grey_img,
                                           128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        filtered_img = cv2.cvtColor(filtered_img, cv2.COLOR_GRAY2RGB)
     elif filter_type == "gaussian":
-        filtered_img = cv2.GaussianBlur(img, (5, 5), 0)
+        filtered_img = cv2.GaussianBlur(img, GAUSSIAN_KSIZE, 0)
     else:
         raise ValueError("Unknown filter: {}!".format(filter_type))
     """
@@ -1,6 +1,6 @@
 import requests
 
-from ..utils import img_to_b64, b64_to_img
+from ..utils import img_to_b64, to_mask
 
 SELECT_URL = "http://isupreme:5100/selection"
 
@@ -9,7 +9,7 @@ def select(img, noun):
     """ 
     Calls Server and returns mask array
     Returns:
-        masks (list): list of mask strings
+        masks (list): list of Mask
     """
     print('noun', noun)
     # Convert to base64 str
@@ -33,7 +33,7 @@ def select(img, noun):
     # Get mask array
     masks = []
     for mask_str in results:
-        mask = b64_to_img(mask_str)
+        mask = to_mask(mask_str)
         masks.append(mask)
 
     return masks
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import pytest
+
+from ..core import SimplePhotoshop
+from .adjust import adjust, brightness_contrast_lut, hsv_lut
+
+ATTRIBUTES = ["brightness", "contrast", "hue", "saturation", "lightness"]
+VALUES = [-100, -99, -50, -30, -10, -5, -1, 0, 1, 5, 10, 30, 50, 99, 100]
+
+
+def legacy_adjust(img, attribute, value):
+    """
+    Previous per pixel arithmetic implementation of adjust
+    """
+    if attribute in ["brightness", "contrast"]:
+        brightness = value if attribute == "brightness" else 0
+        contrast = value if attribute == "contrast" else 0
+        img = np.int16(img)
+        img = img * (contrast / 127 + 1) - contrast + brightness
+        img = np.clip(img, 0, 255)
+        return np.uint8(img)
+
+    hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+    h, s, v = cv2.split(hsv)
+    if attribute == "hue":
+        h = cv2.add(h, value)
+    elif attribute == "saturation":
+        s = cv2.add(s, value)
+    else:
+        v = cv2.add(v, value)
+    final_hsv = cv2.merge([h, s, v])
+    return cv2.cvtColor(final_hsv, cv2.COLOR_HSV2RGB)
+
+
+@pytest.mark.parametrize("attribute", ATTRIBUTES)
+@pytest.mark.parametrize("shape", [(1, 1), (7, 13), (64, 97)])
+def test_lut_matches_arithmetic(attribute, shape, random_image):
+    img = random_image(*shape)
+    for value in VALUES:
+        expected = legacy_adjust(img, attribute, value)
+        result = adjust(img, attribute, value)
+        assert result.dtype == expected.dtype
+        assert (result == expected).all(), value
+
+
+@pytest.mark.parametrize("attribute", ATTRIBUTES)
+def test_masked_adjust(attribute, random_image, ellipse_mask):
+    img = random_image(seed=1)
+    mask = ellipse_mask()
+    inside = mask.to_array()
+
+    ps = SimplePhotoshop()
+    for value in [-100, -10, 30, 100]:
+        ps.reset()
+        ps.history._background = ps.background = ps.img = img
+        ps.masks = [("0", mask)]
+        assert ps.execute("adjust", {"attribute": attribute,
+                                     "adjust_value": value})[0]
+
+        expected = legacy_adjust(img, attribute, value)
+        assert (ps.img[~inside] == img[~inside]).all()
+        diff = np.abs(ps.img[inside].astype(np.int16) - expected[inside])
+        # OpenCV's HSV conversions may round the selection's narrower
+        # rectangle differently, see Selector.mask_region
+        tolerance = 0 if attribute in ["brightness", "contrast"] else 1
+        assert diff.max() <= tolerance, value
+
+
+@pytest.mark.parametrize("attribute", ATTRIBUTES)
+def test_value_range(attribute, random_image):
+    img = random_image(8, 8)
+    for value in [-100, 100]:
+        adjust(img, attribute, value)
+    for value in [-101, 101]:
+        with pytest.raises(AssertionError):
+            adjust(img, attribute, value)
+
+
+def test_lut_clamps():
+    lut = brightness_contrast_lut(100, 0)
+    assert lut[0] == 100 and lut[155] == 255 and lut[255] == 255
+    lut = brightness_contrast_lut(-100, 0)
+    assert lut[0] == 0 and lut[100] == 0 and lut[255] == 155
+    lut = brightness_contrast_lut(0, 100)
+    assert lut[0] == 0 and lut[255] == 255
+    lut = brightness_contrast_lut(0, -100)
+    assert lut.min() >= 0 and lut.max() <= 255
+
+    assert hsv_lut(100)[155] == 255 and hsv_lut(100)[255] == 255
+    assert hsv_lut(-100)[100] == 0 and hsv_lut(-100)[0] == 0
+    assert not hsv_lut(0).flags.writeable
+    assert (hsv_lut(0) == np.arange(256)).all()
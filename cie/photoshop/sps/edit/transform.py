@@ -1,8 +1,28 @@
+from functools import lru_cache
+
 import cv2
 
 
-def rotate(img, degree):
+@lru_cache(maxsize=32)
+def rotation_matrix(rows, cols, degree):
+    """Rotation around the center of a rows x cols image
+    """
+    return cv2.getRotationMatrix2D((cols/2, rows/2), degree, 1)
+
+
+def rotate(img, degree, dst=None):
+    """
+    Args:
+        img (np.ndarray)
+        degree (float): counter clockwise
+        dst (np.ndarray): output buffer of the same shape & dtype as img,
+                          reused instead of allocating a new image
+    Returns:
+        rotated_img (np.ndarray): dst if given
+    """
     rows, cols, _ = img.shape
-    M = cv2.getRotationMatrix2D((cols/2, rows/2), degree, 1)
-    rotated_img = cv2.warpAffine(img, M, (cols, rows))
-    return rotated_img
\ No newline at end of file
+    M = rotation_matrix(rows, cols, degree)
+    if dst is not None:
+        assert dst.shape == img.shape and dst.dtype == img.dtype
+    rotated_img = cv2.warpAffine(img, M, (cols, rows), dst=dst)
+    return rotated_img
@@ -1,45 +1,380 @@
+import base64
+from collections import OrderedDict
+
 import numpy as np
 
 from . import utils
+from .actions import PSAct, PSArgs
+from .edit.batch import identity_lut, plan
+from ...util.cache import LRUCache
+from ...util.codec import RawCodec
+from ...util.mask import region_from_json
+from ...util.persist import is_blob_ref
+
+# Codec profile of serialized history images
+HISTORY_PROFILE = "lossless-fast"
+
+# Deltas are mostly zeros, so cheap zlib levels compress them well
+DELTA_CODEC = RawCodec(level=1)
+
+KEYFRAME = "key"
+DELTA = "delta"
+REPLAY = "replay"
+PENDING = "pending"
+
+# Frames & images restored from blob references, shared across requests
+restore_cache = LRUCache(256 * 1024 * 1024)
+
+
+class Frame(object):
+    """
+    Image after one edit, stored either as
+    - a keyframe: the full image
+    - a delta: the XOR with the previous image, cropped to the
+      rectangle of changed pixels and zlib compressed
+    - a replay: only the selection of the edit, the image is
+      recomputed by replaying the edit on the previous image
+    - a pending frame: a function rendering the image, turned into a
+      delta once the history is saved, see EditHistory.add
+    Frames restored by from_json decode their image or delta
+    the first time they are used.
+    """
+
+    def __init__(self, kind, img=None, bbox=None, data=None, masks=None,
+                 source=None, nbytes=None, render=None):
+        """
+        Args:
+            source (tuple): (encoded value, store) of the image or delta,
+                            decoded on first use if img / data is None
+            nbytes (int): nbytes of the decoded frame, if known
+            render (function): renders the image of a pending frame
+        """
+        self.kind = kind
+        self._img = img
+        self.bbox = bbox  # (top, left, bottom, right)
+        self._data = data
+        self.masks = masks  # List of (name, Region)
+        self._source = source
+        self._nbytes = nbytes
+        self._render = render
+        self._json = None  # (store, to_json result) once known
+
+    @property
+    def img(self):
+        if self.kind == PENDING:
+            return self._render()
+        if self._img is None and self._source is not None:
+            self._img = decode_image(*self._source)
+            self._source = None
+        return self._img
+
+    @property
+    def data(self):
+        if self._data is None and self._source is not None:
+            value, blobs = self._source
+            if is_blob_ref(value):
+                self._data = blobs.get(value)
+            else:
+                self._data = base64.b64decode(value)
+            self._source = None
+        return self._data
+
+    @property
+    def nbytes(self):
+        if self._nbytes is None:
+            if self.kind == KEYFRAME:
+                self._nbytes = self.img.nbytes
+            elif self.kind == DELTA:
+                self._nbytes = len(self.data)
+            else:
+                # Regions are shared with the photoshop,
+                # pending images are counted once they are stored
+                self._nbytes = 0
+        return self._nbytes
+
+    @classmethod
+    def keyframe(cls, img):
+        return cls(KEYFRAME, img=img)
+
+    @classmethod
+    def replay(cls, masks):
+        return cls(REPLAY, masks=list(masks))
+
+    @classmethod
+    def pending(cls, render, masks):
+        return cls(PENDING, masks=list(masks), render=render)
+
+    @classmethod
+    def delta(cls, prev, img):
+        """
+        Args:
+            prev (np.ndarray): previous image, same shape as img
+            img (np.ndarray)
+        Returns:
+            frame (Frame): empty bbox if the images are identical
+        """
+        changed = (prev != img)
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            return cls(DELTA, bbox=(0, 0, 0, 0), data=b"")
+        cols = np.flatnonzero(changed.any(axis=0))
+        top, bottom = int(rows[0]), int(rows[-1]) + 1
+        left, right = int(cols[0]), int(cols[-1]) + 1
+        diff = np.bitwise_xor(prev[top:bottom, left:right],
+                              img[top:bottom, left:right])
+        return cls(DELTA, bbox=(top, left, bottom, right),
+                   data=DELTA_CODEC.encode(diff))
+
+    def apply(self, prev):
+        """
+        Args:
+            prev (np.ndarray): image before this edit
+        Returns:
+            img (np.ndarray): image after this edit
+        """
+        if self.kind in (KEYFRAME, PENDING):
+            return self.img
+        top, left, bottom, right = self.bbox
+        if bottom == top:
+            return prev
+        img = prev.copy()
+        diff = DELTA_CODEC.decode(self.data)
+        np.bitwise_xor(img[top:bottom, left:right], diff,
+                       out=img[top:bottom, left:right])
+        return img
+
+    def to_json(self, blobs=None):
+        """
+        Args:
+            blobs (PersistentStore): writes the frame once as a blob
+        Returns:
+            obj (dict | str): inline frame, or blob reference with blobs
+        """
+        assert self.kind != PENDING, "Pending frames are stored as deltas"
+        if self._json is not None and self._json[0] is blobs:
+            return self._json[1]
+        if blobs is None:
+            return self._to_json(None)
+        self._json = (blobs, blobs.put_json(self._to_json(blobs)))
+        return self._json[1]
+
+    def _to_json(self, blobs):
+        if self.kind == KEYFRAME:
+            return {"kind": KEYFRAME, "image": encode_image(self.img, blobs),
+                    "nbytes": self.nbytes}
+        elif self.kind == DELTA:
+            if blobs is None:
+                data = base64.b64encode(self.data).decode()
+            else:
+                data = blobs.put(self.data)
+            return {"kind": DELTA, "bbox": list(self.bbox), "data": data,
+                    "nbytes": self.nbytes}
+        return {"kind": REPLAY,
+                "masks": [[name, mask.to_json()] for name, mask in self.masks]}
+
+    @classmethod
+    def from_json(cls, obj, blobs=None):
+        """
+        Inverse of to_json, images & deltas are decoded on first use
+        Frames of blob references are shared through restore_cache
+        """
+        if not is_blob_ref(obj):
+            frame = cls._from_json(obj, blobs)
+            frame._json = (blobs, obj)
+            return frame
+        frame = restore_cache.get(obj)
+        if frame is None:
+            frame = cls._from_json(blobs.get_json(obj), blobs)
+            frame._json = (blobs, obj)
+            restore_cache.put(obj, frame)
+        return frame
+
+    @classmethod
+    def _from_json(cls, obj, blobs):
+        if obj["kind"] == KEYFRAME:
+            return cls(KEYFRAME, source=(obj["image"], blobs),
+                       nbytes=obj.get("nbytes"))
+        elif obj["kind"] == DELTA:
+            return cls(DELTA, bbox=tuple(obj["bbox"]),
+                       source=(obj["data"], blobs), nbytes=obj.get("nbytes"))
+        return cls.replay([(name, region_from_json(mask))
+                           for name, mask in obj["masks"]])
+
+
+def encode_image(img, blobs=None):
+    """
+    Returns:
+        value (str): base64 string, or blob reference with blobs
+    """
+    if blobs is None:
+        return utils.img_to_b64(img, HISTORY_PROFILE)
+    return blobs.put_image(img, HISTORY_PROFILE)
+
+
+def decode_image(value, blobs=None):
+    """
+    Inverse of encode_image, decoded images are cached by value
+    """
+    if not is_blob_ref(value):
+        return utils.b64_to_img(value)  # Cached in codec_cache
+    img = restore_cache.get(value)
+    if img is None:
+        img = blobs.get_image(value)
+        img.flags.writeable = False
+        restore_cache.put(value, img)
+    return img
 
 
 class EditHistory(object):
     """
         Stores the edit history of Photoshop
         Also stores the resulting image for convenience
+
+        Images are stored as compressed deltas of the changed region,
+        with a full keyframe every keyframe_interval edits.
+        When the stored frames exceed max_bytes, the oldest edits
+        are folded into the background and can no longer be undone.
     """
+    parametric = False  # Edits are rendered by the photoshop
 
-    def __init__(self):
-        """Use 2 stacks 1. _actions 2. _images to record history
+    def __init__(self, keyframe_interval=8, max_bytes=64 * 1024 * 1024,
+                 cache_frames=1, replay=None):
+        """Use 2 stacks 1. _actions 2. _frames to record history
+        Args:
+            keyframe_interval (int): at most keyframe_interval - 1 frames
+                                     are applied to restore an image
+            max_bytes (int): byte budget of stored frames, None for no limit
+            cache_frames (int): number of restored images to keep
+            replay (function): (img, masks, edit_type, args) -> edited img,
+                               restores replay frames of restored sessions
         """
-        self._background = None
+        self.keyframe_interval = keyframe_interval
+        self.max_bytes = max_bytes
+        self.cache_frames = cache_frames
+        self.replay = replay
+
+        self._background_frame = None
+        self._background_shape = None  # (height, width), kept by to_json
         self._actions = list()
-        self._images = list()
+        self._frames = list()
         self._ptr = -1
+        self._cache = OrderedDict()  # Recently restored index -> image
+        self._background_json = None  # (store, frame, encoded value)
+        self._nbytes = 0
+        self.version = 0  # Bumped on every change
+
+    @property
+    def _background(self):
+        """Image before the first edit, decoded on first use after from_json
+        """
+        if self._background_frame is None:
+            return None
+        return self._background_frame.img
+
+    @_background.setter
+    def _background(self, img):
+        self._background_frame = None if img is None else Frame.keyframe(img)
+        self._background_shape = None if img is None else img.shape[:2]
+
+    def image_shape(self, index=None):
+        """
+        Size of the image after an edit, from the background & recorded
+        crops, without restoring or rendering the image
+        Args:
+            index (int): defaults to the current state
+        Returns:
+            shape (tuple): (height, width), None if no image is loaded
+        """
+        index = self._ptr if index is None else index
+        for edit_type, args in reversed(self._actions[:index + 1]):
+            if edit_type == PSAct.Edit.CROP:
+                top, left, bottom, right = args[PSArgs.BBOX]
+                return (bottom - top, right - left)
+        if self._background_frame is None:
+            return None
+        if self._background_shape is None:  # Saved by older versions
+            self._background_shape = self._background.shape[:2]
+        return self._background_shape
+
+    @property
+    def nbytes(self):
+        """Bytes of stored frames
+        """
+        if self._nbytes is None:
+            self._nbytes = sum(frame.nbytes for frame in self._frames)
+        return self._nbytes
+
+    @nbytes.setter
+    def nbytes(self, nbytes):
+        self._nbytes = nbytes
 
     def __len__(self):
-        assert len(self._actions) == len(self._images)
+        assert len(self._actions) == len(self._frames)
         return len(self._actions)
 
     def reset(self):
         self._background = None
         self._actions.clear()
-        self._images.clear()
+        self._frames.clear()
         self._ptr = -1
+        self._cache.clear()
+        self.nbytes = 0
+        self.version += 1
 
-    def add(self, edit_type, args, img):
+    def add(self, edit_type, args, img, masks=()):
         """ Add edit action & result img to history.
             Clears rest of _action, if _ptr not at last pos
+        Args:
+            img (np.ndarray | function): image, or a function rendering it,
+                                         only called if the image is read
+                                         before the history is saved
+            masks (list): selection of the edit, list of (name, Region)
         """
-        assert self._background is not None, "Need to load image before performing edits!"
+        assert self._background_frame is not None, "Need to load image before performing edits!"
+
+        if len(self._frames) > self._ptr + 1:
+            self._actions = self._actions[:self._ptr + 1]
+            self._frames = self._frames[:self._ptr + 1]
+            for index in [i for i in self._cache if i > self._ptr]:
+                del self._cache[index]
+            self.nbytes = None
 
-        self._actions = self._actions[:self._ptr + 1]
-        self._images = self._images[:self._ptr + 1]
+        if callable(img):
+            frame = Frame.pending(img, masks)
+        elif self._frames_since_keyframe() + 1 >= self.keyframe_interval:
+            frame = Frame.keyframe(img)
+        else:
+            frame = self._frame(img, masks)
 
+        self.nbytes += frame.nbytes
         self._actions.append([edit_type, args])
-        self._images.append(img)
+        self._frames.append(frame)
 
         self._ptr += 1
+        if not callable(img):
+            self._remember(self._ptr, img)
+        self._evict()
+        self.version += 1
+
+    def _frame(self, img, masks, index=None):
+        """Frame of the image after the next edit, or after edit index
+        """
+        prev = self._image(self._ptr if index is None else index - 1)
+        if prev.shape != img.shape:
+            return Frame.keyframe(img)
+        return Frame.delta(prev, img)
+
+    def _store_pending(self):
+        """Renders pending frames into stored frames
+        """
+        for i, frame in enumerate(self._frames):
+            if frame.kind == PENDING:
+                img = frame.img
+                self._frames[i] = self._frame(img, frame.masks, i)
+                self._remember(i, img)
+                self.nbytes = None
 
     def hasPreviousHistory(self):
         return self._ptr >= 0
@@ -50,28 +385,437 @@ class EditHistory(object):
     def undo(self):
         assert self._ptr >= 0
         self._ptr -= 1
+        self.version += 1
         if self._ptr >= 0:
-            return self._actions[self._ptr], self._images[self._ptr]
+            return self._actions[self._ptr], self._image(self._ptr)
         else:  # No actions performed
             return ('none', {}), self._background
 
     def redo(self):
         assert self._ptr < (len(self._actions) - 1)
         self._ptr += 1
-        return self._actions[self._ptr], self._images[self._ptr]
+        self.version += 1
+        return self._actions[self._ptr], self._image(self._ptr)
+
+    def _frames_since_keyframe(self):
+        count = 0
+        for frame in reversed(self._frames):
+            if frame.kind == KEYFRAME:
+                break
+            count += 1
+        return count
 
-    def to_json(self):
+    def _image(self, index):
+        """
+        Restores the image after edit index from the nearest keyframe,
+        or from a recently restored image if it is closer
+        Args:
+            index (int): -1 for the background
+        Returns:
+            img (np.ndarray)
+        """
+        if index < 0:
+            return self._background
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        if index + 1 in self._cache and self._frames[index + 1].kind == DELTA:
+            # XOR deltas also revert their edit
+            img = self._frames[index + 1].apply(self._cache[index + 1])
+            self._remember(index, img)
+            return img
+
+        start, img = -1, self._background
+        for i in range(index, -1, -1):
+            if self._frames[i].kind in (KEYFRAME, PENDING):
+                start, img = i, self._frames[i].img
+                break
+        cached = [i for i in self._cache if start < i < index]
+        if len(cached) > 0:
+            start = max(cached)
+            img = self._cache[start]
+
+        for i in range(start + 1, index + 1):
+            img = self._apply(i, img)
+        self._remember(index, img)
+        return img
+
+    def _apply(self, index, prev):
+        frame = self._frames[index]
+        if frame.kind != REPLAY:
+            return frame.apply(prev)
+        edit_type, args = self._actions[index]
+        img = self.replay(prev, frame.masks, edit_type, args)
+        assert img is not None, "Failed to replay {}".format(edit_type)
+        return img
+
+    def _remember(self, index, img):
+        self._cache[index] = img
+        self._cache.move_to_end(index)
+        while len(self._cache) > self.cache_frames:
+            self._cache.popitem(last=False)
+
+    def _evict(self):
+        """Folds the oldest edits into the background until within budget
+        """
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes and len(self._frames) > 1 \
+                and self._ptr > 0:
+            self._background = self._image(0)
+            frame = self._frames.pop(0)
+            self._actions.pop(0)
+            self.nbytes -= frame.nbytes
+            self._ptr -= 1
+            self._cache = OrderedDict(
+                (i - 1, img) for i, img in self._cache.items() if i > 0)
+
+    def to_json(self, blobs=None):
+        """
+        Images are only read back by from_json, so they skip
+        PNG compression and colour conversion
+        Args:
+            blobs (PersistentStore): writes images & frames once as blobs,
+                                     the result only holds their references
+        """
+        self._store_pending()
         obj = {}
-        if self._background is not None:
-            obj["background"] = utils.img_to_b64(self._background)
+        if self._background_frame is not None:
+            obj["background"] = self._encode_background(blobs)
+            obj["background_shape"] = list(self.image_shape(-1))
         obj["actions"] = self._actions
-        obj["images"] = [utils.img_to_b64(img) for img in self._images]
+        obj["frames"] = [frame.to_json(blobs) for frame in self._frames]
         obj["ptr"] = self._ptr
         return obj
 
-    def from_json(self, obj):
+    def _encode_background(self, blobs):
+        cached = self._background_json
+        if cached is not None and cached[0] is blobs and \
+                cached[1] is self._background_frame:
+            return cached[2]
+        value = encode_image(self._background, blobs)
+        if blobs is not None:
+            self._background_json = (blobs, self._background_frame, value)
+        return value
+
+    def from_json(self, obj, blobs=None):
+        """Also reads the full "images" list of older sessions
+        Images are only decoded once undo, redo or edits touch them
+        Args:
+            blobs (PersistentStore): resolves blob references
+        """
         if 'background' in obj:
-            self._background = utils.b64_to_img(obj["background"])
+            value = obj["background"]
+            self._background_frame = Frame(KEYFRAME, source=(value, blobs))
+            self._background_json = (blobs, self._background_frame, value)
+            self._background_shape = tuple(obj["background_shape"]) \
+                if "background_shape" in obj else None
         self._actions = obj["actions"]
-        self._images = [utils.b64_to_img(i) for i in obj["images"]]
+        if "frames" in obj:
+            self._frames = [Frame.from_json(f, blobs) for f in obj["frames"]]
+        else:
+            self._frames = [Frame(KEYFRAME, source=(i, None))
+                            for i in obj["images"]]
         self._ptr = obj["ptr"]
+        self._cache.clear()
+        self.nbytes = None
+        self.version += 1
+
+
+class ReplayHistory(EditHistory):
+    """
+        Trades CPU for memory: only keeps the actions, their selections
+        and a keyframe every keyframe_interval edits.
+        Other images are recomputed by replaying the edits
+        from the nearest keyframe, the last cache_frames are kept.
+    """
+
+    def __init__(self, keyframe_interval=8, max_bytes=64 * 1024 * 1024,
+                 cache_frames=4, replay=None):
+        super(ReplayHistory, self).__init__(keyframe_interval, max_bytes,
+                                            cache_frames, replay)
+
+    def _frame(self, img, masks, index=None):
+        return Frame.replay(masks)
+
+
+# Adjustments made of a single RGB lookup table, runs of them compose exactly
+LUT_ATTRIBUTES = ("brightness", "contrast")
+
+
+class Layer(object):
+    """
+    One parametric edit: selection, op & params, never modified
+    """
+
+    def __init__(self, masks, edit_type, args):
+        """
+        Args:
+            masks (list): selection of the edit, list of (name, Region)
+            edit_type (str)
+            args (dict)
+        """
+        self.masks = list(masks)
+        self.selection = frozenset(mask for _, mask in self.masks)
+        self.edit_type = edit_type
+        self.args = args
+        self._json = None  # (store, to_json result) once known
+
+    def lut_edits(self):
+        """
+        Returns:
+            edits (list): list of [edit_type, args] of the layer if it is
+                          a single RGB lookup table, None otherwise
+        """
+        if self.edit_type == PSAct.Edit.ADJUST:
+            edits = [[self.edit_type, self.args]]
+        elif self.edit_type == PSAct.Edit.BATCH:
+            edits = self.args.get(PSArgs.EDITS, [])
+        else:
+            return None
+        for edit_type, args in edits:
+            if edit_type != PSAct.Edit.ADJUST or \
+                    args.get(PSArgs.ATTRIBUTE) not in LUT_ATTRIBUTES:
+                return None
+        return [list(edit) for edit in edits]
+
+    def merge(self, other):
+        """
+        Brightness & contrast adjustments on the same selection merge
+        into a batch layer, rendered with their composed lookup table.
+        The pixels are the same as applying them one by one,
+        HSV adjustments & other edits are never merged.
+        Returns:
+            layer (Layer): None if the layers don't merge
+        """
+        if self.selection != other.selection:
+            return None
+        edits, other_edits = self.lut_edits(), other.lut_edits()
+        if edits is None or other_edits is None:
+            return None
+        return Layer(other.masks, PSAct.Edit.BATCH,
+                     {PSArgs.EDITS: edits + other_edits})
+
+    def is_identity(self):
+        """
+        Returns:
+            identity (bool): True if the layer leaves every pixel as is
+        """
+        edits = self.lut_edits()
+        if edits is None:
+            return False
+        return all((lut == identity_lut()).all() for _, lut in plan(edits))
+
+    def to_json(self, blobs=None):
+        if self._json is not None and self._json[0] is blobs:
+            return self._json[1]
+        masks = []
+        for name, mask in self.masks:
+            mask_json = mask.to_json()
+            if blobs is not None:
+                mask_json = blobs.put_json(mask_json)
+            masks.append([name, mask_json])
+        obj = {"masks": masks, "edit_type": self.edit_type, "args": self.args}
+        self._json = (blobs, obj)
+        return obj
+
+    @classmethod
+    def from_json(cls, obj, blobs=None):
+        masks = []
+        for name, mask_json in obj["masks"]:
+            if is_blob_ref(mask_json):
+                mask_json = blobs.get_json(mask_json)
+            masks.append((name, region_from_json(mask_json)))
+        layer = cls(masks, obj["edit_type"], obj["args"])
+        layer._json = (blobs, obj)
+        return layer
+
+
+class LayerHistory(EditHistory):
+    """
+        Non-destructive history: each state is a stack of parametric layers
+        on top of the background, shared with the previous states.
+        Consecutive brightness & contrast adjustments on the same selection
+        merge into one layer of their composed lookup table, see Layer.merge.
+        Edits, undo & redo only move the stack pointer,
+        images are rendered when read, from the longest recently rendered
+        prefix of the stack.
+    """
+    parametric = True
+
+    def __init__(self, keyframe_interval=None, max_bytes=None, cache_frames=4,
+                 replay=None):
+        """
+        Args:
+            keyframe_interval, max_bytes: unused, layers store no images,
+                                          accepted to switch modes by config
+            cache_frames (int): number of rendered stack prefixes to keep
+            replay (function): renders a layer, see EditHistory
+        """
+        super(LayerHistory, self).__init__(
+            keyframe_interval=None, max_bytes=None,
+            cache_frames=cache_frames, replay=replay)
+        self._stacks = list()  # Tuple of layers after each edit
+
+    @property
+    def nbytes(self):
+        """Layers only hold regions shared with the photoshop
+        """
+        return 0
+
+    @nbytes.setter
+    def nbytes(self, nbytes):
+        pass
+
+    def __len__(self):
+        assert len(self._actions) == len(self._stacks)
+        return len(self._actions)
+
+    @property
+    def stack(self):
+        """Layers of the current state
+        """
+        return self._stack(self._ptr)
+
+    def _stack(self, index):
+        return self._stacks[index] if index >= 0 else ()
+
+    def reset(self):
+        self._stacks.clear()
+        super(LayerHistory, self).reset()
+
+    def add(self, edit_type, args, img=None, masks=()):
+        """Pushes a layer onto the current stack, img is not used
+        """
+        assert self._background_frame is not None, "Need to load image before performing edits!"
+
+        if len(self._stacks) > self._ptr + 1:
+            self._actions = self._actions[:self._ptr + 1]
+            self._stacks = self._stacks[:self._ptr + 1]
+
+        stack = self.stack
+        layer = Layer(masks, edit_type, args)
+        merged = stack[-1].merge(layer) if len(stack) > 0 else None
+        if merged is None:
+            stack = stack + (layer,)
+        elif merged.is_identity():
+            stack = stack[:-1]
+        else:
+            stack = stack[:-1] + (merged,)
+
+        self._actions.append([edit_type, args])
+        self._stacks.append(stack)
+        self._ptr += 1
+        self.version += 1
+
+    def undo(self):
+        assert self._ptr >= 0
+        self._ptr -= 1
+        self.version += 1
+        action = self._actions[self._ptr] if self._ptr >= 0 else ('none', {})
+        return action, self.image_fn()
+
+    def redo(self):
+        assert self._ptr < (len(self._actions) - 1)
+        self._ptr += 1
+        self.version += 1
+        return self._actions[self._ptr], self.image_fn()
+
+    def image_fn(self, index=None):
+        """
+        Args:
+            index (int): state after edit index, defaults to the current one
+        Returns:
+            render (function): renders the image of the state when called
+        """
+        stack = self._stack(self._ptr if index is None else index)
+        return lambda: self.render(stack)
+
+    def _image(self, index):
+        return self.render(self._stack(index))
+
+    def render(self, stack):
+        """
+        Args:
+            stack (tuple): tuple of Layer
+        Returns:
+            img (np.ndarray): background with the layers applied in order
+        """
+        start, img = 0, self._background
+        for i in range(len(stack), 0, -1):
+            prefix = stack[:i]
+            if prefix in self._cache:
+                self._cache.move_to_end(prefix)
+                start, img = i, self._cache[prefix]
+                break
+        for i in range(start, len(stack)):
+            layer = stack[i]
+            img = self.replay(img, layer.masks, layer.edit_type, layer.args)
+            assert img is not None, "Failed to render {}".format(layer.edit_type)
+            self._remember(stack[:i + 1], img)
+        return img
+
+    def _evict(self):
+        pass
+
+    def to_json(self, blobs=None):
+        """
+        Layers shared between states are stored once,
+        stacks refer to them by index
+        Args:
+            blobs (PersistentStore): writes masks once as blobs
+        """
+        index = dict()
+        layers = []
+        stacks = []
+        for stack in self._stacks:
+            for layer in stack:
+                if id(layer) not in index:
+                    index[id(layer)] = len(layers)
+                    layers.append(layer.to_json(blobs))
+            stacks.append([index[id(layer)] for layer in stack])
+
+        obj = {}
+        if self._background_frame is not None:
+            obj["background"] = self._encode_background(blobs)
+            obj["background_shape"] = list(self.image_shape(-1))
+        obj["actions"] = self._actions
+        obj["layers"] = layers
+        obj["stacks"] = stacks
+        obj["ptr"] = self._ptr
+        return obj
+
+    def from_json(self, obj, blobs=None):
+        """
+        Args:
+            blobs (PersistentStore): resolves blob references
+        """
+        if 'background' in obj:
+            value = obj["background"]
+            self._background_frame = Frame(KEYFRAME, source=(value, blobs))
+            self._background_json = (blobs, self._background_frame, value)
+            self._background_shape = tuple(obj["background_shape"]) \
+                if "background_shape" in obj else None
+        layers = [Layer.from_json(layer, blobs) for layer in obj["layers"]]
+        self._actions = obj["actions"]
+        self._stacks = [tuple(layers[i] for i in stack)
+                        for stack in obj["stacks"]]
+        self._ptr = obj["ptr"]
+        self._cache.clear()
+        self.version += 1
+
+
+def make_history(mode="delta", replay=None, **kwargs):
+    """
+    Args:
+        mode (str): delta | replay | parametric
+        replay (function): see EditHistory
+        kwargs: see EditHistory
+    """
+    if mode == "delta":
+        return EditHistory(replay=replay, **kwargs)
+    elif mode == "replay":
+        return ReplayHistory(replay=replay, **kwargs)
+    elif mode == "parametric":
+        return LayerHistory(replay=replay, **kwargs)
+    raise ValueError("Unknown history mode: {}".format(mode))
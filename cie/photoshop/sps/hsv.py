@@ -0,0 +1,120 @@
+"""
+    Runs of hue, saturation & lightness edits on an HSV working image
+"""
+import cv2
+import numpy as np
+
+from .edit import add_hsv_channel
+from .selector import Selector
+
+
+def to_hsv(tile):
+    return cv2.cvtColor(tile, cv2.COLOR_RGB2HSV)
+
+
+def to_rgb(tile):
+    return cv2.cvtColor(tile, cv2.COLOR_HSV2RGB)
+
+
+class HSVRun(object):
+    """
+    Consecutive HSV edits of an RGB image, applied to an HSV copy of it.
+    The image after an edit is converted back to RGB only when it is read,
+    pending edits are applied at that point.
+    Only the rectangle of the pixels selected by the run is converted,
+    the other pixels keep their RGB values.
+
+    Attributes:
+        img (np.ndarray): RGB image before the run
+    """
+
+    def __init__(self, img, tiles):
+        """
+        Args:
+            img (np.ndarray): RGB image before the run
+            tiles (TileScheduler)
+        """
+        self.img = img
+        self.tiles = tiles
+        self._edits = list()  # (attribute, value, selection)
+        self._hsv = None  # Working image after self._step edits
+        self._step = 0
+        self._touched = None  # 2D uint8, 1 where selected by an applied edit
+        self._bbox = None  # Rectangle of the touched pixels
+
+    def __len__(self):
+        return len(self._edits)
+
+    def add(self, attribute, value, selection=None):
+        """
+        Args:
+            attribute (str): hue | saturation | lightness
+            value (int)
+            selection (tuple): (inverse, bbox) of Selector.composite,
+                               None for the whole image
+        Returns:
+            image_fn (function): RGB image after the edit,
+                                 rendered the first time it is called
+        """
+        self._edits.append((attribute, value, selection))
+        step = len(self._edits)
+        rendered = []
+
+        def image_fn():
+            if len(rendered) == 0:
+                rendered.append(self.image(step))
+            return rendered[0]
+        return image_fn
+
+    def image(self, step):
+        """
+        Returns:
+            img (np.ndarray): RGB image after the first step edits
+        """
+        if self._hsv is None or self._step > step:
+            self._hsv = self.tiles.run(self.img, to_hsv, 0)
+            self._step = 0
+            self._touched = np.zeros(self.img.shape[:2], dtype=np.uint8)
+            self._bbox = None
+        while self._step < step:
+            self._apply(*self._edits[self._step])
+            self._step += 1
+
+        if self._bbox is None:
+            return self.img
+        top, left, bottom, right = self._bbox
+        rgb = self.tiles.run(self._hsv[top:bottom, left:right], to_rgb, 0)
+        outside = 1 - self._touched[top:bottom, left:right]
+        if rgb.shape == self.img.shape and not outside.any():
+            return rgb
+        img = self.img.copy()
+        img[top:bottom, left:right] = Selector.blend(
+            self.img[top:bottom, left:right], rgb, outside)
+        return img
+
+    def _apply(self, attribute, value, selection):
+        if selection is None:
+            add_hsv_channel(self._hsv, attribute, value)
+            self._touched[:] = 1
+            self._extend((0, 0) + self.img.shape[:2])
+            return
+        inverse, bbox = selection
+        if bbox is None:  # Empty selection
+            return
+        top, left, bottom, right = bbox
+        hsv_roi = self._hsv[top:bottom, left:right]
+        inverse = inverse[top:bottom, left:right]
+        edited_roi = add_hsv_channel(hsv_roi.copy(), attribute, value)
+        hsv_roi[:] = Selector.blend(hsv_roi, edited_roi, inverse)
+        touched = self._touched[top:bottom, left:right]
+        np.bitwise_or(touched, 1 - inverse, out=touched)
+        self._extend(bbox)
+
+    def _extend(self, bbox):
+        if self._bbox is None:
+            self._bbox = tuple(bbox)
+        else:
+            self._bbox = (min(self._bbox[0], bbox[0]),
+                          min(self._bbox[1], bbox[1]),
+                          max(self._bbox[2], bbox[2]),
+                          max(self._bbox[3], bbox[3]))
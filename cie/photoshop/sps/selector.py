@@ -1,8 +1,5 @@
-import itertools
-
 import cv2
 import numpy as np
-from skimage.measure import find_contours
 
 from .actions import PSAct, PSArgs
 from . import utils
@@ -16,30 +13,130 @@ class Selector(object):
     def mask_region(edit_func):
         """
         Uses SimplePhotoshop's mask as selected region
+        Edits with a selection only run on its bounding rectangle.
+        Edits are per pixel, so the result matches a full frame edit,
+        except that OpenCV's HSV conversions may round differently (+/-1)
+        on its vectorised & scalar paths, which depend on the width.
+        Neighbourhood edits, e.g. blurs, also read the pixels
+        around the rectangle they need, see SimplePhotoshop.edit_overlap.
         """
         def wrapper(ps, edit_type, arguments):
-            # Get inverse masked image
-            has_selection = len(ps.masks) > 0
-            if has_selection:  # May contain multiple objects
-                mask = np.zeros_like(ps.img)
-                for object_name, object_mask in ps.masks:
-                    mask = cv2.bitwise_or(mask, object_mask)
-                inv_mask = cv2.bitwise_not(mask)
-                # Get original image excluding the masked regions
-                inv_masked_img = cv2.bitwise_and(inv_mask, ps.img)
-
-            # Edit the whole image
-            edited_img = edit_func(ps, edit_type, arguments)
-            # Get the masked edited image
-            if edited_img is not None and has_selection:
-                masked_edited_img = cv2.bitwise_and(
-                    mask, edited_img)  # mask the edited image
-                edited_img = masked_edited_img + inv_masked_img  # Combine the two
-            return edited_img
+            if len(ps.masks) == 0:  # Global edit on the whole image
+                return edit_func(ps, edit_type, arguments)
+
+            margin = ps.edit_overlap(edit_type, arguments) or 0
+            return Selector.edit_selection(
+                ps.img, Selector.get_selection(ps),
+                lambda img: edit_func(ps, edit_type, arguments, img=img),
+                margin)
         return wrapper
 
     mask_region = staticmethod(mask_region)
 
+    @staticmethod
+    def edit_selection(img, selection, edit_func, margin=0):
+        """
+        Edits the bounding rectangle of the selection,
+        keeps the original image outside of the selection
+        Args:
+            img (np.ndarray)
+            selection (tuple): see composite
+            edit_func (function): image or region of interest -> edited,
+                                  the edited region is copied into the result
+            margin (int): pixels of context around the rectangle
+        Returns:
+            edited_img (np.ndarray): None if edit_func failed
+        """
+        _, inverse, bbox = selection
+        if bbox is None:  # Empty selection, the image is unchanged
+            edited_img = edit_func(img)
+            return None if edited_img is None else img.copy()
+
+        top, left, bottom, right = bbox
+        if margin > 0:
+            height, width = img.shape[:2]
+            top, left = max(top - margin, 0), max(left - margin, 0)
+            bottom, right = min(bottom + margin, height), min(right + margin, width)
+        roi = img[top:bottom, left:right]
+        edited_roi = edit_func(roi)
+        if edited_roi is None:
+            return None
+
+        edited_roi = Selector.blend(roi, edited_roi,
+                                    inverse[top:bottom, left:right])
+        edited_img = img.copy()
+        edited_img[top:bottom, left:right] = edited_roi
+        return edited_img
+
+    @staticmethod
+    def get_selection(ps, shape=None):
+        """
+        Selection of the photoshop's masks, see composite
+        Cached on the photoshop until its masks change
+        Args:
+            shape (tuple): shape of the image, if known without reading it
+        """
+        return ps.get_cached(
+            'selection', ps.masks_version,
+            lambda: Selector.composite([mask for _, mask in ps.masks],
+                                       (shape or ps.img.shape)[:2]))
+
+    @staticmethod
+    def composite(masks, shape):
+        """
+        Composite single channel selection of all masks, its inverse
+        and bounding rectangle
+        Args:
+            masks (list): list of Region
+            shape (tuple): (height, width) of the image
+        Returns:
+            selection (np.ndarray): read-only 2D uint8 mask, 1 if selected
+            inverse (np.ndarray): read-only 2D uint8 mask, 1 if not selected
+            bbox (tuple): (top, left, bottom, right), None if empty
+        """
+        if len(masks) == 1:
+            selection = masks[0].to_array()
+        else:  # May contain multiple objects
+            selection = np.zeros(shape, dtype=bool)
+            for mask in masks:
+                selection |= mask.to_array()
+        inverse = ~selection
+        # Boolean views as uint8 0/1, usable as OpenCV masks
+        selection = selection.view(np.uint8)
+        inverse = inverse.view(np.uint8)
+        selection.flags.writeable = False
+        inverse.flags.writeable = False
+
+        # Union of the bounding boxes, cached on each region
+        bboxes = [mask.bbox() for mask in masks]
+        bboxes = [bbox for bbox in bboxes if bbox is not None]
+        if len(bboxes) == 0:
+            bbox = None
+        else:
+            tops, lefts, bottoms, rights = zip(*bboxes)
+            bbox = (min(tops), min(lefts), max(bottoms), max(rights))
+        return selection, inverse, bbox
+
+    @staticmethod
+    def blend(img, edited_img, inverse):
+        """
+        Copies img into edited_img outside of the selection
+        Args:
+            img (np.ndarray): original image
+            edited_img (np.ndarray): edited image, modified in place if possible
+            inverse (np.ndarray): 2D uint8 inverse selection
+        Returns:
+            edited_img (np.ndarray)
+        """
+        if edited_img is img:
+            return edited_img
+        if not edited_img.flags.writeable or \
+                np.may_share_memory(edited_img, img):
+            edited_img = edited_img.copy()
+        # Single masked copy, dst is only written where inverse is set
+        cv2.bitwise_or(img, img, dst=edited_img, mask=inverse)
+        return edited_img
+
     @staticmethod
     def validate_mask(ps, mask):
         """
@@ -47,7 +144,7 @@ class Selector(object):
         """
         if ps.img is None:
             return False
-        if ps.img.shape != mask.shape:
+        if ps.img.shape[:2] != mask.shape:
             return False
         return True
 
@@ -56,55 +153,47 @@ class Selector(object):
         """
         Draw a polygon onto the image 
         """
-        # Find contours
-        if isinstance(mask, str):
-            mask = utils.b64_to_img(mask)
-        padded_mask = np.zeros(
-            (mask.shape[0] + 2, mask.shape[1] + 2), dtype=np.uint8)
-        padded_mask[1:-1, 1:-1] = mask[:, :, 0]
-        contours = find_contours(padded_mask, 0.5)
+        return Selector.apply_polygons(image, [utils.to_mask(mask)], [color])
 
-        # Plot contours
+    @staticmethod
+    def apply_polygons(image, masks, colors):
+        """
+        Draws the contours of all masks onto a single copy of the image
+        Args:
+            image (np.ndarray)
+            masks (list): list of Region, contours are cached on the region
+            colors (list): one color per mask
+        """
         masked_image = image.copy()
-        for verts in contours:
-            # Subtract the padding
-            # and flip (y, x) to (x, y)
-            verts = np.fliplr(verts) - 1
-            pts = verts.reshape(-1, 1, 2).astype(np.int32)
-            masked_image = cv2.polylines(masked_image, [pts], True, color)
-
+        for mask, color in zip(masks, colors):
+            cv2.polylines(masked_image, mask.contours(), True, color)
         return masked_image
 
     @staticmethod
     def apply_caption(image, mask, caption, color):
-        captioned_image = image.copy()
-        x, y, _ = Selector.find_mask_centroid(mask)
+        """
+        Puts the caption at the centroid of the largest mask component
+        """
+        centroid = Selector.find_mask_centroid(mask)
+        if centroid is None:
+            return image
+        row, col = centroid
         fontFace = cv2.FONT_HERSHEY_SIMPLEX
         fontScale = 1
         thickness = 2
 
         captioned_img = cv2.putText(
-            captioned_image, caption, (y, x), fontFace, fontScale, color, thickness)
+            image.copy(), caption, (col, row), fontFace, fontScale, color, thickness)
         return captioned_img
 
     @staticmethod
     def find_mask_centroid(mask):
         """
-        Find the centroid of a 3 dimensional uint8 mask image
-        """
-        assert ((mask == 0) | (mask == 255)).all() # Either 0 or 255
-        X, Y, Z = mask.shape
-        moment_x = 0
-        moment_y = 0
-        moment_z = 0
-        npixels = 0
-        for x, y, z in itertools.product(range(X), range(Y), range(Z)):
-            if mask[x][y][z] == 255:
-                moment_x += x
-                moment_y += y
-                moment_z += z
-                npixels += 1
-        moment_x /= npixels
-        moment_y /= npixels
-        moment_z /= npixels
-        return round(moment_x), round(moment_y), round(moment_z)
+        Find the centroid of a mask, snapped onto its largest component
+        Args:
+            mask (Region | np.ndarray): region or legacy mask image
+        Returns:
+            centroid (tuple): (row, col), None if the mask is empty
+        """
+        mask = utils.to_mask(mask)
+        return mask.centroid(largest_component=True, snap=True)
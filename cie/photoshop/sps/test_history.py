@@ -0,0 +1,53 @@
+import pytest
+
+from .core import SimplePhotoshop
+
+RUNS = [
+    [("brightness", 60), ("brightness", 60)],
+    [("brightness", 80), ("brightness", 80), ("brightness", -80)],
+    [("brightness", 10), ("brightness", -10)],
+    [("contrast", 50), ("contrast", 50)],
+    [("contrast", 100), ("contrast", -100)],
+    [("brightness", 100), ("contrast", -60), ("brightness", -40)],
+    [("hue", 50), ("hue", -50)],
+    [("saturation", 80), ("saturation", 80), ("lightness", -30)],
+    [("brightness", 30), ("hue", 20), ("brightness", -30)],
+]
+
+
+def run(mode, img, edits, mask=None):
+    ps = SimplePhotoshop(history={"mode": mode})
+    ps.history._background = ps.background = ps.img = img
+    for attribute, value in edits:
+        ps.masks = [] if mask is None else [("0", mask)]
+        assert ps.execute("adjust", {"attribute": attribute,
+                                     "adjust_value": value})[0]
+    return ps
+
+
+@pytest.mark.parametrize("edits", RUNS)
+@pytest.mark.parametrize("masked", [False, True])
+def test_parametric_matches_delta(edits, masked, random_image, ellipse_mask):
+    img = random_image()
+    mask = ellipse_mask() if masked else None
+    delta = run("delta", img, edits, mask)
+    parametric = run("parametric", img, edits, mask)
+    assert (parametric.img == delta.img).all()
+
+    # Every state, as reached by undo
+    for _ in edits:
+        assert delta.control("undo")[0]
+        assert parametric.control("undo")[0]
+        assert (parametric.img == delta.img).all()
+
+
+def test_lut_adjustments_merge(random_image):
+    img = random_image()
+    ps = run("parametric", img, [("brightness", 80), ("contrast", 50),
+                                 ("brightness", -80)])
+    assert len(ps.history.stack) == 1
+    ps = run("parametric", img, [("hue", 50), ("hue", -50)])
+    assert len(ps.history.stack) == 2
+    # Saturating runs summing to 0 are kept
+    ps = run("parametric", img, [("contrast", 100), ("contrast", -100)])
+    assert len(ps.history.stack) == 1
@@ -0,0 +1,121 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from . import hsv
+from .core import SimplePhotoshop
+from .edit import adjust_batch
+
+EDITS = [("saturation", 10), ("hue", 5), ("lightness", -10), ("hue", -5),
+         ("saturation", -5), ("lightness", 5), ("hue", 10), ("saturation", 5)]
+
+
+def run(ps, img, edits, mask=None):
+    ps.reset()
+    ps.history._background = ps.background = ps.img = img
+    ps.masks = [] if mask is None else [("0", mask)]
+    for attribute, value in edits:
+        assert ps.execute("adjust", {"attribute": attribute,
+                                     "adjust_value": value})[0]
+    return ps.img
+
+
+def reference(img, edits):
+    """Single RGB -> HSV -> RGB round trip with all edits
+    """
+    return adjust_batch(img, [("adjust", {"attribute": attribute,
+                                          "adjust_value": value})
+                              for attribute, value in edits])
+
+
+def test_global_edits_match_single_round_trip(random_image):
+    img = random_image(smooth=True)
+    edited = run(SimplePhotoshop(hsv_buffer=True), img, EDITS)
+    assert (edited == reference(img, EDITS)).all()
+
+
+def test_selection_edits_within_one_level(random_image, ellipse_mask):
+    img = random_image(seed=1, smooth=True)
+    mask = ellipse_mask()
+    outside = ~mask.to_array()
+    edited = run(SimplePhotoshop(hsv_buffer=True), img, EDITS, mask)
+
+    expected = reference(img, EDITS)
+    expected[outside] = img[outside]
+    assert (edited[outside] == img[outside]).all()
+    # OpenCV may round the selection's narrower rectangle differently
+    diff = np.abs(edited.astype(np.int16) - expected)
+    assert diff.max() <= 1
+
+
+def test_less_drift_than_per_edit_round_trips(random_image):
+    img = random_image(seed=2, smooth=True)
+    expected = reference(img, EDITS).astype(np.int16)
+    buffered = run(SimplePhotoshop(hsv_buffer=True), img, EDITS)
+    rgb = run(SimplePhotoshop(), img, EDITS)
+    assert np.abs(buffered - expected).mean() < np.abs(rgb - expected).mean()
+
+
+def test_rgb_edits_and_undo_drop_working_image(random_image):
+    img = random_image(seed=3, smooth=True)
+    ps = SimplePhotoshop(hsv_buffer=True)
+    run(ps, img, EDITS[:2])
+    assert ps._hsv is not None
+    assert ps.execute("adjust", {"attribute": "brightness",
+                                 "adjust_value": 10})[0]
+    assert ps._hsv is None
+
+    run(ps, img, EDITS[:2])
+    assert ps.control("undo")[0]
+    assert ps._hsv is None
+    assert (ps.img == run(SimplePhotoshop(hsv_buffer=True), img,
+                          EDITS[:1])).all()
+
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_run_converts_to_rgb_once(masked, random_image, ellipse_mask,
+                                  monkeypatch):
+    conversions = []
+
+    def to_rgb(tile):
+        conversions.append(tile.shape)
+        return cv2.cvtColor(tile, cv2.COLOR_HSV2RGB)
+    monkeypatch.setattr(hsv, "to_rgb", to_rgb)
+
+    img = random_image(seed=4, smooth=True)
+    ps = SimplePhotoshop(hsv_buffer=True)
+    mask = ellipse_mask() if masked else None
+    edited = run(ps, img, EDITS, mask)
+    assert len(conversions) == 1
+    # Unread states are only converted when the history is saved
+    ps.history.to_json()
+    assert len(conversions) == len(EDITS)
+    assert (ps.img == edited).all()
+
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_history_of_run(masked, random_image, ellipse_mask):
+    img = random_image(seed=5, smooth=True)
+    mask = ellipse_mask() if masked else None
+    expected = [run(SimplePhotoshop(hsv_buffer=True), img, EDITS[:i], mask)
+                for i in range(len(EDITS) + 1)]
+
+    ps = SimplePhotoshop(hsv_buffer=True)
+    run(ps, img, EDITS, mask)
+    for i in range(len(EDITS) - 1, -1, -1):
+        assert ps.control("undo")[0]
+        assert (ps.img == expected[i]).all()
+
+    run(ps, img, EDITS, mask)
+    restored = SimplePhotoshop(hsv_buffer=True)
+    restored.history.from_json(json.loads(json.dumps(ps.history.to_json())))
+    for i in range(len(EDITS)):
+        assert (restored.history._image(i) == expected[i + 1]).all()
+
+
+@pytest.mark.parametrize("mode", ["replay", "parametric"])
+def test_needs_delta_history(mode):
+    with pytest.raises(ValueError):
+        SimplePhotoshop(hsv_buffer=True, history={"mode": mode})
@@ -0,0 +1,30 @@
+import os
+
+from .core import SimplePhotoshop
+from .tiles import TileScheduler
+
+
+def test_not_tiled_by_default(random_image):
+    img = random_image(2048, 1024)
+    assert TileScheduler().bands(img) == [(0, 2048)]
+    assert SimplePhotoshop().tiles.num_threads == 1
+
+
+def test_tiles_from_config(random_image):
+    img = random_image(2048, 1024)
+    ps = SimplePhotoshop(tiles={"num_threads": 4})
+    assert len(ps.tiles.bands(img)) == 4
+    ps = SimplePhotoshop(tiles={"num_threads": 0})
+    assert ps.tiles.num_threads == (os.cpu_count() or 1)
+
+
+def test_tiled_edit_matches_whole_image(random_image):
+    img = random_image(2048, 1024)
+    edited = []
+    for num_threads in [1, 4]:
+        ps = SimplePhotoshop(tiles={"num_threads": num_threads})
+        ps.history._background = ps.background = ps.img = img
+        assert ps.execute("adjust", {"attribute": "hue",
+                                     "adjust_value": 20})[0]
+        edited.append(ps.img)
+    assert (edited[0] == edited[1]).all()
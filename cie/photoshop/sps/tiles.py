@@ -0,0 +1,105 @@
+"""
+    Runs edit kernels on horizontal bands of an image in a shared thread pool
+    OpenCV & NumPy release the GIL in their kernels, so bands run in parallel.
+    Bands keep the full image width, so per pixel kernels give the same
+    result as on the whole image, neighbourhood kernels read `overlap`
+    extra rows on each side of their band.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+import numpy as np
+
+# Thread pools shared by all schedulers, num_threads -> ThreadPoolExecutor
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(num_threads):
+    with _pools_lock:
+        pool = _pools.get(num_threads)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=num_threads)
+            _pools[num_threads] = pool
+        return pool
+
+
+def split_rows(height, num_bands, min_rows=1):
+    """
+    Args:
+        height (int)
+        num_bands (int)
+        min_rows (int): minimum rows of a band
+    Returns:
+        bands (list): list of (top, bottom) covering all rows
+    """
+    num_bands = max(1, min(num_bands, height // max(min_rows, 1)))
+    bounds = np.linspace(0, height, num_bands + 1).round().astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class TileScheduler(object):
+    """
+    Splits large images into horizontal bands, one per thread
+    """
+
+    def __init__(self, num_threads=1, min_pixels=1024 * 1024, min_rows=64):
+        """
+        Args:
+            num_threads (int): 1 (default) disables tiling,
+                               0 uses one thread per CPU
+            min_pixels (int): smaller images are edited as a whole,
+                              as thread hand offs would cost more than they save
+            min_rows (int): minimum rows of a band
+        """
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.min_pixels = min_pixels
+        self.min_rows = min_rows
+
+    def bands(self, img):
+        """
+        Returns:
+            bands (list): list of (top, bottom), a single band if not tiled
+        """
+        height, width = img.shape[:2]
+        if self.num_threads <= 1 or height * width < self.min_pixels:
+            return [(0, height)]
+        return split_rows(height, self.num_threads, self.min_rows)
+
+    def run(self, img, kernel, overlap=0):
+        """
+        Args:
+            img (np.ndarray)
+            kernel (function): band -> edited band of the same height,
+                               None on failure
+            overlap (int): rows of context the kernel needs on each side,
+                           None if the kernel needs the whole image
+        Returns:
+            edited_img (np.ndarray): None if any band failed
+        """
+        bands = [(0, img.shape[0])] if overlap is None else self.bands(img)
+        if len(bands) == 1:
+            return kernel(img)
+
+        height = img.shape[0]
+
+        def run_band(band):
+            top, bottom = band
+            context_top = max(top - overlap, 0)
+            context_bottom = min(bottom + overlap, height)
+            edited = kernel(img[context_top:context_bottom])
+            if edited is None:
+                return None
+            return edited[top - context_top:bottom - context_top]
+
+        pool = get_pool(self.num_threads)
+        edited_bands = list(pool.map(run_band, bands))
+        if any(edited is None for edited in edited_bands):
+            return None
+
+        first = edited_bands[0]
+        edited_img = np.empty((height,) + first.shape[1:], dtype=first.dtype)
+        for (top, bottom), edited in zip(bands, edited_bands):
+            edited_img[top:bottom] = edited
+        return edited_img
@@ -1,5 +1,5 @@
-import base64
 import colorsys
+from functools import lru_cache
 import random
 import sys
 
@@ -11,6 +11,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 from skimage.measure import find_contours
 
+from ...util.mask import Mask, to_mask
+# Share codecs and their decoded image cache with cie.util
+from ...util.message import img_to_b64, b64_to_img
+from ...util.store import blob_store, resolve_image
+
 
 def imread(image_path):
     """Provides a wrapper over cv2.imread that converts to RGB space
@@ -20,23 +25,20 @@ def imread(image_path):
     return rgb_img
 
 
-def img_to_b64(img):
-    """Converts RGB -> BGR, encodes to jpeg and then converts to base64
+def downscale(img, max_side):
+    """Resizes img so that its longest side is at most max_side
+    Args:
+        img (np.ndarray)
+        max_side (int)
+    Returns:
+        img (np.ndarray): img itself if already small enough
     """
-    bgr_img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-    _, nparr = cv2.imencode('.png', bgr_img)
-    b64_img_str = base64.b64encode(nparr).decode()
-    return b64_img_str
-
-
-def b64_to_img(b64_img_str):
-    """Converts base64 string back to numpy array
-    """
-    buf = base64.b64decode(b64_img_str)
-    nparr = np.frombuffer(buf, np.uint8)
-    bgr_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
-    return rgb_img
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return img
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
 
 
 ##########################
@@ -62,26 +64,68 @@ def random_colors(N, bright=True):
     return colors
 
 
-def apply_mask(image, mask, color=None, alpha=0.5):
+@lru_cache(maxsize=None)
+def blend_lut(color, alpha):
+    """
+    Per channel lookup table of image * (1 - alpha) + alpha * color,
+    truncated to uint8
+    Args:
+        color (tuple): RGB color, values between 0 and 255
+        alpha (float)
+    Returns:
+        lut (np.ndarray): read-only (256, 1, 3) uint8 table
+    """
+    values = np.arange(256, dtype=np.uint8)
+    lut = np.empty((256, 1, 3), dtype=np.uint8)
+    for c in range(3):
+        lut[:, 0, c] = (values * (1 - alpha) + alpha * color[c]).astype(
+            np.uint32)
+    lut.flags.writeable = False
+    return lut
+
+
+def blend_color(image, color, alpha=0.5, mask=None, out=None):
+    """
+    Blends a constant color into the image with a single table lookup
+    Args:
+        image (np.ndarray): RGB uint8 image
+        color (list): RGB color, values between 0 and 255
+        alpha (float)
+        mask (np.ndarray): 2D bool/uint8 selection, blends everywhere if None
+        out (np.ndarray): output buffer, may be image itself
+    Returns:
+        out (np.ndarray)
+    """
+    lut = blend_lut(tuple(float(c) for c in color), alpha)
+    if mask is None:
+        return cv2.LUT(image, lut, dst=out)
+
+    blended = cv2.LUT(image, lut)
+    if out is None:
+        out = image.copy()
+    elif out is not image:
+        np.copyto(out, image)
+    if mask.dtype == bool:
+        mask = mask.view(np.uint8)
+    cv2.bitwise_or(blended, blended, dst=out, mask=mask)
+    return out
+
+
+def apply_mask(image, mask, color=None, alpha=0.5, out=None):
     """
     Apply the given mask to the image.
+    Args:
+        image (np.ndarray)
+        mask (Region | np.ndarray): region, 2D mask or legacy 3D mask image
+        color (list): RGB color between 0 and 255, see random_colors
+        alpha (float)
+        out (np.ndarray): output buffer
     """
     if color is None:
         color = random_colors(1)[0]  # We have only 1 mask at this moment
 
-    # Convert
-    masked_image = image.astype(np.uint32).copy()
-    boolean_mask = mask.astype('bool').copy()
-
-    for c in range(3):
-        condition = boolean_mask[:, :, c] == 1
-        masked_channel = image[:, :, c] * (1 - alpha) + alpha * color[c] * 255
-        masked_image[:, :, c] = np.where(
-            condition, masked_channel, masked_image[:, :, c])
-
-    masked_image = masked_image.astype(np.uint8)
-
-    return masked_image
+    mask = to_mask(mask).to_array()
+    return blend_color(image, color, alpha, mask=mask, out=out)
 
 
 def plot_diff(img1, img2, cmap=None, figname='diff.png'):
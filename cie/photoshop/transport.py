@@ -0,0 +1,697 @@
+"""
+Transports between SimplePhotoshopClient and a photoshop server
+- HTTPTransport: one binary POST per turn to /batch, falls back to
+  form encoded JSON with base64 PNG images on /action
+- SharedMemoryTransport: same host only, pixels are copied into
+  memory mapped files and only their offsets go over a local socket.
+  Each array is copied once into the sender's arena, the receiver reads it
+  in place or copies it out if it has to outlive the next message.
+  Peers authenticate with a shared key, see shm_authkey
+"""
+import collections
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urljoin
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..util import Region, blob_store, is_image_handle, img_to_b64, encode_img, decode_img
+
+logger = logging.getLogger(__name__)
+
+ARRAY_KEY = "__array__"
+BUFFER_KEY = "__buffer__"
+AUTHKEY_ENV = "CIE_PHOTOSHOP_AUTHKEY"
+
+
+def shm_authkey(authkey=None):
+    """
+    Key of the shared memory socket, from the argument,
+    else from the CIE_PHOTOSHOP_AUTHKEY environment variable
+    Args:
+        authkey (str | bytes)
+    Returns:
+        authkey (bytes)
+    Raises:
+        ValueError: if no key is configured
+    """
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError("No shared memory photoshop authkey, set {} or "
+                         "photoshop.shm_authkey".format(AUTHKEY_ENV))
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    return authkey
+
+
+def shared_dir():
+    """
+    RAM backed directory for arenas if available
+    """
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class SharedArena(object):
+    """
+    Memory mapped file holding the arrays of one message.
+    Written by a single process, mapped read-only by its peer.
+    Arrays read from an arena are views, valid until the writer's next message.
+    """
+
+    def __init__(self, path, size=16 * 1024 * 1024, writable=True):
+        self.path = path
+        self.writable = writable
+        self._offset = 0
+        self._file = open(path, "w+b" if writable else "rb")
+        if writable:
+            self._file.truncate(size)
+        self._map = None
+        self._remap()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        size = os.fstat(self._file.fileno()).st_size
+        access = mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ
+        self._map = mmap.mmap(self._file.fileno(), size, access=access)
+
+    def reset(self):
+        """Starts a new message, previous arrays are overwritten
+        """
+        self._offset = 0
+
+    def put(self, arr):
+        """
+        Args:
+            arr (np.ndarray)
+        Returns:
+            desc (dict): location of the array in the arena
+        """
+        arr = np.ascontiguousarray(arr)
+        offset = (self._offset + 63) // 64 * 64  # Cache line aligned
+        end = offset + arr.nbytes
+        if end > len(self._map):
+            self._file.truncate(max(end, 2 * len(self._map)))
+            self._remap()
+        dst = np.frombuffer(self._map, np.uint8, arr.nbytes, offset)
+        dst[:] = arr.view(np.uint8).ravel()
+        self._offset = end
+        return {ARRAY_KEY: True, "offset": offset, "shape": list(arr.shape),
+                "dtype": arr.dtype.str}
+
+    def get(self, desc, copy=False):
+        """
+        Returns:
+            arr (np.ndarray): read-only view into the arena, or a copy
+        """
+        dtype = np.dtype(desc["dtype"])
+        count = int(np.prod(desc["shape"]))
+        if desc["offset"] + count * dtype.itemsize > len(self._map):
+            self._remap()  # Grown by the writer
+        arr = np.frombuffer(self._map, dtype, count, desc["offset"])
+        arr = arr.reshape(desc["shape"])
+        if copy:
+            return arr.copy()
+        arr.flags.writeable = False
+        return arr
+
+    def close(self, unlink=False):
+        self._map.close()
+        self._file.close()
+        if unlink and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def pack(obj, arena):
+    """
+    Replaces arrays in obj by their arena descriptors
+    """
+    if isinstance(obj, np.ndarray):
+        return arena.put(obj)
+    if isinstance(obj, dict):
+        return {k: pack(v, arena) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [pack(v, arena) for v in obj]
+    return obj
+
+
+def unpack(obj, arena, copy=False):
+    """
+    Inverse of pack, arrays are views into the arena unless copied
+    """
+    if isinstance(obj, dict):
+        if obj.get(ARRAY_KEY):
+            return arena.get(obj, copy)
+        return {k: unpack(v, arena, copy) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [unpack(v, arena, copy) for v in obj]
+    return obj
+
+
+def encode_args(obj, encode_region, encode_image):
+    """
+    Converts regions & image handles in action arguments for a transport
+    """
+    if isinstance(obj, Region):
+        return encode_region(obj)
+    if is_image_handle(obj):
+        return encode_image(obj)
+    if isinstance(obj, dict):
+        return {k: encode_args(v, encode_region, encode_image)
+                for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_args(v, encode_region, encode_image) for v in obj]
+    return obj
+
+
+FRAME_MAGIC = b"CIEB"
+FRAME_HEADER = struct.Struct(">4sI")  # magic, header length
+BUFFER_HEADER = struct.Struct(">Q")  # buffer length
+
+
+def encode_frame(obj, profile="lossless-fast"):
+    """
+    Length prefixed binary message:
+    magic, JSON header length, JSON header, then every buffer with its length.
+    Images & masks in obj are replaced by buffer references in the header,
+    so pixels are never base64 encoded.
+    Args:
+        obj: JSON serializable apart from Region, image handles & arrays
+        profile (str): codec profile of images
+    Returns:
+        frame (bytes)
+    """
+    buffers = []
+
+    def add(data, **desc):
+        desc[BUFFER_KEY] = len(buffers)
+        buffers.append(data)
+        return desc
+
+    def encode(value):
+        if isinstance(value, Region):
+            value = value.to_array()
+        elif is_image_handle(value):
+            value = blob_store.get_image(value)
+        if isinstance(value, np.ndarray):
+            if value.dtype == np.bool_:  # Masks, 1 bit per pixel
+                return add(np.packbits(value, axis=None).tobytes(),
+                           kind="mask", shape=list(value.shape))
+            return add(encode_img(value, profile), kind="image")
+        if isinstance(value, dict):
+            return {k: encode(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(v) for v in value]
+        return value
+
+    header = json.dumps(encode(obj), separators=(',', ':')).encode()
+    parts = [FRAME_HEADER.pack(FRAME_MAGIC, len(header)), header]
+    for data in buffers:
+        parts.append(BUFFER_HEADER.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_frame(frame):
+    """
+    Inverse of encode_frame, images & masks are decoded to arrays
+    Raises:
+        ValueError: if frame is not a binary message
+    """
+    magic, header_len = FRAME_HEADER.unpack_from(frame)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Not a binary photoshop message")
+    offset = FRAME_HEADER.size
+    header = json.loads(frame[offset:offset + header_len].decode())
+    offset += header_len
+    buffers = []
+    while offset < len(frame):
+        length, = BUFFER_HEADER.unpack_from(frame, offset)
+        offset += BUFFER_HEADER.size
+        buffers.append(frame[offset:offset + length])
+        offset += length
+
+    def decode(value):
+        if isinstance(value, dict):
+            if BUFFER_KEY in value:
+                data = buffers[value[BUFFER_KEY]]
+                if value["kind"] == "mask":
+                    shape = value["shape"]
+                    bits = np.unpackbits(np.frombuffer(data, np.uint8))
+                    return bits[:int(np.prod(shape))].reshape(shape).astype(bool)
+                return decode_img(data)
+            return {k: decode(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [decode(v) for v in value]
+        return value
+
+    return decode(header)
+
+
+class BatchUnsupported(Exception):
+    """
+    Server has no batch endpoint
+    """
+    pass
+
+
+class HTTPTransport(object):
+    """
+    All commands of a turn and the resulting images go in one binary
+    POST to /batch, over a pooled keep-alive session.
+    Servers without /batch are used through the form encoded /action endpoint.
+    """
+
+    def __init__(self, photoshop_uri, timeout=(3.05, 60), retries=2,
+                 backoff=0.1, pool_size=4, profile="lossless-fast"):
+        """
+        Args:
+            photoshop_uri (str)
+            timeout (float | tuple): requests (connect, read) timeout in seconds
+            retries (int): retries of a batch on connection errors, timeouts
+                           & 502/503/504, batches are applied once by the server
+            backoff (float): seconds before the first retry, doubled after each
+            pool_size (int): kept alive connections
+            profile (str): codec profile of images in binary messages
+        """
+        self.action_uri = urljoin(photoshop_uri, 'action')
+        self.batch_uri = urljoin(photoshop_uri, 'batch')
+        self.timeout = tuple(timeout) if isinstance(timeout, list) else timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.profile = profile
+        self.use_batch = True
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, action, intent, args):
+        """
+        Args:
+            action (str): control | edit
+            intent (str)
+            args (dict): may contain Region and image handles
+        Returns:
+            response (dict)
+        """
+        args = encode_args(args, lambda region: region.to_b64(),
+                           blob_store.get_b64)
+        data = {'action': action, 'intent': intent, 'args': json.dumps(args)}
+        res = self.session.post(self.action_uri, data=data,
+                                timeout=self.timeout)
+        res.raise_for_status()
+        return res.json()
+
+    def check(self):
+        """
+        Returns:
+            img (str): handle of the current image, "" if none
+            masked_img (str): handle of the image with selection contours
+        """
+        check_obj = self.request('control', 'check', {})
+        handles = []
+        for key in ["b64_img_str", "masked_b64_img_str"]:
+            b64_img_str = check_obj.get(key, "")
+            handles.append(blob_store.put_b64(b64_img_str)
+                           if b64_img_str else "")
+        return tuple(handles)
+
+    def _post_batch(self, body):
+        headers = {'Content-Type': 'application/octet-stream'}
+        for attempt in range(self.retries + 1):
+            try:
+                res = self.session.post(self.batch_uri, data=body,
+                                        headers=headers, timeout=self.timeout)
+                if res.status_code == 404:
+                    raise BatchUnsupported(self.batch_uri)
+                if res.status_code not in (502, 503, 504):
+                    res.raise_for_status()
+                    return decode_frame(res.content)
+                error = requests.HTTPError(res.status_code, response=res)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < self.retries:
+                logger.warning("Batch failed, retrying: {}".format(error))
+                time.sleep(self.backoff * 2**attempt)
+        raise error
+
+    def batch(self, commands, check=True):
+        """
+        Args:
+            commands (list): list of (action, intent, args), executed in order
+            check (bool): also returns the resulting images
+        Returns:
+            responses (list): response of each command
+            img (str): image handle, "" if none or not checked
+            masked_img (str)
+        """
+        if self.use_batch:
+            # The id lets the server skip batches it already applied
+            message = {'id': uuid.uuid4().hex, 'check': check,
+                       'commands': [{'action': action, 'intent': intent,
+                                     'args': args}
+                                    for action, intent, args in commands]}
+            try:
+                response = self._post_batch(
+                    encode_frame(message, self.profile))
+            except BatchUnsupported:
+                logger.warning("No batch endpoint, using {}".format(
+                    self.action_uri))
+                self.use_batch = False
+            else:
+                return batch_result(response)
+
+        responses = [self.request(action, intent, args)
+                     for action, intent, args in commands]
+        img, masked_img = self.check() if check else ("", "")
+        return responses, img, masked_img
+
+    def close(self):
+        self.session.close()
+
+
+def batch_result(response):
+    """
+    Interns the images of a batch response
+    """
+    handles = []
+    for key in ["img", "masked_img"]:
+        img = response.get(key)
+        # Views are copied by blob_store only if the image is new
+        handles.append("" if img is None else blob_store.put_image(img))
+    return (response["responses"],) + tuple(handles)
+
+
+class SharedMemoryTransport(object):
+    """
+    Same host transport to a SharedMemoryPhotoshopServer.
+    Requests carry masks & images in the client's arena,
+    responses in the server's arena, the socket only carries small dicts.
+    Arrays returned by request are read-only views into the server's arena,
+    valid until the next request on this transport, copy them to keep them.
+    check & batch intern their images in blob_store, which copies new images.
+    """
+
+    def __init__(self, address, authkey=None):
+        """
+        Args:
+            address (str): unix socket path or (host, port)
+            authkey (str | bytes): see shm_authkey
+        """
+        self.conn = Client(address, authkey=shm_authkey(authkey))
+        path = os.path.join(shared_dir(),
+                            "cie-client-{}.arena".format(uuid.uuid4().hex))
+        self.arena = SharedArena(path)
+        self.conn.send({"arena": path})
+        self.server_arena = SharedArena(self.conn.recv()["arena"],
+                                        writable=False)
+
+    def _send(self, message):
+        self.arena.reset()
+        self.conn.send(pack(message, self.arena))
+        response = self.conn.recv()
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return unpack(response, self.server_arena)
+
+    def request(self, action, intent, args):
+        """
+        See HTTPTransport.request, masks are sent as 2D bool arrays,
+        arrays in the response are views valid until the next request
+        """
+        args = encode_args(args, lambda region: region.to_array(),
+                           blob_store.get_image)
+        return self._send({'action': action, 'intent': intent, 'args': args})
+
+    def check(self):
+        """
+        See HTTPTransport.check
+        """
+        check_obj = self._send({'action': 'control', 'intent': 'check',
+                                'args': {}})
+        handles = []
+        for key in ["img", "masked_img"]:
+            img = check_obj.get(key)
+            # Views are copied by blob_store only if the image is new
+            handles.append("" if img is None else blob_store.put_image(img))
+        return tuple(handles)
+
+    def batch(self, commands, check=True):
+        """
+        See HTTPTransport.batch
+        """
+        commands = [{'action': action, 'intent': intent,
+                     'args': encode_args(args, lambda region: region.to_array(),
+                                         blob_store.get_image)}
+                    for action, intent, args in commands]
+        return batch_result(self._send({'action': 'batch', 'check': check,
+                                        'commands': commands}))
+
+    def close(self):
+        self.conn.close()
+        self.arena.close(unlink=True)
+        self.server_arena.close()
+
+
+class PhotoshopService(object):
+    """
+    Executes transport requests on a SimplePhotoshop.
+    One photoshop is shared by all connections, requests are serialized.
+    """
+
+    def __init__(self, photoshop, max_batch_ids=64):
+        """
+        Args:
+            photoshop (SimplePhotoshop)
+            max_batch_ids (int): responses kept for retried batches
+        """
+        self.photoshop = photoshop
+        self.lock = threading.Lock()
+        self._batches = collections.OrderedDict()
+        self.max_batch_ids = max_batch_ids
+
+    def handle(self, action, intent, args):
+        """
+        Args:
+            action (str): control | edit
+            intent (str)
+            args (dict): masks & images as arrays
+        Returns:
+            response (dict)
+        """
+        ps = self.photoshop
+        if action == "control" and intent == "check":
+            return {"img": ps.get_image(plot_mask=False),
+                    "masked_img": ps.get_image(plot_mask=True)}
+        if action == "control":
+            result, msg = ps.control(intent, args)
+        else:
+            result, msg = ps.execute(intent, args)
+        return {"result": bool(result), "msg": str(msg)}
+
+    def handle_batch(self, commands, check=True, batch_id=None, encode=None):
+        """
+        Executes commands in order as one turn, then checks the images.
+        A failing command doesn't stop the following ones,
+        as with separate requests.
+        Args:
+            commands (list): list of dict with action, intent & args
+            check (bool)
+            batch_id (str): retried batches with the same id are not reapplied
+            encode (function): encodes the response while the photoshop is locked,
+                               the encoded response is kept for retries
+        Returns:
+            response (dict | encoded response)
+        """
+        with self.lock:
+            if batch_id is not None and batch_id in self._batches:
+                return self._batches[batch_id]
+            responses = []
+            for command in commands:
+                try:
+                    responses.append(self.handle(command["action"],
+                                                 command["intent"],
+                                                 command["args"]))
+                except Exception as e:
+                    logger.exception("Failed to handle command")
+                    responses.append({"result": False, "msg": "failure",
+                                      "error": repr(e)})
+            response = {"responses": responses}
+            if check:
+                response.update(self.handle("control", "check", {}))
+            if encode is not None:
+                response = encode(response)
+            if batch_id is not None:
+                self._batches[batch_id] = response
+                while len(self._batches) > self.max_batch_ids:
+                    self._batches.popitem(last=False)
+            return response
+
+
+class SharedMemoryPhotoshopServer(object):
+    """
+    Serves a SimplePhotoshop to SharedMemoryTransport clients on this host
+    """
+
+    def __init__(self, photoshop, address, authkey=None):
+        """
+        Args:
+            photoshop (SimplePhotoshop)
+            address (str): unix socket path or (host, port)
+            authkey (str | bytes): see shm_authkey
+        """
+        self.service = PhotoshopService(photoshop)
+        self.listener = Listener(address, authkey=shm_authkey(authkey))
+        self.address = self.listener.address
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError:
+                logger.warning("Rejected a client with a wrong authkey")
+                continue
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        client_arena = SharedArena(conn.recv()["arena"], writable=False)
+        path = os.path.join(shared_dir(),
+                            "cie-server-{}.arena".format(uuid.uuid4().hex))
+        arena = SharedArena(path)
+        conn.send({"arena": path})
+        try:
+            while True:
+                # The photoshop keeps images, so they are copied out
+                message = unpack(conn.recv(), client_arena, copy=True)
+                # Arrays are packed while locked, before the next edit
+                if message["action"] == "batch":
+                    response = self.service.handle_batch(
+                        message["commands"], message["check"],
+                        encode=lambda response: self._pack(response, arena))
+                else:
+                    with self.service.lock:
+                        try:
+                            response = self.service.handle(
+                                message["action"], message["intent"],
+                                message["args"])
+                        except Exception as e:
+                            logger.exception("Failed to handle request")
+                            response = {"error": repr(e)}
+                        response = self._pack(response, arena)
+                conn.send(response)
+        except EOFError:  # Client disconnected
+            pass
+        finally:
+            conn.close()
+            client_arena.close()
+            arena.close(unlink=True)
+
+    def _pack(self, response, arena):
+        arena.reset()
+        return pack(response, arena)
+
+    def close(self):
+        self.listener.close()
+
+
+class PhotoshopRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /batch: binary messages, see encode_frame
+    POST /action: form encoded action, intent & JSON args,
+                  images & masks as base64 PNG
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    # Headers & body are separate writes, delayed ACKs would stall them
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        path = self.path.rstrip('/')
+        try:
+            if path.endswith('/batch'):
+                content_type, body = self.handle_batch(body)
+            elif path.endswith('/action'):
+                content_type, body = self.handle_action(body)
+            else:
+                self.send_error(404)
+                return
+            status = 200
+        except Exception as e:
+            logger.exception("Failed to handle request")
+            content_type, status = 'text/plain', 400
+            body = repr(e).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_batch(self, body):
+        message = decode_frame(body)
+        # Images are encoded while the photoshop is locked
+        frame = self.server.service.handle_batch(
+            message["commands"], message.get("check", True), message.get("id"),
+            encode=lambda response: encode_frame(response, self.server.profile))
+        return 'application/octet-stream', frame
+
+    def handle_action(self, body):
+        form = parse_qs(body.decode())
+        action, intent = form['action'][0], form['intent'][0]
+        args = json.loads(form['args'][0]) if 'args' in form else {}
+        with self.server.service.lock:
+            response = self.server.service.handle(action, intent, args)
+            if "img" in response:
+                response = {
+                    key: "" if img is None else img_to_b64(img)
+                    for key, img in [("b64_img_str", response["img"]),
+                                     ("masked_b64_img_str",
+                                      response["masked_img"])]}
+        return 'application/json', json.dumps(response).encode()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class PhotoshopHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves a SimplePhotoshop over HTTP, a local stand-in of the photoshop server
+    """
+    daemon_threads = True
+
+    def __init__(self, photoshop, address=("localhost", 2005),
+                 profile="lossless-fast"):
+        """
+        Args:
+            photoshop (SimplePhotoshop)
+            address (tuple): (host, port), port 0 picks a free port
+            profile (str): codec profile of images in binary responses
+        """
+        self.service = PhotoshopService(photoshop)
+        self.profile = profile
+        HTTPServer.__init__(self, address, PhotoshopRequestHandler)
+
+    @property
+    def uri(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}/".format(host, port)
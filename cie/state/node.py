@@ -136,6 +136,18 @@ class BeliefNode(object):
         max_value, _ = self.get_max_conf_value()
         return max_value
 
+    def value_to_json(self, value):
+        """
+        Serializes a slot value for session storage
+        """
+        return value
+
+    def value_from_json(self, obj):
+        """
+        Inverse of value_to_json
+        """
+        return obj
+
     def to_json(self):
         """
         Returns:
@@ -493,6 +505,28 @@ class PSBinaryInfoNode(PSToolNode):
         return l
 
 
+class PSMaskNode(PSToolNode):
+    """
+    PSToolNode that stores a single Region (Mask, point, box or polygon)
+    Examples:
+        gesture_click
+    """
+
+    def add_observation(self, value, conf, turn_id):
+        """
+        Legacy b64 mask strings are converted to Mask
+        """
+        if isinstance(value, str) and value != "":
+            value = util.to_mask(value)
+        return super(PSMaskNode, self).add_observation(value, conf, turn_id)
+
+    def value_to_json(self, value):
+        return value.to_json()
+
+    def value_from_json(self, obj):
+        return util.region_from_json(obj)
+
+
 class ObjectMaskStrNode(BeliefNode):
     """
     Customized node for object_mask_str
@@ -540,6 +574,7 @@ class ObjectMaskStrNode(BeliefNode):
             logger.info("{} {} observed value empty".format(
                 class_name, self.name))
             return False
+        value = util.to_mask(value)
         prev_value_conf_map = copy.deepcopy(self.value_conf_map)
         self.value_conf_map = {}
         result = super(ObjectMaskStrNode, self).add_observation(
@@ -685,10 +720,13 @@ class ObjectMaskStrNode(BeliefNode):
         """
         Check if gesture_click(mask) & candidate(mask) overlaps
         """
-        gesture_mask = util.b64_to_img(gesture_click)
-        candidate_mask = util.b64_to_img(mask_candidate)
-        assert gesture_mask.shape == candidate_mask.shape
-        return (gesture_mask & candidate_mask).sum() > 0
+        return gesture_click.overlaps(mask_candidate)
+
+    def value_to_json(self, value):
+        return value.to_json()
+
+    def value_from_json(self, obj):
+        return util.region_from_json(obj)
 
 
 def builder(string):
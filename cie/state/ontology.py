@@ -126,8 +126,10 @@ class OntologyEngine(object):
         obj = {}
 
         for slot_name, slot_node in self.slots.items():
+            value_conf = [(slot_node.value_to_json(v), c)
+                          for v, c in slot_node.value_conf_map.items()]
             obj[slot_name] = {
-                'value_conf': list(slot_node.value_conf_map.items()),
+                'value_conf': value_conf,
                 'last_update_turn_id': slot_node.last_update_turn_id
             }
         return obj
@@ -137,6 +139,8 @@ class OntologyEngine(object):
         Load slot values from obj 
         """
         for slot_name, slot_obj in obj.items():
-            self.slots[slot_name].value_conf_map = dict(
-                slot_obj["value_conf"])
+            slot_node = self.slots[slot_name]
+            self.slots[slot_name].value_conf_map = {
+                slot_node.value_from_json(v): c
+                for v, c in slot_obj["value_conf"]}
             self.slots[slot_name].last_update_turn_id = slot_obj["last_update_turn_id"]
@@ -5,7 +5,7 @@ from ..core import UserAct, SysIntent
 from .executionhistory import ExecutionHistory
 from .ontology import OntologyEngine
 from .node import builder as nodelib
-from ..util import slot_to_observation
+from ..util import slot_to_observation, blob_store, is_image_handle
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -160,19 +160,32 @@ class State(object):
     def clear_history(self):
         self.executionhistory.clear()
 
-    def to_json(self):
+    def to_json(self, blobs=None):
         """
         Serialize to json
+        Args:
+            blobs (PersistentStore): durable store of the images whose
+                                     handles are slot values
         """
         obj = {}
         obj["history"] = self.executionhistory.to_json()
         obj["slot_values"] = self.ontology.to_json()
+        if blobs is not None:
+            handles = set(
+                value for slot_obj in obj["slot_values"].values()
+                for value, _ in slot_obj["value_conf"]
+                if is_image_handle(value))
+            obj["images"] = blob_store.save(handles, blobs)
         return obj
 
-    def from_json(self, obj):
+    def from_json(self, obj, blobs=None):
         """
         Load from serialized json
+        Images saved by to_json are interned again,
+        so that their handles resolve in this process
         """
+        if blobs is not None:
+            blob_store.load(obj.get("images", {}), blobs)
         self.executionhistory.from_json(obj["history"])
         self.ontology.from_json(obj["slot_values"])
 
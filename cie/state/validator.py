@@ -1,11 +1,9 @@
-import base64
 import logging
 import os
 import sys
 from urllib.parse import urlparse
 
-import cv2
-import numpy as np
+from ..util import Region, b64_to_img
 
 logger = logging.getLogger(__name__)
 
@@ -52,14 +50,17 @@ class PathValidator(BaseValidator):
 class B64ImgStrValidator(BaseValidator):
     def __call__(self, obj):
         try:
-            buf = base64.b64decode(obj)
-            nparr = np.frombuffer(buf, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            b64_to_img(obj)
         except:
             return False
         return True
 
 
+class MaskValidator(BaseValidator):
+    def __call__(self, obj):
+        return isinstance(obj, Region)
+
+
 class BooleanValidator(BaseValidator):
     def __call__(self, obj):
         return isinstance(obj, bool)
@@ -7,7 +7,7 @@ from nltk import edit_distance
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 
-from ..util import build_slot_dict
+from ..util import build_slot_dict, PointRegion, BoxRegion
 
 english_stopwords = stopwords.words('english')
 stemmer = PorterStemmer()
@@ -25,6 +25,7 @@ class EditmeTagger(object):
     """
     Calls the tracker on editme for state updates
     """
+    GESTURE_KEYS = ['image_shape', 'gesture_click', 'object_mask_str']
 
     def __init__(self, uri):
         self.uri = uri
@@ -45,10 +46,44 @@ class EditmeTagger(object):
         else:
             tracker_act = self.act_editme(sentence)
 
+        gesture_slots = self.act_gesture()
+        if len(gesture_slots):
+            tracker_act.setdefault('slots', list()).extend(gesture_slots)
+
         act = copy.deepcopy(self.observation)
+        for key in self.GESTURE_KEYS:
+            act.pop(key, None)
         act['user_acts'] = [tracker_act]
         return act
 
+    def act_gesture(self):
+        """
+        Converts gestures on the image into region slots
+        Observation keys:
+            image_shape (tuple): (height, width)
+            gesture_click (dict): {'x': row, 'y': col}
+            object_mask_str (dict): {'top', 'left', 'width', 'height'}
+        Returns:
+            slots (list): gesture_click & object_mask_str slots
+        """
+        slots = []
+        image_shape = self.observation.get('image_shape')
+        if image_shape is None:
+            return slots
+
+        click = self.observation.get('gesture_click')
+        if click is not None:
+            region = PointRegion(image_shape, click['x'], click['y'])
+            slots.append(build_slot_dict('gesture_click', region, 1.0))
+
+        box = self.observation.get('object_mask_str')
+        if box is not None:
+            top, left = box['top'], box['left']
+            region = BoxRegion(image_shape, top, left,
+                               top + box['height'], left + box['width'])
+            slots.append(build_slot_dict('object_mask_str', region, 1.0))
+        return slots
+
     def act_inform(self, intent):
         tracker_act = {
             'dialogue_act': build_slot_dict('dialogue_act', 'inform', 1.0),
@@ -7,7 +7,7 @@ import sys
 import numpy as np
 
 from ..core import UserAct, SystemAct
-from ..util import find_slot_with_key, b64_to_img, build_slot_dict, sort_slots_with_key
+from ..util import find_slot_with_key, to_mask, build_slot_dict, sort_slots_with_key
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +33,8 @@ class AgendaBasedUserSimulator(object):
     Also defines reward model
     """
 
+    MASK_SLOTS = ["object_mask_str", "gesture_click"]
+
     def __init__(self, user_config, **kwargs):
         """
         Initialize user simulator with configuration
@@ -53,9 +55,30 @@ class AgendaBasedUserSimulator(object):
         Args:
             agenda (list): list of goals
         """
-        self.agenda = agenda.copy()
+        self.agenda = [self.load_goal(goal) for goal in agenda]
         self.agenda_backup = self.agenda.copy()
 
+    def load_goal(self, goal):
+        """
+        Converts legacy b64 mask strings in goal slots to Mask
+        Args:
+            goal (dict)
+        Returns:
+            goal (dict): a shallow copy if conversion is needed
+        """
+        slots = goal.get('slots', list())
+        if not any(isinstance(s.get('value'), str) and s['slot'] in self.MASK_SLOTS
+                   for s in slots):
+            return goal
+        goal = goal.copy()
+        goal['slots'] = []
+        for slot in slots:
+            if slot['slot'] in self.MASK_SLOTS:
+                slot = build_slot_dict(slot['slot'], to_mask(slot['value']),
+                                       slot.get('conf'))
+            goal['slots'].append(slot)
+        return goal
+
     def completed_goals(self):
         """
         Returns number of completed goals, excluding "undo, redo"
@@ -377,15 +400,15 @@ class AgendaBasedUserSimulator(object):
         The eyes of the user
         Computes the dice metric between the mask_str and the target_mask_str
         Args:
-            mask_str (str): b64 image string
-            target_mask_str (str): b64 image string
+            mask_str (Mask): mask
+            target_mask_str (Mask): mask
         Returns:
             dice (float): dice metric
         """
-        mask = b64_to_img(mask_str)
-        goal_mask = b64_to_img(goal_mask_str)
+        mask = to_mask(mask_str)
+        goal_mask = to_mask(goal_mask_str)
         assert mask.shape == goal_mask.shape
-        dice = 2 * (mask & goal_mask).sum() / (mask.sum() + goal_mask.sum())
+        dice = mask.dice(goal_mask)
         return dice
 
     def template_nlg(self, user_acts):
@@ -410,7 +433,7 @@ class AgendaBasedUserSimulator(object):
                             "object_mask_str", "gesture_click",
                             "original_b64_img_str"
                     ]:
-                        slot_msg = slot["slot"] + "=" + slot["value"][:5]
+                        slot_msg = slot["slot"] + "=" + str(slot["value"])[:5]
                     elif slot["slot"] == "mask_strs":
                         slot_msg = slot["slot"] + "=" + len(slot["value"])
                     else:
@@ -1,4 +1,9 @@
+from .cache import *
+from .codec import *
 from .io import *
+from .mask import *
 from .message import *
+from .persist import *
+from .region import *
 from .session import *
-#from .util import *
+from .store import *
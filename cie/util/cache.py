@@ -0,0 +1,108 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+import numpy as np
+
+
+def digest(obj):
+    """
+    Content digest used as cache key
+    Args:
+        obj (str | bytes | np.ndarray)
+    Returns:
+        digest (bytes)
+    """
+    h = hashlib.sha1()
+    if isinstance(obj, np.ndarray):
+        h.update("{}{}".format(obj.dtype.str, obj.shape).encode())
+        h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, str):
+        h.update(obj.encode())
+    else:
+        h.update(obj)
+    return h.digest()
+
+
+def sizeof(value):
+    """
+    Approximate memory footprint of a cached value in bytes
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return getattr(value, 'nbytes', 64)
+
+
+class LRUCache(object):
+    """
+    Bounded LRU cache with byte-size based eviction
+    Shared by the image codecs so that the same b64 strings are decoded
+    (and the same images encoded) only once.
+
+    Attributes:
+        max_bytes (int): eviction threshold
+        nbytes (int): current size of cached values
+        hits (int)
+        misses (int)
+        evictions (int)
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+# Process wide cache shared by cie.util and cie.photoshop.sps codecs
+codec_cache = LRUCache()
@@ -0,0 +1,140 @@
+import struct
+import zlib
+
+import cv2
+import numpy as np
+
+
+class ImageCodec(object):
+    """
+    Encodes RGB uint8 images to bytes and back
+    Attributes:
+        mime (str): mime type of the encoded bytes
+    """
+    mime = None
+
+    def encode(self, img):
+        raise NotImplementedError
+
+    def decode(self, buf):
+        raise NotImplementedError
+
+
+class OpenCVCodec(ImageCodec):
+    """
+    Codecs backed by cv2.imencode, converts RGB <-> BGR
+    """
+    ext = None
+
+    def __init__(self, params=None):
+        self.params = [] if params is None else params
+
+    def encode(self, img):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        _, nparr = cv2.imencode(self.ext, img, self.params)
+        return nparr.tobytes()
+
+    def decode(self, buf):
+        nparr = np.frombuffer(buf, np.uint8)
+        bgr_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+
+
+class PNGCodec(OpenCVCodec):
+    mime = "image/png"
+    ext = ".png"
+
+    def __init__(self, level=None):
+        params = [] if level is None else [cv2.IMWRITE_PNG_COMPRESSION, level]
+        super(PNGCodec, self).__init__(params)
+
+
+class JPEGCodec(OpenCVCodec):
+    mime = "image/jpeg"
+    ext = ".jpg"
+
+    def __init__(self, quality=90):
+        super(JPEGCodec, self).__init__([cv2.IMWRITE_JPEG_QUALITY, quality])
+
+
+class WebPCodec(OpenCVCodec):
+    mime = "image/webp"
+    ext = ".webp"
+
+    def __init__(self, quality=80):
+        super(WebPCodec, self).__init__([cv2.IMWRITE_WEBP_QUALITY, quality])
+
+
+class RawCodec(ImageCodec):
+    """
+    zlib wrapped raw pixels with a shape header
+    No colour space conversion, only meant for internal paths.
+    Level 0 only stores the pixels, since zlib compression of
+    natural images is slower than PNG encoding at similar ratios.
+    """
+    mime = "application/octet-stream"
+    MAGIC = b"CIEZ"
+    HEADER = struct.Struct(">4sIIB")  # magic, height, width, channels
+
+    def __init__(self, level=0):
+        self.level = level
+
+    def encode(self, img):
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        channels = img.shape[2] if img.ndim == 3 else 1
+        header = self.HEADER.pack(self.MAGIC, img.shape[0], img.shape[1],
+                                  channels)
+        return header + zlib.compress(img.data, self.level)
+
+    def decode(self, buf):
+        _, height, width, channels = self.HEADER.unpack_from(buf)
+        pixels = zlib.decompress(buf[self.HEADER.size:])
+        img = np.frombuffer(pixels, np.uint8)
+        if channels == 1:
+            return img.reshape(height, width)
+        return img.reshape(height, width, channels)
+
+
+# Selectable codec profiles
+PROFILES = {
+    "png": PNGCodec(),  # Legacy default
+    "lossless-fast": RawCodec(level=0),
+    "lossless-small": PNGCodec(level=9),
+    "jpeg": JPEGCodec(quality=90),
+    "webp": WebPCodec(quality=80)
+}
+
+
+def register_profile(name, codec):
+    PROFILES[name] = codec
+
+
+def get_codec(profile):
+    if profile not in PROFILES:
+        raise ValueError("Unknown codec profile: {}".format(profile))
+    return PROFILES[profile]
+
+
+def encode_img(img, profile="png"):
+    """
+    Args:
+        img (np.ndarray): RGB image
+        profile (str): name of codec profile
+    Returns:
+        buf (bytes)
+    """
+    return get_codec(profile).encode(img)
+
+
+def decode_img(buf):
+    """
+    Decodes bytes of any profile, the format is detected from the header
+    Args:
+        buf (bytes)
+    Returns:
+        img (np.ndarray): RGB image
+    """
+    if buf[:len(RawCodec.MAGIC)] == RawCodec.MAGIC:
+        return PROFILES["lossless-fast"].decode(buf)
+    return PROFILES["png"].decode(buf)
@@ -0,0 +1,229 @@
+import base64
+import hashlib
+import zlib
+
+import cv2
+import numpy as np
+
+from .cache import codec_cache, digest
+from .region import Region, PointRegion, BoxRegion, PolygonRegion
+
+
+class Mask(Region):
+    """
+    Compact binary selection mask
+    Pixels are bit-packed (1 bit per pixel), so a mask is 24x smaller
+    than the 3-channel uint8 image it replaces, before any compression.
+    Masks are immutable, hashable and cheap to copy, so they can be used
+    directly as belief state values and dictionary keys.
+
+    Attributes:
+        shape (tuple): (height, width) of the mask
+    """
+    TYPE = "mask"
+
+    def __init__(self, shape, bits):
+        """
+        Args:
+            shape (tuple): (height, width)
+            bits (bytes): np.packbits of the flattened boolean mask
+        """
+        super(Mask, self).__init__(shape)
+        self._bits = bytes(bits)
+        self._array = None
+        self._bbox = None
+
+    #######################
+    #     Constructors    #
+    #######################
+    @classmethod
+    def from_array(cls, arr):
+        """
+        Args:
+            arr (np.ndarray): 2D boolean/uint8 mask, or legacy 3D uint8 mask image
+        Returns:
+            mask (Mask)
+        """
+        arr = np.asarray(arr)
+        if arr.ndim == 3:
+            arr = arr.any(axis=2)
+        bits = np.packbits(arr.astype(bool, copy=False).ravel())
+        return cls(arr.shape, bits.tobytes())
+
+    @classmethod
+    def from_b64(cls, b64_img_str):
+        """
+        Decodes a legacy base64 PNG mask image
+        Results are cached by string digest
+        """
+        key = ('mask_from_b64', digest(b64_img_str))
+        mask = codec_cache.get(key)
+        if mask is None:
+            buf = base64.b64decode(b64_img_str)
+            nparr = np.frombuffer(buf, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+            mask = cls.from_array(img)
+            codec_cache.put(key, mask)
+        return mask
+
+    @classmethod
+    def from_json(cls, obj):
+        """
+        Inverse of to_json
+        """
+        bits = zlib.decompress(base64.b64decode(obj['bits']))
+        return cls(obj['shape'], bits)
+
+    #######################
+    #      Conversion     #
+    #######################
+    @property
+    def bits(self):
+        """np.packbits of the flattened mask
+        """
+        return self._bits
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+    @property
+    def digest(self):
+        """Hex digest of shape & pixels, computed once
+        """
+        if self._digest is None:
+            h = hashlib.sha1()
+            h.update("{}x{}".format(*self._shape).encode())
+            h.update(self._bits)
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def to_array(self):
+        """
+        Returns:
+            arr (np.ndarray): read-only 2D boolean single-channel view
+        """
+        if self._array is None:
+            npixels = self._shape[0] * self._shape[1]
+            packed = np.frombuffer(self._bits, np.uint8)
+            arr = np.unpackbits(packed)[:npixels].view(bool)
+            arr = arr.reshape(self._shape)
+            arr.flags.writeable = False
+            self._array = arr
+        return self._array
+
+    def to_json(self):
+        """
+        Serializable form, compressed bits
+        """
+        obj = {}
+        obj['type'] = self.TYPE
+        obj['shape'] = list(self._shape)
+        obj['bits'] = base64.b64encode(zlib.compress(self._bits)).decode()
+        return obj
+
+    #######################
+    #      Operations     #
+    #######################
+    def bbox(self):
+        if self._bbox is None:
+            arr = self.to_array()
+            rows = np.flatnonzero(arr.any(axis=1))
+            if len(rows) == 0:
+                self._bbox = ()
+            else:
+                cols = np.flatnonzero(arr.any(axis=0))
+                self._bbox = (int(rows[0]), int(cols[0]),
+                              int(rows[-1]) + 1, int(cols[-1]) + 1)
+        return self._bbox or None
+
+    def crop(self, top, left, bottom, right):
+        return self.to_array()[top:bottom, left:right]
+
+    def area(self):
+        """Number of selected pixels
+        """
+        return int(np.count_nonzero(self.to_array()))
+
+    def contains(self, row, col):
+        """O(1) lookup on the packed bits
+        """
+        if not (0 <= row < self._shape[0] and 0 <= col < self._shape[1]):
+            return False
+        idx = row * self._shape[1] + col
+        return bool((self._bits[idx >> 3] >> (7 - (idx & 7))) & 1)
+
+    def intersection(self, other):
+        """Number of pixels selected by both regions
+        """
+        if not isinstance(other, Mask):
+            return super(Mask, self).intersection(other)
+        assert self._shape == other.shape
+        a = np.frombuffer(self._bits, np.uint8)
+        b = np.frombuffer(other._bits, np.uint8)
+        return int(np.unpackbits(a & b).sum())
+
+    def overlaps(self, other):
+        if not isinstance(other, Mask):
+            return super(Mask, self).overlaps(other)
+        assert self._shape == other.shape
+        a = np.frombuffer(self._bits, np.uint8)
+        b = np.frombuffer(other._bits, np.uint8)
+        return bool((a & b).any())
+
+    #######################
+    #   Python protocols  #
+    #######################
+    def __eq__(self, other):
+        if not isinstance(other, Mask):
+            return False
+        return self._shape == other._shape and self._bits == other._bits
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __getstate__(self):
+        return (self._shape, self._bits)
+
+    def __setstate__(self, state):
+        self._shape, self._bits = state
+        self._digest = None
+        self._contours = None
+        self._array = None
+        self._bbox = None
+
+
+def to_mask(value):
+    """
+    Converts legacy mask representations to Mask, regions are kept as is
+    Args:
+        value (Region | str | np.ndarray): region, base64 PNG string or mask array
+    Returns:
+        mask (Region): None if value is empty
+    """
+    if value is None or isinstance(value, Region):
+        return value
+    if isinstance(value, str):
+        if value == "":
+            return None
+        return Mask.from_b64(value)
+    return Mask.from_array(value)
+
+
+def region_from_json(obj):
+    """
+    Inverse of Region.to_json
+    """
+    region_type = obj.get('type', Mask.TYPE)
+    shape = obj['shape']
+    if region_type == Mask.TYPE:
+        return Mask.from_json(obj)
+    elif region_type == PointRegion.TYPE:
+        return PointRegion(shape, obj['row'], obj['col'])
+    elif region_type == BoxRegion.TYPE:
+        return BoxRegion(shape, obj['top'], obj['left'], obj['bottom'],
+                         obj['right'])
+    elif region_type == PolygonRegion.TYPE:
+        return PolygonRegion(shape, obj['points'])
+    else:
+        raise ValueError("Unknown region type: {}".format(region_type))
@@ -1,26 +1,38 @@
 import base64
 import copy
 
-import cv2
-import numpy as np
+from .cache import codec_cache, digest
+from .codec import encode_img, decode_img
 
 
-def img_to_b64(img):
-    """Converts RGB -> BGR, encodes to jpeg and then converts to base64
+def img_to_b64(img, profile="png"):
+    """Encodes an RGB image with the codec profile and converts to base64
+    Results are cached by image digest & profile
+    Args:
+        img (np.ndarray): RGB image
+        profile (str): see codec.PROFILES, png by default
     """
-    bgr_img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-    _, nparr = cv2.imencode('.png', bgr_img)
-    b64_img_str = base64.b64encode(nparr).decode()
+    key = ('img_to_b64', profile, digest(img))
+    b64_img_str = codec_cache.get(key)
+    if b64_img_str is None:
+        buf = encode_img(img, profile)
+        b64_img_str = base64.b64encode(buf).decode()
+        codec_cache.put(key, b64_img_str)
     return b64_img_str
 
 
 def b64_to_img(b64_img_str):
     """Converts base64 string back to numpy array
+    The codec profile is detected from the encoded header
+    Results are cached by string digest, the returned array is read-only
     """
-    buf = base64.b64decode(b64_img_str)
-    nparr = np.frombuffer(buf, np.uint8)
-    bgr_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+    key = ('b64_to_img', digest(b64_img_str))
+    rgb_img = codec_cache.get(key)
+    if rgb_img is None:
+        buf = base64.b64decode(b64_img_str)
+        rgb_img = decode_img(buf)
+        rgb_img.flags.writeable = False
+        codec_cache.put(key, rgb_img)
     return rgb_img
 
 
@@ -42,6 +54,83 @@ def build_slot_dict(slot, value=None, conf=None):
     return obj
 
 
+class LazySlotDict(dict):
+    """
+    Slot dict whose value is computed on first access
+    Expensive slots (e.g. rendered images) are only materialised
+    if a consumer actually reads them.
+    """
+    _PENDING = object()
+
+    def __init__(self, slot, value_fn, conf=None):
+        super(LazySlotDict, self).__init__(slot=slot, value=self._PENDING)
+        if conf is not None:
+            self['conf'] = conf
+        self._value_fn = value_fn
+
+    def _materialise(self):
+        if dict.get(self, 'value') is self._PENDING:
+            dict.__setitem__(self, 'value', self._value_fn())
+            self._value_fn = None
+
+    def __getitem__(self, key):
+        if key == 'value':
+            self._materialise()
+        return super(LazySlotDict, self).__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == 'value':
+            self._materialise()
+        return super(LazySlotDict, self).get(key, default)
+
+    def __iter__(self):
+        # Overridden so that dict(slot) goes through __getitem__
+        return super(LazySlotDict, self).__iter__()
+
+    def items(self):
+        self._materialise()
+        return super(LazySlotDict, self).items()
+
+    def values(self):
+        self._materialise()
+        return super(LazySlotDict, self).values()
+
+    def __eq__(self, other):
+        self._materialise()
+        return super(LazySlotDict, self).__eq__(other)
+
+    __hash__ = None
+
+    def copy(self):
+        """
+        Returns:
+            slot_dict (dict): shallow copy, a pending value stays pending
+                              and is computed once for both dicts
+        """
+        if dict.get(self, 'value') is not self._PENDING:
+            return dict(self.items())
+        copied = LazySlotDict(None, lambda: self['value'])
+        for key, value in super(LazySlotDict, self).items():
+            if key != 'value':
+                dict.__setitem__(copied, key, value)
+        return copied
+
+    def __repr__(self):
+        self._materialise()
+        return super(LazySlotDict, self).__repr__()
+
+    def __reduce_ex__(self, protocol):
+        self._materialise()
+        return dict, (dict(self.items()),)
+
+
+def build_lazy_slot_dict(slot, value_fn, conf=None):
+    """
+    Same format as build_slot_dict, value is computed by value_fn on access
+    """
+    return LazySlotDict(slot, value_fn, conf)
+
+
 def find_slot_with_key(key, slots):
     """
     """
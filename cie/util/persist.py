@@ -0,0 +1,160 @@
+import json
+import os
+import tempfile
+
+from .cache import digest
+from .codec import encode_img, decode_img
+
+BLOB_REF_PREFIX = "blob:"
+
+
+def is_blob_ref(value):
+    return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+
+class PersistentStore(object):
+    """
+    Content addressed, write once storage of session blobs.
+    Session records only keep "blob:<sha1>" references,
+    so every image is written once no matter how many turns refer to it.
+    """
+
+    def __init__(self):
+        self._known = set()  # Keys known to be stored, skips lookups
+
+    def _exists(self, key):
+        raise NotImplementedError
+
+    def _read(self, key):
+        raise NotImplementedError
+
+    def _write(self, key, data):
+        raise NotImplementedError
+
+    def _put(self, key, data_fn):
+        if key not in self._known:
+            if not self._exists(key):
+                self._write(key, data_fn())
+            self._known.add(key)
+        return BLOB_REF_PREFIX + key
+
+    def __contains__(self, ref):
+        return is_blob_ref(ref) and self._exists(ref[len(BLOB_REF_PREFIX):])
+
+    def put(self, data):
+        """
+        Args:
+            data (bytes)
+        Returns:
+            ref (str): "blob:<sha1 of data>"
+        """
+        return self._put(digest(data).hex(), lambda: data)
+
+    def get(self, ref):
+        """
+        Returns:
+            data (bytes)
+        Raises:
+            KeyError: if the blob does not exist
+        """
+        return self._read(ref[len(BLOB_REF_PREFIX):])
+
+    def put_image(self, img, profile="png"):
+        """
+        Keyed by pixel digest, so stored images are never re-encoded
+        Args:
+            img (np.ndarray): RGB image
+            profile (str): codec profile
+        Returns:
+            ref (str)
+        """
+        return self._put(digest(img).hex(), lambda: encode_img(img, profile))
+
+    def get_image(self, ref):
+        """
+        Returns:
+            img (np.ndarray): RGB image
+        """
+        return decode_img(self.get(ref))
+
+    def put_json(self, obj):
+        data = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+        return self.put(data.encode())
+
+    def get_json(self, ref):
+        return json.loads(self.get(ref).decode())
+
+
+class MemoryStore(PersistentStore):
+    def __init__(self):
+        super(MemoryStore, self).__init__()
+        self._blobs = dict()
+
+    def _exists(self, key):
+        return key in self._blobs
+
+    def _read(self, key):
+        return self._blobs[key]
+
+    def _write(self, key, data):
+        self._blobs[key] = bytes(data)
+
+
+class DirectoryStore(PersistentStore):
+    """
+    One file per blob in root/<2 hex>/<sha1>
+    """
+
+    def __init__(self, root):
+        super(DirectoryStore, self).__init__()
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as fin:
+                return fin.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def _write(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers never see partially written blobs
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as fout:
+            fout.write(data)
+        os.replace(tmp_path, path)
+
+
+class GridFSStore(PersistentStore):
+    """
+    Blobs stored as GridFS chunks of a MongoDB database, with the sha1 as _id
+    """
+
+    def __init__(self, db, collection="blobs"):
+        # Only MongoDB sessions need pymongo
+        import gridfs
+        super(GridFSStore, self).__init__()
+        self.fs = gridfs.GridFS(db, collection)
+        self.errors = gridfs.errors
+
+    def _exists(self, key):
+        return self.fs.exists(key)
+
+    def _read(self, key):
+        try:
+            return self.fs.get(key).read()
+        except self.errors.NoFile:
+            raise KeyError(key)
+
+    def _write(self, key, data):
+        try:
+            self.fs.put(data, _id=key)
+        except self.errors.FileExists:  # Written by another process
+            pass
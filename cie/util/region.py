@@ -0,0 +1,362 @@
+import base64
+import hashlib
+
+import cv2
+import numpy as np
+
+
+class Region(object):
+    """
+    Base class of selections over an image of a given shape
+    Subclasses only need to implement bbox() and crop(),
+    other operations are computed inside bounding boxes.
+    Regions are immutable, hashable and cheap to copy.
+
+    Attributes:
+        shape (tuple): (height, width) of the image the region belongs to
+    """
+    TYPE = None
+
+    def __init__(self, shape):
+        self._shape = (int(shape[0]), int(shape[1]))
+        self._digest = None
+        self._contours = None
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def bbox(self):
+        """
+        Returns:
+            bbox (tuple): (top, left, bottom, right), bottom & right exclusive.
+                          None if the region is empty
+        """
+        raise NotImplementedError
+
+    def crop(self, top, left, bottom, right):
+        """
+        Returns:
+            arr (np.ndarray): 2D boolean array of the region inside the window
+        """
+        raise NotImplementedError
+
+    def params(self):
+        """
+        Returns:
+            params (dict): json serializable parameters besides type & shape
+        """
+        raise NotImplementedError
+
+    #######################
+    #      Conversion     #
+    #######################
+    @property
+    def digest(self):
+        if self._digest is None:
+            h = hashlib.sha1()
+            h.update(repr((self.TYPE, self._shape)).encode())
+            h.update(repr(sorted(self.params().items())).encode())
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def to_array(self):
+        """
+        Returns:
+            arr (np.ndarray): 2D boolean array of the full image
+        """
+        arr = np.zeros(self._shape, dtype=bool)
+        bbox = self.bbox()
+        if bbox is not None:
+            top, left, bottom, right = bbox
+            arr[top:bottom, left:right] = self.crop(*bbox)
+        return arr
+
+    def to_img(self):
+        """
+        Returns:
+            img (np.ndarray): legacy 3-channel uint8 image with values 0 or 255
+        """
+        channel = self.to_array().astype(np.uint8) * 255
+        return np.repeat(channel[..., np.newaxis], 3, axis=2)
+
+    def to_b64(self):
+        """
+        Encodes to the legacy base64 PNG format. Only used at HTTP boundaries.
+        """
+        channel = self.to_array().astype(np.uint8) * 255
+        _, nparr = cv2.imencode('.png', channel)
+        return base64.b64encode(nparr).decode()
+
+    def to_json(self):
+        obj = self.params()
+        obj['type'] = self.TYPE
+        obj['shape'] = list(self._shape)
+        return obj
+
+    def contours(self):
+        """
+        Outer & hole boundaries for drawing, computed once
+        Returns:
+            contours (list): list of int32 arrays of shape (N, 1, 2),
+                             points in OpenCV (x, y) = (col, row) order
+        """
+        if self._contours is None:
+            bbox = self.bbox()
+            if bbox is None:
+                self._contours = []
+            else:
+                top, left, bottom, right = bbox
+                # Zero padded, older OpenCV ignores the 1 pixel border
+                arr = np.zeros((bottom - top + 2, right - left + 2),
+                               dtype=np.uint8)
+                arr[1:-1, 1:-1] = self.crop(*bbox)
+                # OpenCV < 3.2 returns 3 values
+                self._contours = cv2.findContours(
+                    arr, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE,
+                    offset=(left - 1, top - 1))[-2]
+        return self._contours
+
+    #######################
+    #      Operations     #
+    #######################
+    def area(self):
+        bbox = self.bbox()
+        if bbox is None:
+            return 0
+        return int(np.count_nonzero(self.crop(*bbox)))
+
+    def centroid(self, largest_component=False, snap=False):
+        """
+        Centroid from the first order moments of the selected pixels
+        Args:
+            largest_component (bool): only use the largest 8-connected component
+            snap (bool): move the centroid to the nearest selected pixel
+                         if it falls outside the region, e.g. for rings
+        Returns:
+            centroid (tuple): (row, col), None if the region is empty
+        """
+        bbox = self.bbox()
+        if bbox is None:
+            return None
+        top, left, bottom, right = bbox
+        arr = self.crop(*bbox)
+
+        if largest_component:
+            num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+                arr.astype(np.uint8), connectivity=8)
+            if num_labels > 2:  # Background & more than one component
+                label = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+                arr = labels == label
+
+        # Moments from row & column projections, exact integer sums
+        row_counts = np.count_nonzero(arr, axis=1)
+        col_counts = np.count_nonzero(arr, axis=0)
+        m00 = int(row_counts.sum())
+        m10 = int(np.dot(row_counts, np.arange(len(row_counts))))
+        m01 = int(np.dot(col_counts, np.arange(len(col_counts))))
+        row, col = round(m10 / m00), round(m01 / m00)
+
+        if snap and not arr[row, col]:
+            rows, cols = np.nonzero(arr)
+            dist = (rows - m10 / m00)**2 + (cols - m01 / m00)**2
+            idx = np.argmin(dist)
+            row, col = rows[idx], cols[idx]
+
+        return top + int(row), left + int(col)
+
+    def contains(self, row, col):
+        """Whether pixel (row, col) is selected
+        """
+        if not (0 <= row < self._shape[0] and 0 <= col < self._shape[1]):
+            return False
+        return bool(self.crop(row, col, row + 1, col + 1)[0, 0])
+
+    def _window(self, other):
+        """Intersection of both bounding boxes, None if disjoint
+        """
+        assert self._shape == other.shape
+        a, b = self.bbox(), other.bbox()
+        if a is None or b is None:
+            return None
+        top, left = max(a[0], b[0]), max(a[1], b[1])
+        bottom, right = min(a[2], b[2]), min(a[3], b[3])
+        if top >= bottom or left >= right:
+            return None
+        return top, left, bottom, right
+
+    def intersection(self, other):
+        """Number of pixels selected by both regions
+        """
+        window = self._window(other)
+        if window is None:
+            return 0
+        return int(np.count_nonzero(self.crop(*window) & other.crop(*window)))
+
+    def overlaps(self, other):
+        if isinstance(other, PointRegion):
+            return other.overlaps(self)
+        window = self._window(other)
+        if window is None:
+            return False
+        return bool((self.crop(*window) & other.crop(*window)).any())
+
+    def dice(self, other):
+        total = self.area() + other.area()
+        if total == 0:
+            return 0.
+        return 2 * self.intersection(other) / total
+
+    #######################
+    #   Python protocols  #
+    #######################
+    def __eq__(self, other):
+        if not isinstance(other, Region):
+            return False
+        return self.TYPE == other.TYPE and self.digest == other.digest
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        return self.digest < other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __str__(self):
+        return self.digest
+
+    def __repr__(self):
+        return "{}({}x{}, {})".format(self.__class__.__name__, self._shape[0],
+                                      self._shape[1], self.digest[:8])
+
+
+class PointRegion(Region):
+    """
+    A single pixel, e.g. a gesture click
+    """
+    TYPE = "point"
+
+    def __init__(self, shape, row, col):
+        super(PointRegion, self).__init__(shape)
+        self.row = int(row)
+        self.col = int(col)
+
+    def params(self):
+        return {'row': self.row, 'col': self.col}
+
+    def bbox(self):
+        if not self.contains(self.row, self.col):
+            return None
+        return self.row, self.col, self.row + 1, self.col + 1
+
+    def crop(self, top, left, bottom, right):
+        arr = np.zeros((bottom - top, right - left), dtype=bool)
+        if top <= self.row < bottom and left <= self.col < right:
+            arr[self.row - top, self.col - left] = True
+        return arr
+
+    def area(self):
+        return 1 if self.bbox() is not None else 0
+
+    def contains(self, row, col):
+        return row == self.row and col == self.col and \
+            0 <= row < self._shape[0] and 0 <= col < self._shape[1]
+
+    def intersection(self, other):
+        return int(self.overlaps(other))
+
+    def overlaps(self, other):
+        """O(1) pixel lookup in the other region
+        """
+        assert self._shape == other.shape
+        return other.contains(self.row, self.col)
+
+
+class BoxRegion(Region):
+    """
+    An axis aligned rectangle, e.g. a bounding box drawn by the user
+    """
+    TYPE = "box"
+
+    def __init__(self, shape, top, left, bottom, right):
+        """
+        Args:
+            shape (tuple): (height, width)
+            top, left, bottom, right (int): bottom & right are exclusive
+        """
+        super(BoxRegion, self).__init__(shape)
+        self.top = max(int(top), 0)
+        self.left = max(int(left), 0)
+        self.bottom = min(int(bottom), self._shape[0])
+        self.right = min(int(right), self._shape[1])
+
+    def params(self):
+        return {'top': self.top, 'left': self.left,
+                'bottom': self.bottom, 'right': self.right}
+
+    def bbox(self):
+        if self.top >= self.bottom or self.left >= self.right:
+            return None
+        return self.top, self.left, self.bottom, self.right
+
+    def crop(self, top, left, bottom, right):
+        arr = np.zeros((bottom - top, right - left), dtype=bool)
+        t, l = max(self.top, top), max(self.left, left)
+        b, r = min(self.bottom, bottom), min(self.right, right)
+        if t < b and l < r:
+            arr[t - top:b - top, l - left:r - left] = True
+        return arr
+
+    def area(self):
+        if self.bbox() is None:
+            return 0
+        return (self.bottom - self.top) * (self.right - self.left)
+
+    def contains(self, row, col):
+        return self.top <= row < self.bottom and self.left <= col < self.right
+
+
+class PolygonRegion(Region):
+    """
+    A filled polygon, e.g. a lasso selection
+    """
+    TYPE = "polygon"
+
+    def __init__(self, shape, points):
+        """
+        Args:
+            shape (tuple): (height, width)
+            points (list): list of (row, col) vertices
+        """
+        super(PolygonRegion, self).__init__(shape)
+        self.points = [(int(r), int(c)) for r, c in points]
+
+    def params(self):
+        return {'points': [list(p) for p in self.points]}
+
+    def bbox(self):
+        if len(self.points) == 0:
+            return None
+        rows, cols = zip(*self.points)
+        top, left = max(min(rows), 0), max(min(cols), 0)
+        bottom = min(max(rows) + 1, self._shape[0])
+        right = min(max(cols) + 1, self._shape[1])
+        if top >= bottom or left >= right:
+            return None
+        return top, left, bottom, right
+
+    def crop(self, top, left, bottom, right):
+        canvas = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        # cv2 expects (x, y) = (col, row)
+        pts = np.array([(c - left, r - top) for r, c in self.points],
+                       dtype=np.int32)
+        cv2.fillPoly(canvas, [pts.reshape(-1, 1, 2)], 1)
+        return canvas.view(bool)
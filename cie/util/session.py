@@ -4,6 +4,8 @@ import sys
 from pymongo import MongoClient
 from tinydb import TinyDB, Query
 
+from .persist import DirectoryStore, GridFSStore
+
 logger = logging.getLogger(__name__)
 
 
@@ -13,6 +15,11 @@ def SessionPortal(session_config):
 
 
 class SessionManager(object):
+    """
+    Attributes:
+        blobs (PersistentStore): images referenced by the photoshop states
+    """
+
     def __init__(self, host=None, port=None, **kwargs):
         raise NotImplementedError
 
@@ -41,6 +48,7 @@ class MongoDBManager(SessionManager):
         self.client = MongoClient()
         self.db = self.client["cie"]
         self.dialogues = self.db["dialogues"]
+        self.blobs = GridFSStore(self.db)
 
     def retrieve(self, session_id):
         session_key = {"session_id": session_id}
@@ -50,13 +58,22 @@ class MongoDBManager(SessionManager):
         return self.dialogues.find_one(session_key)
 
     def add_turn(self, session_id, system_state, photoshop_state, turn_info):
-
-        doc = self.retrieve(session_id)
-        doc["system_state"] = system_state
-        doc["photoshop_state"] = photoshop_state
-        doc["turns"].append(turn_info)
-
-        self.dialogues.replace_one({"session_id": session_id}, doc)
+        """
+        Appends the turn instead of rewriting the whole dialogue
+        """
+        self.dialogues.update_one(
+            {"session_id": session_id},
+            {
+                "$set": {
+                    "system_state": system_state,
+                    "photoshop_state": photoshop_state
+                },
+                "$push": {
+                    "turns": turn_info
+                }
+            },
+            upsert=True
+        )
 
     def add_policy(self, session_id, policy):
         key = {"session_id": session_id}
@@ -82,8 +99,11 @@ class MongoDBManager(SessionManager):
 
 
 class TinyDBManager(SessionManager):
-    def __init__(self, db_path, **kwargs):
+    def __init__(self, db_path, blob_dir=None, **kwargs):
         self.db = TinyDB(db_path)
+        if blob_dir is None:
+            blob_dir = db_path + ".blobs"
+        self.blobs = DirectoryStore(blob_dir)
 
     def retrieve(self, session_id):
         session = Query()
@@ -0,0 +1,175 @@
+import base64
+import logging
+
+from .cache import LRUCache, digest
+from .codec import decode_img
+from .message import img_to_b64, b64_to_img
+
+logger = logging.getLogger(__name__)
+
+IMAGE_HANDLE_PREFIX = "img:"
+
+
+def image_handle(img):
+    """
+    Content addressed handle of an image
+    Args:
+        img (np.ndarray): RGB image
+    Returns:
+        handle (str): e.g. "img:3f1c9a0b5d7e2f44"
+    """
+    return IMAGE_HANDLE_PREFIX + digest(img).hex()[:16]
+
+
+def is_image_handle(value):
+    return isinstance(value, str) and value.startswith(IMAGE_HANDLE_PREFIX)
+
+
+def decode_b64_img(b64_img_str):
+    """
+    Uncached base64 image decode, see message.b64_to_img for the cached one
+    """
+    return decode_img(base64.b64decode(b64_img_str))
+
+
+class BlobStore(object):
+    """
+    Interns images once and hands out short digest handles.
+    The dialogue state, user simulator and photoshop pass handles around,
+    pixels are only resolved where they are actually needed.
+
+    Least recently used images are evicted once max_bytes is exceeded,
+    so handles of long finished dialogues may become unresolvable.
+    Handles written to persisted dialogue states are backed by a durable
+    store with save & load, so they survive evictions and restarts.
+    """
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self._images = LRUCache(max_bytes)
+
+    def put_image(self, img):
+        """
+        Args:
+            img (np.ndarray): RGB image
+        Returns:
+            handle (str)
+        """
+        handle = image_handle(img)
+        if handle not in self._images:
+            if img.flags.writeable or not img.flags.owndata:
+                img = img.copy()  # May change, or be a view of a buffer
+                img.flags.writeable = False
+            self._images.put(handle, img)
+        return handle
+
+    def put_b64(self, b64_img_str):
+        """
+        Interns a base64 PNG image received over HTTP
+        """
+        return self.put_image(decode_b64_img(b64_img_str))
+
+    def get_image(self, handle):
+        """
+        Returns:
+            img (np.ndarray): read-only RGB image, None if unknown
+        """
+        img = self._images.get(handle)
+        if img is None:
+            logger.error("Unknown image handle: {}".format(handle))
+        return img
+
+    def require_image(self, handle):
+        """
+        Returns:
+            img (np.ndarray): read-only RGB image
+        Raises:
+            KeyError: if the handle is unknown, e.g. evicted or from
+                      another process, and was not loaded from a durable store
+        """
+        img = self.get_image(handle)
+        if img is None:
+            raise KeyError("Unresolvable image handle: {}".format(handle))
+        return img
+
+    def get_b64(self, handle, profile="png"):
+        """
+        Encodes the image to base64, only for HTTP boundaries
+        Args:
+            handle (str)
+            profile (str): codec profile, png for external services
+        Raises:
+            KeyError: if the handle is unknown
+        """
+        return img_to_b64(self.require_image(handle), profile)
+
+    def save(self, handles, blobs):
+        """
+        Copies images to a durable store
+        Args:
+            handles (iterable): image handles
+            blobs (PersistentStore)
+        Returns:
+            refs (dict): handle -> blob ref
+        Raises:
+            KeyError: if a handle is unknown
+        """
+        return {handle: blobs.put_image(self.require_image(handle))
+                for handle in handles}
+
+    def load(self, refs, blobs):
+        """
+        Re-interns images saved by save, e.g. after a restart
+        Args:
+            refs (dict): handle -> blob ref
+            blobs (PersistentStore)
+        """
+        for handle, ref in refs.items():
+            if handle in self._images:
+                continue
+            loaded = self.put_image(blobs.get_image(ref))
+            if loaded != handle:
+                raise ValueError("Blob {} does not hold image {}".format(
+                    ref, handle))
+
+    def __contains__(self, handle):
+        return handle in self._images
+
+    def clear(self):
+        self._images.clear()
+
+    def stats(self):
+        return self._images.stats()
+
+
+# Process wide store shared by the dialogue system and photoshop
+blob_store = BlobStore()
+
+
+def resolve_image(value):
+    """
+    Args:
+        value (str | np.ndarray): image handle, base64 PNG string or image
+    Returns:
+        img (np.ndarray)
+    Raises:
+        KeyError: if value is an unknown image handle
+    """
+    if is_image_handle(value):
+        return blob_store.require_image(value)
+    if isinstance(value, str):
+        return b64_to_img(value)
+    return value
+
+
+def resolve_b64(value):
+    """
+    Args:
+        value (str): image handle or base64 PNG string
+    Returns:
+        b64_img_str (str)
+    Raises:
+        KeyError: if value is an unknown image handle
+    """
+    if is_image_handle(value):
+        return blob_store.get_b64(value)
+    return value
@@ -0,0 +1,41 @@
+from .message import build_lazy_slot_dict
+
+
+def counting_slot(value, conf=None):
+    calls = []
+
+    def value_fn():
+        calls.append(None)
+        return value
+    return build_lazy_slot_dict("image", value_fn, conf), calls
+
+
+def test_copy_of_pending_slot():
+    slot, calls = counting_slot([1, 2], conf=0.5)
+    copied = slot.copy()
+    assert calls == []
+    assert copied["value"] == [1, 2]
+    assert dict(copied) == {"slot": "image", "value": [1, 2], "conf": 0.5}
+    # The original reuses the copy's value
+    assert slot["value"] is copied["value"]
+    assert len(calls) == 1
+
+    copied["slot"] = "other"
+    assert slot["slot"] == "image"
+
+
+def test_copy_of_materialised_slot():
+    slot, calls = counting_slot([1, 2])
+    assert slot["value"] == [1, 2]
+    copied = slot.copy()
+    assert copied == {"slot": "image", "value": [1, 2]}
+    assert copied["value"] is slot["value"]
+    assert len(calls) == 1
+
+
+def test_copy_of_copy():
+    slot, calls = counting_slot("img")
+    copied = slot.copy().copy()
+    assert slot.get("value") == "img"
+    assert copied.get("value") == "img"
+    assert len(calls) == 1
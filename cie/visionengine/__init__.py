@@ -1 +1,2 @@
-from .visionengine import *
\ No newline at end of file
+from .visionengine import *
+from .database import *
@@ -0,0 +1,196 @@
+"""
+    Indexed, memory-mapped storage of vision engine results
+    File layout:
+    - header: magic, version, number of entries
+    - keys: one little endian uint64 per (image, object), sorted,
+      the first 8 bytes of sha1("<image handle>\\0<object>")
+    - offsets: little endian uint64 offset of each record
+    - records: the image handle & object name of the entry,
+      followed by its masks, each one (height, width, length)
+      and its zlib compressed np.packbits bits
+    Opening maps the file read-only, lookups binary search the index
+    and only decode the masks they return. Processes mapping the same file,
+    e.g. forked rollout workers, share its pages in the OS page cache.
+"""
+from collections import OrderedDict
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from ..util import Mask, load_from_pickle, to_mask, image_handle, is_image_handle, decode_b64_img
+
+MAGIC = b"CIEV"
+VERSION = 1
+HEADER = struct.Struct(">4sHHQ")  # magic, version, reserved, num entries
+# Native on little endian machines, the index is searched without a copy
+INDEX_DTYPE = np.dtype('<u8')
+NAME_HEADER = struct.Struct(">HI")  # name length, num masks
+MASK_HEADER = struct.Struct(">III")  # height, width, compressed length
+
+
+def entry_name(image_key, object_name):
+    return "{}\0{}".format(image_key, object_name).encode('utf-8')
+
+
+def entry_key(name):
+    return int.from_bytes(hashlib.sha1(name).digest()[:8], 'big')
+
+
+def is_indexed_database(path):
+    """
+    Returns:
+        indexed (bool): True if path is an IndexedMaskDatabase file
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def encode_record(name, masks):
+    chunks = [NAME_HEADER.pack(len(name), len(masks)), name]
+    for mask in masks:
+        mask = to_mask(mask)
+        if not isinstance(mask, Mask):  # Other regions are stored as masks
+            mask = Mask.from_array(mask.to_array())
+        data = zlib.compress(mask.bits)
+        height, width = mask.shape
+        chunks.append(MASK_HEADER.pack(height, width, len(data)))
+        chunks.append(data)
+    return b"".join(chunks)
+
+
+def write_database(db, path):
+    """
+    Writes an indexed database, replaces path atomically
+    Args:
+        db (dict): image handle -> object name -> list of Region or b64 masks
+        path (str)
+    """
+    records = []
+    for image_key, objects in db.items():
+        for object_name, masks in objects.items():
+            if len(masks) == 0:  # Missing entries are empty
+                continue
+            name = entry_name(image_key, object_name)
+            records.append((entry_key(name), encode_record(name, masks)))
+    records.sort(key=lambda record: record[0])
+
+    keys = np.array([key for key, _ in records], dtype=INDEX_DTYPE)
+    offsets = np.zeros(len(records), dtype=INDEX_DTYPE)
+    offset = HEADER.size + keys.nbytes + offsets.nbytes
+    for i, (_, record) in enumerate(records):
+        offsets[i] = offset
+        offset += len(record)
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(records)))
+            f.write(keys.tobytes())
+            f.write(offsets.tobytes())
+            for _, record in records:
+                f.write(record)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def convert_pickle(pickle_path, path):
+    """
+    Converts a pickled database, see VisionEngineDatabase
+    Legacy databases keyed by b64_img_str are rekeyed by image handle
+    Returns:
+        num_images (int)
+    """
+    db = load_from_pickle(pickle_path)
+    rekeyed = {}
+    for key, objects in db.items():
+        if not is_image_handle(key):
+            key = image_handle(decode_b64_img(key))
+        rekeyed[key] = objects
+    write_database(rekeyed, path)
+    return len(rekeyed)
+
+
+class IndexedMaskDatabase(object):
+    """
+    Read-only, memory-mapped image handle -> object name -> masks lookups
+
+    Attributes:
+        path (str)
+    """
+
+    def __init__(self, path, cache_size=1024):
+        """
+        Args:
+            path (str): file written by write_database
+            cache_size (int): number of recent lookups whose masks are kept
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, num_entries = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError("{} is not an indexed database v{}".format(
+                path, VERSION))
+        self._keys = np.frombuffer(self._mmap, dtype=INDEX_DTYPE,
+                                   count=num_entries, offset=HEADER.size)
+        self._offsets = np.frombuffer(
+            self._mmap, dtype=INDEX_DTYPE, count=num_entries,
+            offset=HEADER.size + self._keys.nbytes)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (image_key, object_name) -> masks
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, image_key, object_name):
+        """
+        Returns:
+            masks (list): list of Mask, empty if not found
+        """
+        cache_key = (image_key, object_name)
+        masks = self._cache.get(cache_key)
+        if masks is None:
+            masks = self._lookup(image_key, object_name)
+            self._cache[cache_key] = masks
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(cache_key)
+        return list(masks)
+
+    def _lookup(self, image_key, object_name):
+        name = entry_name(image_key, object_name)
+        key = np.uint64(entry_key(name))
+        i = int(np.searchsorted(self._keys, key))
+        while i < len(self._keys) and self._keys[i] == key:  # Collisions
+            offset = int(self._offsets[i])
+            name_length, num_masks = NAME_HEADER.unpack_from(self._mmap, offset)
+            offset += NAME_HEADER.size
+            if self._mmap[offset:offset + name_length] == name:
+                return self._decode_masks(offset + name_length, num_masks)
+            i += 1
+        return []
+
+    def _decode_masks(self, offset, num_masks):
+        masks = []
+        for _ in range(num_masks):
+            height, width, length = MASK_HEADER.unpack_from(self._mmap, offset)
+            offset += MASK_HEADER.size
+            bits = zlib.decompress(self._mmap[offset:offset + length])
+            masks.append(Mask((height, width), bits))
+            offset += length
+        return masks
+
+    def close(self):
+        self._cache.clear()
+        self._keys = self._offsets = None
+        self._mmap.close()
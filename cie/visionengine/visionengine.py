@@ -5,7 +5,8 @@ import time
 import requests
 import urllib.parse
 
-from ..util import load_from_pickle
+from ..util import load_from_pickle, to_mask, resolve_b64, image_handle, is_image_handle, decode_b64_img
+from .database import IndexedMaskDatabase, is_indexed_database
 
 logger = logging.getLogger(__name__)
 
@@ -33,13 +34,13 @@ class BaseVisionEngine(object):
     def select_object(self, b64_img_str, object, position=None, adjective=None, color=None):
         """ 
         Args:
-            b64_img_str (str)
+            b64_img_str (str): image handle
             object (str)
             position (str)
             adjective (str)
             color (str)
         Returns:
-            mask_strs (list) : list of b64_img_strs
+            mask_strs (list) : list of Masks
         """
         raise NotImplementedError
 
@@ -65,6 +66,7 @@ class MingYangClient(BaseVisionEngine):
     def select_object(self, b64_img_str=None, object=None, position=None, adjective=None, color=None):
 
         select_uri = urllib.parse.urljoin(self.uri, 'selection')
+        b64_img_str = resolve_b64(b64_img_str)
 
         # Build POST data according to MingYang's demo http://isupreme:5100/
         if position is None and adjective is None and color is None:
@@ -88,7 +90,7 @@ class MingYangClient(BaseVisionEngine):
             logger.info("Querying MingYang's CV engine")
             response = requests.post(select_uri, data=data)
             response.raise_for_status()
-            mask_strs = response.json()
+            mask_strs = [to_mask(m) for m in response.json()]
         except Exception as e:
             print(e)
             logger.info(e)
@@ -112,6 +114,7 @@ class MaskRCNNClient(BaseVisionEngine):
         start_time = time.time()
 
         select_uri = urllib.parse.urljoin(self.uri, 'selection')
+        b64_img_str = resolve_b64(b64_img_str)
 
         # Unlike MingYan's engine, does not allow referring expressions
         data = {
@@ -122,7 +125,7 @@ class MaskRCNNClient(BaseVisionEngine):
             logger.info("Querying MaskRCNN server")
             response = requests.post(select_uri, data=data)
             response.raise_for_status()
-            mask_strs = response.json()
+            mask_strs = [to_mask(m) for m in response.json()]
         except Exception as e:
             print(e)
             logger.info(e)
@@ -137,13 +140,26 @@ class MaskRCNNClient(BaseVisionEngine):
 class VisionEngineDatabase(BaseVisionEngine):
     """
     Inferenced results from VisionEngine
+    Indexed databases are memory-mapped and looked up lazily,
+    see convert_pickle, pickled ones are loaded into memory.
 
     Attributes:
-        db (dict): db is a dict of dicts
+        db (dict): image handle -> object name -> list of masks
+        index (IndexedMaskDatabase): None if the database is a pickle
     """
 
     def __init__(self, **kwargs):
-        self.db = load_from_pickle(kwargs['db_path'])
+        self.db, self.index = {}, None
+        if is_indexed_database(kwargs['db_path']):
+            self.index = IndexedMaskDatabase(kwargs['db_path'])
+            return
+
+        db = load_from_pickle(kwargs['db_path'])
+        # Legacy databases are keyed by b64_img_str, rekey by image handle
+        for key, objects in db.items():
+            if not is_image_handle(key):
+                key = image_handle(decode_b64_img(key))
+            self.db[key] = objects
 
     def select_object(self, b64_img_str=None, object=None, position=None, adjective=None, color=None, **kwargs):
         if b64_img_str is None:
@@ -154,11 +170,18 @@ class VisionEngineDatabase(BaseVisionEngine):
             #print("[visionengine] missing object")
             logging.debug("[visionengine] missing object")
             return []
+        elif self.index is not None:
+            return self.index.get(b64_img_str, object)
         elif b64_img_str not in self.db:
             #print("[visionengine] b64_img_str not in db")
             logger.debug("{} not in db".format(b64_img_str))
             return []
-        mask_strs = self.db.get(b64_img_str).get(object)
+        objects = self.db.get(b64_img_str)
+        if object not in objects:
+            return []
+        # Legacy databases store b64 mask strings, convert on first lookup
+        mask_strs = [to_mask(m) for m in objects[object]]
+        objects[object] = mask_strs
         return mask_strs
 
 
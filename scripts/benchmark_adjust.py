@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import cv2
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps.edit import adjust
+
+ATTRIBUTES = ["brightness", "contrast", "hue", "saturation", "lightness"]
+
+
+def legacy_adjust(img, attribute, value):
+    """
+    Previous per pixel arithmetic implementation of edit.adjust
+    """
+    if attribute in ["brightness", "contrast"]:
+        brightness = value if attribute == "brightness" else 0
+        contrast = value if attribute == "contrast" else 0
+        img = np.int16(img)
+        img = img * (contrast / 127 + 1) - contrast + brightness
+        img = np.clip(img, 0, 255)
+        return np.uint8(img)
+
+    hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+    h, s, v = cv2.split(hsv)
+    if attribute == "hue":
+        h = cv2.add(h, value)
+    elif attribute == "saturation":
+        s = cv2.add(s, value)
+    else:
+        v = cv2.add(v, value)
+    final_hsv = cv2.merge([h, s, v])
+    return cv2.cvtColor(final_hsv, cv2.COLOR_HSV2RGB)
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(args):
+    image_dir = os.path.join(args.dir, 'image')
+    image_names = sorted(os.listdir(image_dir))[:args.num]
+    images = [util.imread(os.path.join(image_dir, name))
+              for name in image_names]
+
+    header = "{:<12}{:>12}{:>12}{:>12}{:>10}"
+    row = "{:<12}{:>12}{:>12.2f}{:>12.2f}{:>10.1f}"
+    print(header.format("attribute", "size", "legacy ms", "lut ms", "speedup"))
+    for height, width in args.sizes:
+        resized = [cv2.resize(img, (width, height)) for img in images]
+        for attribute in ATTRIBUTES:
+            legacy_time, lut_time = 0., 0.
+            for img in resized:
+                for value in [-50, 20]:
+                    _, seconds = best_of(
+                        lambda: legacy_adjust(img, attribute, value),
+                        args.repeat)
+                    legacy_time += seconds
+                    _, seconds = best_of(
+                        lambda: adjust(img, attribute, value), args.repeat)
+                    lut_time += seconds
+            n = len(resized) * 2
+            print(row.format(attribute, "{}x{}".format(height, width),
+                             legacy_time / n * 1e3, lut_time / n * 1e3,
+                             legacy_time / lut_time))
+
+
+def size(string):
+    height, width = string.split('x')
+    return int(height), int(width)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Throughput of edit.adjust per attribute & image size")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=size, nargs='*',
+                        default=[(240, 320), (480, 640), (1080, 1920)])
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,115 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps.edit import adjust_color
+from cie.photoshop.sps.utils import apply_mask
+
+
+def legacy_adjust_color(image, color, alpha=0.5):
+    """
+    Previous per channel implementation of edit.adjust_color
+    """
+    colored_image = image.astype(np.uint32).copy()
+    for c in range(3):
+        colored_image[:, :, c] = image[:, :, c] * \
+            (1 - alpha) + alpha * color[c]
+    return colored_image.astype(np.uint8)
+
+
+def legacy_apply_mask(image, mask, color, alpha=0.5):
+    """
+    Previous per channel implementation of utils.apply_mask,
+    without the extra * 255 of the color
+    """
+    masked_image = image.astype(np.uint32).copy()
+    boolean_mask = mask.astype('bool').copy()
+    for c in range(3):
+        condition = boolean_mask[:, :, c] == 1
+        masked_channel = image[:, :, c] * (1 - alpha) + alpha * color[c]
+        masked_image[:, :, c] = np.where(
+            condition, masked_channel, masked_image[:, :, c])
+    return masked_image.astype(np.uint8)
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def load_samples(args):
+    """
+    Returns:
+        samples (list): list of (image, Mask)
+    """
+    agendas = util.load_from_pickle(args.agendas)
+    samples = []
+    for agenda in agendas:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        for goal in agenda:
+            slots = [s for s in goal.get('slots', [])
+                     if s['slot'] == 'object_mask_str']
+            if len(slots) > 0:
+                samples.append((util.imread(image_path),
+                                util.to_mask(slots[0]['value'])))
+                break
+    return samples[:args.num]
+
+
+def main(args):
+    samples = load_samples(args)
+    color = (255, 0, 0)
+
+    timings = {}
+
+    def record(name, func):
+        result, seconds = best_of(func, args.repeat)
+        timings[name] = timings.get(name, 0.) + seconds
+        return result
+
+    for img, mask in samples:
+        mask_img = mask.to_img()
+        mask_arr = mask.to_array()
+        out = np.empty_like(img)
+
+        expected = record("adjust_color legacy",
+                          lambda: legacy_adjust_color(img, color))
+        result = record("adjust_color", lambda: adjust_color(img, "red"))
+        assert (result == expected).all()
+        record("adjust_color out=", lambda: adjust_color(img, "red", out=out))
+
+        expected = record("apply_mask legacy",
+                          lambda: legacy_apply_mask(img, mask_img, color))
+        result = record("apply_mask", lambda: apply_mask(img, mask, color))
+        assert (result == expected).all()
+        record("apply_mask out=",
+               lambda: apply_mask(img, mask_arr, color, out=out))
+
+    n = len(samples)
+    print("{} images, outputs are pixel identical".format(n))
+    for name in sorted(timings):
+        print("{:<24}{:>10.2f} ms".format(name, timings[name] / n * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Color blend throughput of adjust_color & apply_mask")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import numpy as np
+
+from cie import util
+
+
+def time_call(func, arg, repeat):
+    """
+    Returns:
+        result: return value of the last call
+        seconds (float): best of repeat
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(args):
+    image_dir = os.path.join(args.dir, 'image')
+    image_names = sorted(os.listdir(image_dir))[:args.num]
+    images = [util.imread(os.path.join(image_dir, name))
+              for name in image_names]
+    raw_bytes = sum(img.nbytes for img in images)
+    print("{} images, {:.1f} MB raw".format(len(images), raw_bytes / 1e6))
+
+    profiles = args.profiles or sorted(util.PROFILES.keys())
+
+    header = "{:<16}{:>12}{:>12}{:>10}{:>10}"
+    row = "{:<16}{:>12.1f}{:>12.1f}{:>10.3f}{:>10.2f}"
+    print(header.format("profile", "enc MB/s", "dec MB/s", "ratio", "max err"))
+    for profile in profiles:
+        codec = util.get_codec(profile)
+        enc_time, dec_time, enc_bytes, max_err = 0., 0., 0, 0
+        for img in images:
+            buf, seconds = time_call(codec.encode, img, args.repeat)
+            enc_time += seconds
+            enc_bytes += len(buf)
+            dec_img, seconds = time_call(util.decode_img, buf, args.repeat)
+            dec_time += seconds
+            err = np.abs(dec_img.astype(np.int16) - img.astype(np.int16))
+            max_err = max(max_err, err.max())
+        print(row.format(profile, raw_bytes / enc_time / 1e6,
+                         raw_bytes / dec_time / 1e6, enc_bytes / raw_bytes,
+                         max_err))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Encode/decode throughput of image codec profiles")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--num', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--profiles', type=str, nargs='*', default=None)
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,159 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.sps.edit import add_filter
+
+
+def load_samples(args):
+    samples = []
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        if len(masks) > 0:
+            samples.append((image_path, masks[0]))
+    return samples
+
+
+def timed(func, repeat):
+    """
+    Returns:
+        seconds (float): time of one call, best of repeat
+        result: result of the last call
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def full_frame(ps, filter_type):
+    """Filters the whole image, then restores it outside of the selection
+    """
+    img = ps.img
+    filtered = add_filter(img, filter_type)
+    outside = ~ps.masks[0][1].to_array()
+    filtered[outside] = img[outside]
+    return filtered
+
+
+def main(args):
+    samples = load_samples(args)
+    ps = SimplePhotoshop()
+    allocating = SimplePhotoshop()
+    allocating.SCRATCH_EDITS = ()  # Every rotation allocates its output
+
+    seconds = dict()
+
+    def record(name, baseline, optimized):
+        total = seconds.setdefault(name, [0., 0.])
+        total[0] += baseline
+        total[1] += optimized
+
+    for image_path, mask in samples:
+        for photoshop in [ps, allocating]:
+            photoshop.control('open', {'image_path': image_path})
+            photoshop.masks = [('0', mask)]
+        img = ps.img
+        outside = ~mask.to_array()
+
+        # Filters only run on the selection's rectangle
+        for filter_type in ["gaussian", "black_and_white"]:
+            arguments = {'filter_type': filter_type}
+            base, reference = timed(lambda: full_frame(ps, filter_type),
+                                    args.repeat)
+            opt, edited = timed(lambda: ps.edit('filter', arguments),
+                                args.repeat)
+            record("filter " + filter_type + " (selection)", base, opt)
+            assert edited.shape == img.shape
+            assert (edited[outside] == img[outside]).all()
+            if filter_type == "gaussian":
+                # The rectangle is widened by the kernel radius, same pixels
+                assert (edited == reference).all()
+
+        # Rotations of a selection reuse their output buffer
+        arguments = {'degree': 30}
+        base, reference = timed(
+            lambda: allocating.edit('rotate', arguments), args.repeat)
+        opt, edited = timed(lambda: ps.edit('rotate', arguments), args.repeat)
+        record("rotate (selection)", base, opt)
+        assert (edited == reference).all()
+        assert not np.may_share_memory(edited, ps._scratch)
+
+        # Crops are views, the selection is cropped alongside
+        top, left, bottom, right = mask.bbox()
+
+        def copy_crop():
+            cropped = img[top:bottom, left:right].copy()
+            masks = [('0', util.to_mask(mask.to_array()[top:bottom, left:right]))]
+            return cropped, masks
+
+        def view_crop():
+            ps.history.reset()
+            ps.history._background = ps.img = img
+            ps.masks = [('0', mask)]
+            assert ps.execute('crop', {})[0]
+            return ps.img, ps.masks
+
+        base, (reference, reference_masks) = timed(copy_crop, args.repeat)
+        opt, (cropped, masks) = timed(view_crop, args.repeat)
+        record("crop (selection)", base, opt)
+        assert np.shares_memory(cropped, img)
+        assert (cropped == reference).all()
+        assert masks == reference_masks
+
+        # Undo restores the image and drops the cropped selection
+        assert ps.control('undo')[0]
+        assert ps.img.shape == img.shape and len(ps.masks) == 0
+
+        # Cost of a copy grows with the cropped area, a view's doesn't
+        height, width = img.shape[:2]
+        bbox = [1, 1, height - 1, width - 1]
+
+        def copy_border():
+            return img[1:height - 1, 1:width - 1].copy()
+
+        def view_border():
+            ps.history.reset()
+            ps.history._background = ps.img = img
+            ps.masks = []
+            assert ps.execute('crop', {'bbox': bbox})[0]
+            return ps.img
+
+        base, reference = timed(copy_border, args.repeat)
+        opt, cropped = timed(view_border, args.repeat)
+        record("crop (1 pixel border)", base, opt)
+        assert (cropped == reference).all()
+
+    print("{} images, edits on the first selection of each, "
+          "best of {}".format(len(samples), args.repeat))
+    print("{:<36}{:>12}{:>12}".format("", "before ms", "after ms"))
+    for name, (base, opt) in seconds.items():
+        print("{:<36}{:>12.2f}{:>12.2f}".format(
+            name, base / len(samples) * 1e3, opt / len(samples) * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cost of filter, rotate & crop edits on a selection")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+
+ATTRIBUTES = ["brightness", "contrast", "hue", "saturation", "lightness"]
+
+
+def load_samples(args):
+    """
+    Returns:
+        samples (list): list of (image_path, list of Mask)
+    """
+    agendas = util.load_from_pickle(args.agendas)
+    samples = []
+    for agenda in agendas:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = []
+        for goal in agenda:
+            for slot in goal.get('slots', []):
+                if slot['slot'] == 'object_mask_str':
+                    masks.append(util.to_mask(slot['value']))
+        samples.append((image_path, masks))
+    return samples[:args.num]
+
+
+def random_edit(rng):
+    if rng.random() < 0.8:
+        return "adjust", {"attribute": rng.choice(ATTRIBUTES),
+                          "adjust_value": rng.randint(-50, 50)}
+    return "adjust_color", {"color": rng.choice(["red", "green", "blue"])}
+
+
+def session(ps, image_path, masks, rng, args, mode):
+    """
+    Random edits, undos & redos, checked against full copies of every image
+    Returns:
+        full_bytes (int): bytes of storing every edited image
+        undo_time (float): seconds spent in undo & redo
+        restore_time (float): seconds spent restoring every image of
+                              the history after from_json
+    """
+    ps.control('open', {'image_path': image_path})
+    expected = [ps.img]  # Images of the history, expected[0] is background
+    ptr = 0
+    undo_time = 0.
+    for _ in range(args.steps):
+        step = rng.random()
+        if step < 0.2 and ptr > 0:
+            start = time.perf_counter()
+            assert ps.control('undo', {})[0]
+            undo_time += time.perf_counter() - start
+            ptr -= 1
+        elif step < 0.3 and ptr < len(expected) - 1:
+            start = time.perf_counter()
+            assert ps.control('redo', {})[0]
+            undo_time += time.perf_counter() - start
+            ptr += 1
+        else:
+            if rng.random() < 0.7 and len(masks) > 0:
+                mask = rng.choice(masks)
+                ps.control('load_mask_strs', {'mask_strs': [('0', mask)]})
+            else:
+                ps.control('deselect', {})
+            edit_type, arguments = random_edit(rng)
+            assert ps.execute(edit_type, arguments)[0]
+            expected = expected[:ptr + 1] + [ps.img]
+            ptr += 1
+        assert (ps.img == expected[ptr]).all()
+
+    # Serialized history restores the same images
+    restored = SimplePhotoshop(history={"mode": mode})
+    restored.history.from_json(json.loads(json.dumps(ps.history.to_json())))
+    start = time.perf_counter()
+    while restored.history.hasPreviousHistory():
+        _, img = restored.history.undo()
+    restore_time = time.perf_counter() - start
+    assert (img == expected[0]).all()
+    for image in expected[1:]:
+        start = time.perf_counter()
+        _, img = restored.history.redo()
+        restore_time += time.perf_counter() - start
+        assert (img == image).all()
+
+    return sum(img.nbytes for img in expected[1:]), undo_time, restore_time
+
+
+def main(args):
+    samples = load_samples(args)
+
+    print("{} sessions, {} steps each, keyframe every {} edits".format(
+        len(samples), args.steps, args.keyframe_interval))
+    print("Undo/redo pixel identical to full copies")
+    print("{:<12}{:>8}{:>12}{:>10}{:>16}{:>12}".format(
+        "mode", "edits", "frames MB", "of full", "undo/redo ms", "restore ms"))
+    for mode in args.modes:
+        rng = random.Random(0)
+        config = {"mode": mode, "keyframe_interval": args.keyframe_interval,
+                  "max_bytes": None}
+        full_bytes, frame_bytes, edits = 0, 0, 0
+        undo_time, restore_time = 0., 0.
+        for image_path, masks in samples:
+            ps = SimplePhotoshop(history=config)
+            nbytes, seconds, restore_seconds = session(
+                ps, image_path, masks, rng, args, mode)
+            full_bytes += nbytes
+            frame_bytes += ps.history.nbytes
+            undo_time += seconds
+            restore_time += restore_seconds
+            edits += len(ps.history)
+        print("{:<12}{:>8}{:>12.1f}{:>10.1%}{:>16.2f}{:>12.2f}".format(
+            mode, edits, frame_bytes / 2**20, frame_bytes / full_bytes,
+            undo_time / max(edits, 1) * 1e3,
+            restore_time / max(edits, 1) * 1e3))
+
+        # Budget folds the oldest edits into the background
+        config["max_bytes"] = 0
+        ps = SimplePhotoshop(history=config)
+        image_path, masks = samples[0]
+        ps.control('open', {'image_path': image_path})
+        for _ in range(args.keyframe_interval + 1):
+            ps.execute(*random_edit(rng))
+        assert ps.history.hasPreviousHistory()
+        while ps.history.hasPreviousHistory():
+            assert ps.control('undo', {})[0]
+        assert (ps.img != ps.background).any()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory & undo cost of EditHistory modes")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=30)
+    parser.add_argument('--keyframe_interval', type=int, default=8)
+    parser.add_argument('--modes', type=str, nargs='*',
+                        default=["delta", "replay"])
+    args = parser.parse_args()
+
+    main(args)
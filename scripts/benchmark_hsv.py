@@ -0,0 +1,117 @@
+import argparse
+import os
+import random
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import cv2
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.sps.edit import adjust_batch
+
+HSV_ATTRIBUTES = ["hue", "saturation", "lightness"]
+
+
+def load_samples(args):
+    samples = []
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        samples.append((image_path, masks))
+    return samples
+
+
+def run(ps, img, edits, mask):
+    """
+    Returns:
+        seconds (float): time of all edits & reading the final image
+        saved_seconds (float): also saving the history,
+                               which stores the frames of unread images
+        img (np.ndarray): final image
+    """
+    ps.reset()
+    ps.history._background = ps.background = ps.img = img
+    ps.masks = [] if mask is None else [('0', mask)]
+    start = time.perf_counter()
+    for attribute, value in edits:
+        ps.execute('adjust', {'attribute': attribute, 'adjust_value': value})
+    img = ps.img
+    seconds = time.perf_counter() - start
+    ps.history.to_json()
+    return seconds, time.perf_counter() - start, img
+
+
+def main(args):
+    samples = load_samples(args)
+    print("{} HSV edits per run, history is the delta history".format(
+        args.edits))
+    print("{:<24}{:>12}{:>14}{:>14}{:>12}".format(
+        "", "", "ms/edit", "w/ saving", "drift"))
+    for size in [None] + args.sizes:
+        photoshops = {"rgb": SimplePhotoshop(),
+                      "hsv_buffer": SimplePhotoshop(hsv_buffer=True)}
+        seconds = {name: 0. for name in photoshops}
+        saved_seconds = {name: 0. for name in photoshops}
+        drift = {name: [] for name in photoshops}
+        num_edits = 0
+        for i, (image_path, masks) in enumerate(samples):
+            rng = random.Random(i)
+            edits = [(rng.choice(HSV_ATTRIBUTES), rng.choice([-10, -5, 5, 10]))
+                     for _ in range(args.edits)]
+            img = util.imread(image_path)
+            if size is not None:
+                height, width = size
+                img = cv2.resize(img, (width, height))
+                masks = []  # Selections are at the original size
+            # Mean distance to a single HSV round trip with all edits
+            reference = adjust_batch(img, [("adjust", {"attribute": a,
+                                                       "adjust_value": v})
+                                           for a, v in edits])
+            for mask in [None] + masks[:1]:
+                expected = reference
+                if mask is not None:
+                    expected = reference.copy()
+                    outside = ~mask.to_array()
+                    expected[outside] = img[outside]
+                for name, ps in photoshops.items():
+                    s, saved_s, edited = run(ps, img, edits, mask)
+                    seconds[name] += s
+                    saved_seconds[name] += saved_s
+                    diff = np.abs(edited.astype(np.int16) - expected)
+                    drift[name].append(diff.mean())
+                num_edits += len(edits)
+
+        label = "original" if size is None else "{}x{}".format(*size)
+        for name in photoshops:
+            print("{:<24}{:>12}{:>14.2f}{:>14.2f}{:>12.3f}".format(
+                label, name, seconds[name] / num_edits * 1e3,
+                saved_seconds[name] / num_edits * 1e3,
+                np.mean(drift[name])))
+
+
+def size(string):
+    height, width = string.split('x')
+    return int(height), int(width)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cost & drift of HSV edits with the HSV working buffer, "
+                    "per image size, selections at the original size only")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--edits', type=int, default=10)
+    parser.add_argument('--sizes', type=size, nargs='*',
+                        default=[(1080, 1920)])
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+
+ATTRIBUTES = ["brightness", "contrast", "hue", "saturation", "lightness"]
+
+
+def load_samples(args):
+    samples = []
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        samples.append((image_path, masks))
+    return samples
+
+
+def random_steps(rng, masks, num_steps):
+    """
+    Dialogue like edits: runs of small adjustments of one attribute
+    on one selection, with undos & redos in between
+    Returns:
+        steps (list): list of ("edit", mask, attribute, value) | ("undo",) | ("redo",)
+    """
+    steps = []
+    while len(steps) < num_steps:
+        mask = rng.choice(masks) if len(masks) > 0 and rng.random() < 0.7 \
+            else None
+        attribute = rng.choice(ATTRIBUTES)
+        for _ in range(rng.randint(1, 4)):
+            steps.append(("edit", mask, attribute, rng.choice([-10, 10, 20])))
+        for _ in range(rng.randint(0, 2)):
+            steps.append((rng.choice(["undo", "redo"]),))
+    return steps[:num_steps]
+
+
+def run(ps, image_path, steps, read_every_step):
+    """
+    Returns:
+        seconds (dict): time of edits, undo & redo, and image reads
+        images (list): image after each step
+    """
+    seconds = {"edit": 0., "undo/redo": 0., "read": 0.}
+    ps.control('open', {'image_path': image_path})
+    images = []
+    for step in steps:
+        start = time.perf_counter()
+        if step[0] == "edit":
+            _, mask, attribute, value = step
+            ps.masks = [] if mask is None else [('0', mask)]
+            assert ps.execute('adjust', {'attribute': attribute,
+                                         'adjust_value': value})[0]
+            seconds["edit"] += time.perf_counter() - start
+        else:
+            ps.control(step[0], {})
+            seconds["undo/redo"] += time.perf_counter() - start
+        if read_every_step:
+            start = time.perf_counter()
+            images.append(ps.img)
+            seconds["read"] += time.perf_counter() - start
+    return seconds, images
+
+
+def merged_reference(image_path, ps):
+    """
+    Renders the layer stack of ps eagerly, one destructive edit per layer
+    """
+    reference = SimplePhotoshop(history={"mode": "delta"})
+    reference.control('open', {'image_path': image_path})
+    for layer in ps.history.stack:
+        reference.masks = layer.masks
+        assert reference.execute(layer.edit_type, layer.args)[0]
+    return reference.img
+
+
+def main(args):
+    samples = load_samples(args)
+    modes = ["delta", "parametric"]
+    print("{} sessions, {} steps each".format(len(samples), args.steps))
+    print("{:<12}{:>8}{:>10}{:>14}{:>12}{:>14}".format(
+        "mode", "reads", "edit ms", "undo/redo ms", "read ms", "layers/edits"))
+    for read_every_step in [True, False]:
+        for mode in modes:
+            seconds = {"edit": 0., "undo/redo": 0., "read": 0.}
+            counts = {"edit": 0, "undo/redo": 0, "read": 0}
+            layers, edits = 0, 0
+            for i, (image_path, masks) in enumerate(samples):
+                steps = random_steps(random.Random(i), masks, args.steps)
+                ps = SimplePhotoshop(history={"mode": mode})
+                s, images = run(ps, image_path, steps, read_every_step)
+                for key in seconds:
+                    seconds[key] += s[key]
+                counts["edit"] += sum(step[0] == "edit" for step in steps)
+                counts["undo/redo"] += sum(step[0] != "edit" for step in steps)
+                counts["read"] += len(images)
+
+                # Final read, e.g. when the turn's image slot is read
+                start = time.perf_counter()
+                img = ps.img
+                seconds["read"] += time.perf_counter() - start
+                counts["read"] += 1
+
+                if mode == "parametric":
+                    layers += len(ps.history.stack)
+                    edits += ps.history._ptr + 1
+                    # Layers render as their merged edits, also when restored
+                    assert (img == merged_reference(image_path, ps)).all()
+                    restored = SimplePhotoshop(history={"mode": mode})
+                    restored.history.from_json(
+                        json.loads(json.dumps(ps.history.to_json())))
+                    assert (restored.history.image_fn()() == img).all()
+
+            print("{:<12}{:>8}{:>10.2f}{:>14.2f}{:>12.2f}{:>14}".format(
+                mode, "every" if read_every_step else "last",
+                seconds["edit"] / counts["edit"] * 1e3,
+                seconds["undo/redo"] / max(counts["undo/redo"], 1) * 1e3,
+                seconds["read"] / counts["read"] * 1e3,
+                "{}/{}".format(layers, edits) if mode == "parametric" else "-"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Edit, undo & render cost of the parametric layer stack")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=30)
+    args = parser.parse_args()
+
+    main(args)
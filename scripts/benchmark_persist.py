@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie import util
+from cie.photoshop.photoshop import SimplePhotoshopAgent
+
+ATTRIBUTES = ["brightness", "contrast", "hue", "saturation", "lightness"]
+
+
+def directory_bytes(root):
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def run_session(image_path, masks, rng, args, blobs):
+    """
+    Edits with one session record per turn, as run_realuser.step does
+    Returns:
+        seconds (float): time spent in to_json
+        restore_seconds (float): time spent in from_json
+        record_bytes (int): bytes of all session records
+        images (list): history images, to check restores
+    """
+    ps = SimplePhotoshopAgent()
+    ps.reset()
+    ps.control('open', {'image_path': image_path})
+    seconds, restore_seconds, record_bytes = 0., 0., 0
+    for _ in range(args.turns):
+        if len(masks) > 0 and rng.random() < 0.7:
+            ps.control('load_mask_strs',
+                       {'mask_strs': [(0, rng.choice(masks))]})
+        else:
+            ps.control('deselect', {})
+        ps.execute("adjust", {"attribute": rng.choice(ATTRIBUTES),
+                              "adjust_value": rng.randint(-50, 50)})
+
+        start = time.perf_counter()
+        record = json.dumps(ps.to_json(blobs))
+        seconds += time.perf_counter() - start
+        record_bytes += len(record)
+
+        # Every request restores the photoshop from the last record
+        record = json.loads(record)
+        start = time.perf_counter()
+        ps.from_json(record, blobs)
+        restore_seconds += time.perf_counter() - start
+
+    images = []
+    while ps.history.hasPreviousHistory():
+        images.append(ps.history.undo()[1])
+    return seconds, restore_seconds, record_bytes, images
+
+
+def main(args):
+    samples = []
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        samples.append((image_path, masks))
+
+    blob_dir = tempfile.mkdtemp()
+    blobs = util.DirectoryStore(blob_dir)
+    results = {}
+    for name, store in [("inline", None), ("blobs", blobs)]:
+        rng = random.Random(0)
+        seconds, restore_seconds, record_bytes, images = 0., 0., 0, []
+        for image_path, masks in samples:
+            s, r, b, i = run_session(image_path, masks, rng, args, store)
+            seconds += s
+            restore_seconds += r
+            record_bytes += b
+            images.append(i)
+        results[name] = (seconds, restore_seconds, record_bytes, images)
+
+    # Restored histories are identical
+    for inline, stored in zip(results["inline"][3], results["blobs"][3]):
+        assert len(inline) == len(stored)
+        for a, b in zip(inline, stored):
+            assert (a == b).all()
+
+    n = len(samples) * args.turns
+    print("{} sessions, {} turns each, restored histories identical".format(
+        len(samples), args.turns))
+    print("{:<10}{:>12}{:>14}{:>18}{:>18}".format(
+        "", "to_json ms", "from_json ms", "record KB/turn", "blob KB/turn"))
+    for name in ["inline", "blobs"]:
+        seconds, restore_seconds, record_bytes, _ = results[name]
+        blob_bytes = directory_bytes(blob_dir) if name == "blobs" else 0
+        print("{:<10}{:>12.2f}{:>14.2f}{:>18.1f}{:>18.1f}".format(
+            name, seconds / n * 1e3, restore_seconds / n * 1e3,
+            record_bytes / n / 1024, blob_bytes / n / 1024))
+    shutil.rmtree(blob_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per turn cost of persisting the photoshop state")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=10)
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie import util
+from cie.photoshop.photoshop import SimplePhotoshopAgent
+
+
+def main(args):
+    rng = random.Random(0)
+    full_time, preview_time, cached_time = 0., 0., 0.
+    full_bytes, preview_bytes, turns = 0, 0, 0
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        ps = SimplePhotoshopAgent()
+        ps.reset()
+        ps.control('open', {'image_path': image_path})
+        for _ in range(args.turns):
+            if len(masks) > 0:
+                ps.control('load_mask_strs',
+                           {'mask_strs': [(0, rng.choice(masks))]})
+            ps.execute('adjust', {'attribute': 'brightness',
+                                  'adjust_value': rng.randint(-50, 50)})
+            util.codec_cache.clear()
+
+            # Response image before previews
+            start = time.perf_counter()
+            full = util.img_to_b64(ps.get_image(), args.profile)
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            preview = ps.get_preview_b64(args.max_side, args.profile)
+            preview_time += time.perf_counter() - start
+
+            # Same version, e.g. a reset or a turn without edits
+            start = time.perf_counter()
+            assert ps.get_preview_b64(args.max_side, args.profile) is preview
+            cached_time += time.perf_counter() - start
+
+            img = util.b64_to_img(preview)
+            assert max(img.shape[:2]) <= args.max_side
+            assert (img.shape[0] >= img.shape[1]) == \
+                (ps.img.shape[0] >= ps.img.shape[1])
+            full_bytes += len(full)
+            preview_bytes += len(preview)
+            turns += 1
+
+    print("{} turns, {} profile, previews at most {} px".format(
+        turns, args.profile, args.max_side))
+    print("{:<24}{:>10}{:>12}".format("", "ms/turn", "KB/turn"))
+    print("{:<24}{:>10.2f}{:>12.1f}".format(
+        "full resolution", full_time / turns * 1e3, full_bytes / turns / 1024))
+    print("{:<24}{:>10.2f}{:>12.1f}".format(
+        "preview", preview_time / turns * 1e3, preview_bytes / turns / 1024))
+    print("{:<24}{:>10.3f}{:>12.1f}".format(
+        "preview, same version", cached_time / turns * 1e3,
+        preview_bytes / turns / 1024))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per turn cost of display images in web UI responses")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--max_side', type=int, default=400)
+    parser.add_argument('--profile', type=str, default='png')
+    args = parser.parse_args()
+
+    main(args)
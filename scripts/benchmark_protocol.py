@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import requests
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.transport import HTTPTransport, PhotoshopHTTPServer, encode_frame
+
+MODES = ["legacy", "form pooled", "batch"]
+
+
+class LegacyTransport(object):
+    """
+    SimplePhotoshopClient before /batch: a new connection per POST,
+    base64 payloads in form fields, one POST per command and for the check
+    """
+
+    def __init__(self, uri):
+        self.action_uri = uri + 'action'
+
+    def post(self, action, intent, args):
+        data = {'action': action, 'intent': intent, 'args': json.dumps(args)}
+        res = requests.post(self.action_uri, data=data)
+        res.raise_for_status()
+        return res.json()
+
+    def batch(self, commands):
+        for action, intent, args in commands:
+            if 'mask_strs' in args:
+                args = {'mask_strs': [[idx, mask.to_b64()]
+                                      for idx, mask in args['mask_strs']]}
+            self.post(action, intent, args)
+        check_obj = self.post('control', 'check', {})
+        return [], util.blob_store.put_b64(check_obj["b64_img_str"]), \
+            util.blob_store.put_b64(check_obj["masked_b64_img_str"])
+
+
+def load_samples(args):
+    samples = []
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        if len(masks) > 0:
+            samples.append((image_path, masks))
+    return samples
+
+
+def main(args):
+    server = PhotoshopHTTPServer(SimplePhotoshop(), ("localhost", 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    form = HTTPTransport(server.uri)
+    form.use_batch = False
+    transports = {"legacy": LegacyTransport(server.uri),
+                  "form pooled": form,
+                  "batch": HTTPTransport(server.uri)}
+
+    seconds = {mode: 0. for mode in MODES}
+    turns = 0
+    for i, (image_path, masks) in enumerate(load_samples(args)):
+        for mode in MODES:
+            transport = transports[mode]
+            transport.batch([('control', 'open', {'image_path': image_path})])
+            local = SimplePhotoshop()  # Reference of the served photoshop
+            local.control('open', {'image_path': image_path})
+            rng = random.Random(i)  # Same turns for every mode
+            for _ in range(args.turns):
+                mask = rng.choice(masks)
+                commands = [
+                    ('control', 'load_mask_strs', {'mask_strs': [('0', mask)]}),
+                    ('edit', 'adjust', {'attribute': 'brightness',
+                                        'adjust_value': rng.randint(-50, 50)})]
+                # Nothing cached from previous turns or modes
+                util.blob_store.clear()
+                util.codec_cache.clear()
+                start = time.perf_counter()
+                _, img, masked_img = transport.batch(commands)
+                seconds[mode] += time.perf_counter() - start
+
+                for action, intent, arguments in commands:
+                    getattr(local, 'control' if action == 'control'
+                            else 'execute')(intent, arguments)
+                assert (util.blob_store.get_image(img) == local.img).all()
+                assert (util.blob_store.get_image(masked_img) ==
+                        local.get_image(plot_mask=True)).all()
+                turns += 1
+    turns //= len(MODES)
+
+    # A retried batch is applied once
+    binary = transports["batch"]
+    history = server.service.photoshop.history
+    num_edits = len(history)
+    body = encode_frame({'id': 'retry', 'check': False, 'commands': [
+        {'action': 'edit', 'intent': 'adjust',
+         'args': {'attribute': 'brightness', 'adjust_value': 10}}]})
+    assert binary._post_batch(body) == binary._post_batch(body)
+    assert len(history) == num_edits + 1
+
+    print("{} turns of load_mask_strs, adjust & check, "
+          "images identical to a local photoshop".format(turns))
+    for mode in MODES:
+        print("{:<16}{:>10.2f} ms/turn".format(mode,
+                                               seconds[mode] / turns * 1e3))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per turn cost of photoshop client protocols "
+                    "against a local PhotoshopHTTPServer")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=10)
+    args = parser.parse_args()
+
+    main(args)
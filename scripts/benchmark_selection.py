@@ -0,0 +1,121 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import cv2
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.sps.edit import adjust
+
+
+def legacy_mask_region(img, masks, edit_func):
+    """
+    Previous Selector.mask_region on 3 channel 0/255 mask images
+    """
+    mask = np.zeros_like(img)
+    for object_mask in masks:
+        mask = cv2.bitwise_or(mask, object_mask)
+    inv_mask = cv2.bitwise_not(mask)
+    inv_masked_img = cv2.bitwise_and(inv_mask, img)
+
+    edited_img = edit_func(img)
+    masked_edited_img = cv2.bitwise_and(mask, edited_img)
+    return masked_edited_img + inv_masked_img
+
+
+def load_samples(args):
+    """
+    Returns:
+        samples (list): list of (image_path, list of Mask)
+    """
+    agendas = util.load_from_pickle(args.agendas)
+    samples = []
+    for agenda in agendas:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = []
+        for goal in agenda:
+            for slot in goal.get('slots', []):
+                if slot['slot'] == 'object_mask_str':
+                    masks.append(util.to_mask(slot['value']))
+        if len(masks) > 0:
+            samples.append((image_path, masks[:args.num_masks]))
+    return samples[:args.num]
+
+
+def best_of(func, repeat):
+    """
+    Returns:
+        result: return value of the last call
+        seconds (float): best of repeat
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(args):
+    samples = load_samples(args)
+    adjust_args = {'attribute': 'brightness', 'adjust_value': 20}
+
+    legacy_time, cold_time, warm_time, edit_time = 0., 0., 0., 0.
+    for image_path, masks in samples:
+        ps = SimplePhotoshop()
+        ps.control('open', {'image_path': image_path})
+        ps.control('load_mask_strs', {'mask_strs': [
+            (str(idx), mask) for idx, mask in enumerate(masks)]})
+        img = ps.img
+        mask_imgs = [mask.to_img() for mask in masks]
+
+        def edit_func(img):
+            return adjust(img, adjust_args['attribute'],
+                          adjust_args['adjust_value'])
+
+        _, seconds = best_of(lambda: edit_func(img), args.repeat)
+        edit_time += seconds
+
+        expected, seconds = best_of(
+            lambda: legacy_mask_region(img, mask_imgs, edit_func), args.repeat)
+        legacy_time += seconds
+
+        # First edit builds the composite selection
+        start = time.perf_counter()
+        edited_img = ps.edit('adjust', adjust_args)
+        cold_time += time.perf_counter() - start
+        assert (edited_img == expected).all()
+
+        # Following edits reuse the cached selection
+        _, seconds = best_of(lambda: ps.edit('adjust', adjust_args),
+                             args.repeat)
+        warm_time += seconds
+
+    n = len(samples)
+    print("{} images, up to {} masks each".format(n, args.num_masks))
+    print("{:<24}{:>10}{:>14}".format("", "ms/edit", "vs edit ms"))
+    for name, seconds in [("full frame edit", edit_time), ("legacy", legacy_time),
+                          ("cached (first edit)", cold_time),
+                          ("cached (later edits)", warm_time)]:
+        print("{:<24}{:>10.2f}{:>14.2f}".format(
+            name, seconds / n * 1e3, (seconds - edit_time) / n * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Selection compositing cost of Selector.mask_region")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=100)
+    parser.add_argument('--num_masks', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+import cv2
+import numpy as np
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.sps.edit.filter import add_filter, filter_overlap
+from cie.photoshop.sps.tiles import TileScheduler
+
+EDITS = [
+    ("brightness", "adjust", {"attribute": "brightness", "adjust_value": 30}),
+    ("hue", "adjust", {"attribute": "hue", "adjust_value": 20}),
+    ("adjust_color", "adjust_color", {"color": "red"}),
+    ("batch", "batch", {"edits": [
+        ["adjust", {"attribute": "contrast", "adjust_value": 20}],
+        ["adjust", {"attribute": "saturation", "adjust_value": -30}]]}),
+]
+
+
+def load_samples(args):
+    """
+    Returns:
+        samples (list): list of (image, selection Region) upscaled by args.scale
+    """
+    samples = []
+    for agenda in util.load_from_pickle(args.agendas)[:args.num]:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        img = util.imread(image_path)
+        size = (img.shape[1] * args.scale, img.shape[0] * args.scale)
+        img = cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        mask = None
+        if len(masks) > 0:  # Largest selection
+            mask = max(masks, key=lambda m: m.to_array().sum()).to_array()
+            mask = cv2.resize(mask.view(np.uint8), size,
+                              interpolation=cv2.INTER_NEAREST).astype(bool)
+            mask = util.to_mask(mask)
+        samples.append((img, mask))
+    return samples
+
+
+def time_edit(ps, img, mask, edit_type, arguments, repeat):
+    """
+    Returns:
+        seconds (float): per edit
+        edited_img (np.ndarray)
+    """
+    seconds = 0.
+    for i in range(repeat + 1):  # First run warms up
+        ps.control('load', {'b64_img_str': img})
+        if mask is not None:
+            ps.masks = [('0', mask)]
+        # Edit pass only, execute also records the history
+        start = time.perf_counter()
+        edited_img = ps.edit(edit_type, arguments)
+        if i > 0:
+            seconds += time.perf_counter() - start
+        assert edited_img is not None
+    return seconds / repeat, edited_img
+
+
+def main(args):
+    samples = load_samples(args)
+    height, width = samples[0][0].shape[:2]
+    print("{} images of about {}x{}, {} CPUs, results identical to 1 thread".format(
+        len(samples), width, height, os.cpu_count()))
+
+    cases = [(name + suffix, edit_type, arguments, use_mask)
+             for use_mask, suffix in [(False, ""), (True, " (selection)")]
+             for name, edit_type, arguments in EDITS]
+    header = "{:<28}".format("ms/edit") + "".join(
+        "{:>10}".format("{} thr".format(n)) for n in args.threads)
+    print(header)
+
+    reference = {}
+    for name, edit_type, arguments, use_mask in cases:
+        row = []
+        for num_threads in args.threads:
+            ps = SimplePhotoshop(tiles={"num_threads": num_threads,
+                                        "min_pixels": args.min_pixels})
+            seconds = 0.
+            for i, (img, mask) in enumerate(samples):
+                if use_mask and mask is None:
+                    continue
+                s, edited = time_edit(ps, img, mask if use_mask else None,
+                                      edit_type, arguments, args.repeat)
+                seconds += s
+                key = (name, i)
+                if key not in reference:
+                    reference[key] = edited
+                assert (edited == reference[key]).all()
+            row.append(seconds / len(samples) * 1e3)
+        print("{:<28}".format(name) +
+              "".join("{:>10.2f}".format(ms) for ms in row))
+
+    # Neighbourhood kernel, bands read overlapping rows
+    overlap = filter_overlap("gaussian")
+    row = []
+    for num_threads in args.threads:
+        scheduler = TileScheduler(num_threads, min_pixels=args.min_pixels)
+        seconds = 0.
+        for img, _ in samples:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                edited = scheduler.run(
+                    img, lambda band: add_filter(band, "gaussian"), overlap)
+            seconds += (time.perf_counter() - start) / args.repeat
+            assert (edited == add_filter(img, "gaussian")).all()
+        row.append(seconds / len(samples) * 1e3)
+    print("{:<28}".format("gaussian, overlap {}".format(overlap)) +
+          "".join("{:>10.2f}".format(ms) for ms in row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Edit time of tiled SimplePhotoshop edits by thread count")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=4,
+                        help="upscaling of the sampled images")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min_pixels', type=int, default=1024 * 1024)
+    parser.add_argument('--threads', type=int, nargs='*', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,105 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie import util
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.transport import SharedMemoryPhotoshopServer, SharedMemoryTransport
+
+
+def serve(address, authkey):
+    server = SharedMemoryPhotoshopServer(SimplePhotoshop(), address, authkey)
+    server.serve_forever()
+
+
+def http_payloads(ps, mask):
+    """
+    Codec work of one HTTP turn without the network:
+    mask to b64 and back, image & masked image to b64 and back
+    """
+    util.to_mask(mask.to_b64())
+    for img in [ps.get_image(plot_mask=False), ps.get_image(plot_mask=True)]:
+        util.blob_store.put_b64(util.img_to_b64(img))
+
+
+def main(args):
+    address = os.path.join(tempfile.mkdtemp(), 'photoshop.sock')
+    authkey = os.urandom(16)
+    server = multiprocessing.Process(target=serve, args=(address, authkey))
+    server.daemon = True
+    server.start()
+    for _ in range(100):  # Wait for the socket
+        if os.path.exists(address):
+            break
+        time.sleep(0.05)
+    transport = SharedMemoryTransport(address, authkey)
+
+    rng = random.Random(0)
+    agendas = util.load_from_pickle(args.agendas)[:args.num]
+    shm_time, http_time, turns = 0., 0., 0
+    for agenda in agendas:
+        image_path = os.path.join(args.dir, 'image',
+                                  os.path.basename(agenda[0]['slots'][0]['value']))
+        masks = [util.to_mask(slot['value']) for goal in agenda
+                 for slot in goal.get('slots', [])
+                 if slot['slot'] == 'object_mask_str']
+        if len(masks) == 0:
+            continue
+
+        local = SimplePhotoshop()  # Reference of the remote photoshop
+        local.control('open', {'image_path': image_path})
+        transport.request('control', 'open', {'image_path': image_path})
+        for _ in range(args.turns):
+            mask = rng.choice(masks)
+            value = rng.randint(-50, 50)
+
+            util.blob_store.clear()
+            start = time.perf_counter()
+            transport.request('control', 'load_mask_strs',
+                              {'mask_strs': [('0', mask)]})
+            transport.request('edit', 'adjust', {'attribute': 'brightness',
+                                                 'adjust_value': value})
+            img, masked_img = transport.check()
+            shm_time += time.perf_counter() - start
+
+            local.control('load_mask_strs', {'mask_strs': [('0', mask)]})
+            local.execute('adjust', {'attribute': 'brightness',
+                                     'adjust_value': value})
+            assert (util.blob_store.get_image(img) == local.img).all()
+            assert (util.blob_store.get_image(masked_img) ==
+                    local.get_image(plot_mask=True)).all()
+
+            util.blob_store.clear()
+            start = time.perf_counter()
+            http_payloads(local, mask)
+            http_time += time.perf_counter() - start
+            turns += 1
+
+    transport.close()
+    server.terminate()
+
+    print("{} turns of load_mask_strs, adjust & check, "
+          "images identical to a local photoshop".format(turns))
+    print("{:<40}{:>10.2f} ms/turn".format(
+        "shared memory round trips", shm_time / turns * 1e3))
+    print("{:<40}{:>10.2f} ms/turn".format(
+        "HTTP payload codecs only (no network)", http_time / turns * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per turn cost of the shared memory photoshop transport")
+    parser.add_argument('--dir', type=str, default='./sampled_100')
+    parser.add_argument('--agendas', type=str,
+                        default='./sampled_100/agenda.v1.test.pickle')
+    parser.add_argument('--num', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=10)
+    args = parser.parse_args()
+
+    main(args)
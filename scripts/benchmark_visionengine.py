@@ -0,0 +1,131 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie.visionengine import VisionEngineDatabase, convert_pickle
+
+
+def private_bytes():
+    """Memory of this process not shared with others, Linux only
+    """
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Private_'):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def lookup_all(visionengine, queries):
+    for image_key, object_name in queries:
+        visionengine.select_object(image_key, object_name)
+
+
+def worker(db_path, queries, results):
+    """Opens the database & looks up every query, as a rollout worker would
+    """
+    before = private_bytes()
+    start = time.perf_counter()
+    visionengine = VisionEngineDatabase(db_path=db_path)
+    lookup_all(visionengine, queries)
+    results.put((time.perf_counter() - start, private_bytes() - before))
+
+
+def run_workers(db_path, queries, num_workers):
+    """
+    Returns:
+        seconds (float): mean open & lookup time per worker
+        nbytes (float): mean private memory added per worker
+    """
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(db_path, queries, results))
+               for _ in range(num_workers)]
+    for p in workers:
+        p.start()
+    stats = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    seconds, nbytes = zip(*stats)
+    return sum(seconds) / num_workers, sum(nbytes) / num_workers
+
+
+def main(args):
+    index_path = os.path.join(tempfile.mkdtemp(), 'visionengine.idx')
+    start = time.perf_counter()
+    convert_pickle(args.pickle, index_path)
+    convert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pickled = VisionEngineDatabase(db_path=args.pickle)
+    pickle_open = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = VisionEngineDatabase(db_path=index_path)
+    index_open = time.perf_counter() - start
+
+    # Every stored (image, object) pair, plus misses
+    queries = [(image_key, object_name)
+               for image_key, objects in pickled.db.items()
+               for object_name in objects]
+    queries += [(image_key, "unicorn") for image_key in pickled.db]
+    queries += [("img:0000000000000000", "person")]
+
+    for image_key, object_name in queries:
+        expected = pickled.select_object(image_key, object_name)
+        found = indexed.select_object(image_key, object_name)
+        assert found == expected, (image_key, object_name)
+    assert indexed.select_object(None, "person") == []
+
+    lookups = {}
+    for name, visionengine in [("pickle", pickled), ("indexed", indexed)]:
+        if name == "indexed":  # Cold lookups decode their masks
+            visionengine = VisionEngineDatabase(db_path=index_path)
+            start = time.perf_counter()
+            lookup_all(visionengine, queries)
+            lookups["indexed (cold)"] = time.perf_counter() - start
+        # Repeated lookups of recent queries hit the cache
+        recent = queries[:1000] * (len(queries) // 1000)
+        start = time.perf_counter()
+        lookup_all(visionengine, recent)
+        lookups[name] = (time.perf_counter() - start) / len(recent) * len(queries)
+
+    pickle_worker = run_workers(args.pickle, queries, args.workers)
+    index_worker = run_workers(index_path, queries, args.workers)
+
+    print("{} images, {} lookups identical, converted in {:.2f} s".format(
+        len(pickled.db), len(queries), convert_time))
+    print("{:<28}{:>14}{:>14}".format("", "pickle", "indexed"))
+    print("{:<28}{:>14.1f}{:>14.1f}".format(
+        "file size (MB)", os.path.getsize(args.pickle) / 2**20,
+        os.path.getsize(index_path) / 2**20))
+    print("{:<28}{:>14.2f}{:>14.2f}".format(
+        "open (ms)", pickle_open * 1e3, index_open * 1e3))
+    print("{:<28}{:>14.2f}{:>14.2f}".format(
+        "lookup (us)", lookups["pickle"] / len(queries) * 1e6,
+        lookups["indexed (cold)"] / len(queries) * 1e6))
+    print("{:<28}{:>14.2f}{:>14.2f}".format(
+        "lookup, recent (us)", lookups["pickle"] / len(queries) * 1e6,
+        lookups["indexed"] / len(queries) * 1e6))
+    print("{:<28}{:>14.1f}{:>14.1f}".format(
+        "worker open+lookups (ms)", pickle_worker[0] * 1e3,
+        index_worker[0] * 1e3))
+    print("{:<28}{:>14.1f}{:>14.1f}".format(
+        "worker private memory (MB)", pickle_worker[1] / 2**20,
+        index_worker[1] / 2**20))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load time, lookups & memory of the pickled and "
+                    "indexed vision engine databases")
+    parser.add_argument('--pickle', type=str,
+                        default='./sampled_100/visionengine.annotation.pickle')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    main(args)
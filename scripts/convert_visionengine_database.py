@@ -0,0 +1,29 @@
+import argparse
+import os
+import sys
+import time
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie.visionengine import convert_pickle
+
+
+def main(args):
+    start = time.time()
+    num_images = convert_pickle(args.pickle, args.save)
+    print("Converted {} images in {:.1f} seconds: {} ({:.1f} MB)".format(
+        num_images, time.time() - start, args.save,
+        os.path.getsize(args.save) / 2**20))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Converts a pickled vision engine database "
+                    "to the indexed, memory-mapped format")
+    parser.add_argument('--pickle', type=str,
+                        default='./sampled_100/visionengine.annotation.pickle')
+    parser.add_argument('--save', type=str,
+                        default='./sampled_100/visionengine.annotation.idx')
+    args = parser.parse_args()
+
+    main(args)
@@ -54,34 +54,25 @@ def main(args):
     for img, anns in tqdm(zip(imgs, annotations)):
         image_path = os.path.join(args.dir, 'image', img['file_name'])
         image = util.imread(image_path)
-        b64_img_str = util.img_to_b64(image)
+        # Keyed by the same content handle the photoshop informs
+        image_handle = util.image_handle(image)
 
-        rev_image = util.b64_to_img(b64_img_str)
-        assert (image == rev_image).all()
-
-        visionengine[b64_img_str] = {}
+        visionengine[image_handle] = {}
 
         for name in category2name_dict.values():
-            visionengine[b64_img_str][name] = list()
+            visionengine[image_handle][name] = list()
 
         for ann in anns:
             object_name = category2name_dict[ann['category_id']]
             one_dim_object_mask = annToMask(img, ann)
 
-            object_mask = np.repeat(one_dim_object_mask[..., np.newaxis], 3, axis=2)\
-                .astype(np.uint8)
-            indices = object_mask == 1
-            object_mask[indices] = 255
-
-            assert ((object_mask == 0) | (object_mask == 255)).all()
-
-            object_mask_str = util.img_to_b64(object_mask)
+            object_mask = util.Mask.from_array(one_dim_object_mask)
 
             # test reverse op
-            rev_object_mask = util.b64_to_img(object_mask_str)
-            assert (rev_object_mask == object_mask).all()
+            rev_object_mask = object_mask.to_array()
+            assert (rev_object_mask == one_dim_object_mask.astype(bool)).all()
 
-            visionengine[b64_img_str][object_name].append(object_mask_str)
+            visionengine[image_handle][object_name].append(object_mask)
 
     util.save_to_pickle(visionengine, args.save)
 
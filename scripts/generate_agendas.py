@@ -1,5 +1,4 @@
 import argparse
-import itertools
 import json
 import os
 import random
@@ -37,37 +36,19 @@ def annToMask(img, ann):
     return m
 
 
-def find_mask_centroid(mask):
-    """
-    Find the centroid of a 3 dimensional binary mask
-    """
-    assert ((mask == 0) | (mask == 255)).all()
-    X, Y, Z = mask.shape
-    moment_x = 0
-    moment_y = 0
-    moment_z = 0
-    npixels = 0
-    for x, y, z in itertools.product(range(X), range(Y), range(Z)):
-        if mask[x][y][z] == 255:
-            moment_x += x
-            moment_y += y
-            moment_z += z
-            npixels += 1
-
-    moment_x /= npixels
-    moment_y /= npixels
-    moment_z /= npixels
-    return round(moment_x), round(moment_y), round(moment_z)
-
-
 def create_gesture_click(object_mask):
     """
-    Returns a mask as gestures
+    Returns a PointRegion as gestures
+    Clicks at the centroid of the largest component, snapped onto the object
+    Args:
+        object_mask (Region)
+    Returns:
+        gesture_click (PointRegion): None if the mask is empty
     """
-    x, y, _ = find_mask_centroid(object_mask)
-    gesture_click = np.zeros_like(object_mask)
-    gesture_click[x, y] = 255
-    return gesture_click
+    centroid = object_mask.centroid(largest_component=True, snap=True)
+    if centroid is None:
+        return None
+    return util.PointRegion(object_mask.shape, *centroid)
 
 
 def build_goal(intent, slots=None):
@@ -224,27 +205,22 @@ class AdjustAgendaGenerator(object):
 
             # 4. mask_str
             if object_name != "image":
-                # From boolean to image
                 one_dim_object_mask = annToMask(img, object_ann)
-                # Convert to 3D
-                object_mask = np.repeat(
-                    one_dim_object_mask[..., np.newaxis], 3,
-                    axis=2).astype(np.uint8)
-                indices = object_mask == 1
-                object_mask[indices] = 255
-                mask_str = util.img_to_b64(object_mask)
+                mask_str = util.Mask.from_array(one_dim_object_mask)
                 mask_str_slot = util.build_slot_dict('object_mask_str',
                                                      mask_str)
 
-                # also, create gesture_slot
-                gesture_click = create_gesture_click(object_mask)
-                gesture_click_str = util.img_to_b64(gesture_click)
-                gesture_click_slot = util.build_slot_dict(
-                    'gesture_click', gesture_click_str)
                 slots = [
                     attribute_slot, adjust_value_slot, object_slot,
-                    mask_str_slot, gesture_click_slot
+                    mask_str_slot
                 ]
+
+                # also, create gesture_slot, unless the mask is empty
+                gesture_click = create_gesture_click(mask_str)
+                if gesture_click is not None:
+                    gesture_click_slot = util.build_slot_dict(
+                        'gesture_click', gesture_click)
+                    slots.append(gesture_click_slot)
             else:
                 # Without the mask_str_slot
                 slots = [attribute_slot, adjust_value_slot, object_slot]
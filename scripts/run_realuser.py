@@ -12,7 +12,7 @@ sys.path.insert(0, root_dir)
 pp = pprint.PrettyPrinter(indent=2)
 
 import numpy as np
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, abort, jsonify, request, render_template, url_for
 
 
 from cie import TrackerPortal, SystemPortal, PhotoshopPortal
@@ -35,6 +35,14 @@ def serve(argv):
     # Load Session Manager
     session = util.SessionPortal(config["session"])
 
+    # Codec profile of images sent to the browser, e.g. "jpeg" or "webp"
+    display_profile = config.get("display_profile", "png")
+    display_mime = util.get_codec(display_profile).mime
+    # Longest side of the preview images in responses, the canvas is 300px high
+    preview_max_side = config.get("preview_max_side", 400)
+    # Let the browser fetch the full resolution image after the preview
+    full_resolution = config.get("full_resolution", True)
+
     # Load agents here
     agents_config = config["agents"]
     tracker = TrackerPortal(agents_config["tracker"])
@@ -54,10 +62,44 @@ def serve(argv):
     app = Flask(
         __name__, template_folder='../app/template', static_folder='../app/static')
 
+    def add_image(obj):
+        """
+        Adds the current image to a response:
+        b64_img_str: preview, cached by image & mask version
+        image_shape: full resolution (height, width), gestures are scaled to it
+        full_img_url: full resolution image, "" if disabled or no image
+        """
+        img = photoshop.get_image()
+        obj['b64_img_str'] = photoshop.get_preview_b64(preview_max_side,
+                                                       display_profile)
+        obj['mime'] = display_mime
+        obj['image_shape'] = [] if img is None else list(img.shape[:2])
+        obj['full_img_url'] = ""
+        if img is not None and full_resolution:
+            version = (photoshop.img_version, photoshop.masks_version)
+            handle = photoshop.get_cached(
+                'display_handle', version, lambda: util.blob_store.put_image(img))
+            obj['full_img_url'] = url_for('image', handle=handle)
+        return obj
+
     @app.route("/")
     def index():
         return render_template('index.html')
 
+    @app.route("/image/<handle>", methods=["GET"])
+    def image(handle):
+        """
+        Full resolution image, immutable since handles are content addressed
+        """
+        # Fetched once, the handle may be evicted by another request
+        img = util.blob_store.get_image(handle)
+        if img is None:
+            abort(404)
+        buf = util.encode_img(img, display_profile)
+        response = Response(buf, mimetype=display_mime)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
     @app.route("/sample", methods=["POST"])
     def sample():
         """
@@ -91,11 +133,6 @@ def serve(argv):
         result, msg = photoshop.control("open", {'image_path': image_path})
         assert result
 
-        img = photoshop.get_image()
-        if img is None:
-            loaded_b64_img_str = ""
-        else:
-            loaded_b64_img_str = util.img_to_b64(img)
 
         photoshop_act = photoshop.act()
         # Intent adjust
@@ -104,8 +141,8 @@ def serve(argv):
 
         # Save to session
         turn_info = {"agenda_id": idx, "turn": 0}
-        state_json = system.state.to_json()
-        ps_json = photoshop.to_json()
+        state_json = system.state.to_json(session.blobs)
+        ps_json = photoshop.to_json(session.blobs)
         session.add_turn(session_id, state_json, ps_json, turn_info)
         session.add_policy(session_id, system.policy.__class__.__name__)
 
@@ -115,14 +152,15 @@ def serve(argv):
             goal[slot["slot"]] = slot["value"]
 
         goal["intent"] = agenda[1]["intent"]["value"]
-        object_mask = util.b64_to_img(goal["object_mask_str"])
-        object_mask_img = object_mask
 
-        object_mask_img_str = util.img_to_b64(object_mask_img)
-        goal["object_mask_img_str"] = object_mask_img_str
+        # Masks are converted to b64 strings only for the browser
+        for slot_name in ["object_mask_str", "gesture_click"]:
+            if slot_name in goal:
+                goal[slot_name] = util.to_mask(goal[slot_name]).to_b64()
+        goal["object_mask_img_str"] = goal["object_mask_str"]
 
         obj = {}
-        obj["b64_img_str"] = loaded_b64_img_str
+        add_image(obj)
         obj["goal"] = goal
         return jsonify(obj)
 
@@ -132,8 +170,8 @@ def serve(argv):
         session_id = int(request.form.get("session_id", 0))  # default to 0
         print("session_id", session_id, "step")
         dialogue = session.retrieve(session_id)
-        system.state.from_json(dialogue["system_state"])
-        photoshop.from_json(dialogue["photoshop_state"])
+        system.state.from_json(dialogue["system_state"], session.blobs)
+        photoshop.from_json(dialogue["photoshop_state"], session.blobs)
 
         # Continue doing what's supposed to be done
         user_utt = request.form.get('user_utterance', '')
@@ -146,43 +184,16 @@ def serve(argv):
             "user_utterance": user_utt,
         }
 
-        tracker.observe(user_act)
-        tracker_act = tracker.act()
-
-        # gesture_click
+        # Gestures are converted to point & box regions by the tracker
+        if click_coordinates is not None or box_coordinates is not None:
+            user_act["image_shape"] = photoshop.get_image().shape[:2]
         if click_coordinates is not None:
-            click_coordinates = json.loads(click_coordinates)
-            x = click_coordinates['x']
-            y = click_coordinates['y']
-
-            # Create gesture_click_str
-            img = photoshop.get_image()
-            gesture_click = np.zeros_like(img)
-            gesture_click[x][y][:] = 255
-            # Perhaps we can expand a little bit
-            gesture_click_str = util.img_to_b64(gesture_click)
-
-            gesture_click_slot = {'slot': 'gesture_click',
-                                  'value': gesture_click_str, 'conf': 1.0}
-
-            tracker_act["user_acts"][0]['slots'].append(gesture_click_slot)
-
-        # object_mask_str
+            user_act["gesture_click"] = json.loads(click_coordinates)
         if box_coordinates is not None:
-            box_coordinates = json.loads(box_coordinates)
-            y = box_coordinates["left"]
-            x = box_coordinates["top"]
-            width = box_coordinates["width"]
-            height = box_coordinates["height"]
+            user_act["object_mask_str"] = json.loads(box_coordinates)
 
-            object_mask = np.zeros_like(photoshop.get_image())
-            object_mask[x:x+height, y:y+width] = 255
-
-            object_mask_str = util.img_to_b64(object_mask)
-            object_mask_str_slot = {'slot': "object_mask_str",
-                                    'value': object_mask_str, 'conf': 1.0}
-
-            tracker_act["user_acts"][0]['slots'].append(object_mask_str_slot)
+        tracker.observe(user_act)
+        tracker_act = tracker.act()
 
         pp.pprint(tracker_act["user_acts"][0])
 
@@ -226,25 +237,20 @@ def serve(argv):
         photoshop.observe(system_act)
         photoshop_act = photoshop.act()
 
-        img = photoshop.get_image()
-        if img is None:
-            loaded_b64_img_str = ""
-        else:
-            loaded_b64_img_str = util.img_to_b64(img)
 
         system.observe(photoshop_act)
 
         # Record to session
         turn_info = {"user": user_utt,
                      "system": sys_utt, "turn": system.turn_id}
-        state_json = system.state.to_json()
-        ps_json = photoshop.to_json()
+        state_json = system.state.to_json(session.blobs)
+        ps_json = photoshop.to_json(session.blobs)
         session.add_turn(session_id, state_json, ps_json, turn_info)
 
         # Create return_object
         obj = {}
         obj['system_utterance'] = sys_utt
-        obj['b64_img_str'] = loaded_b64_img_str  # We need to return the image
+        add_image(obj)  # We need to return the image
         obj['last_execute_result'] = photoshop.last_execute_result
         return jsonify(obj)
 
@@ -273,18 +279,13 @@ def serve(argv):
         print("session_id", session_id, "reset")
         dialogue = session.retrieve(session_id)
         print('dialogue turns', dialogue['turns'])
-        system.state.from_json(dialogue["system_state"])
-        photoshop.from_json(dialogue["photoshop_state"])
+        system.state.from_json(dialogue["system_state"], session.blobs)
+        photoshop.from_json(dialogue["photoshop_state"], session.blobs)
 
         tracker.reset()
         system.reset()
         photoshop.reset()
 
-        img = photoshop.get_image()
-        if img is None:
-            loaded_b64_img_str = ""
-        else:
-            loaded_b64_img_str = util.img_to_b64(img)
 
         photoshop_act = photoshop.act()
         system.observe(photoshop_act)
@@ -292,14 +293,14 @@ def serve(argv):
 
         # Save to session
         turn_info = {"reset": True}
-        state_json = system.state.to_json()
-        ps_json = photoshop.to_json()
+        state_json = system.state.to_json(session.blobs)
+        ps_json = photoshop.to_json(session.blobs)
         session.add_turn(session_id, state_json, ps_json, turn_info)
 
         # Create return_object
         obj = {}
         obj['system_utterance'] = "Welcome to Wonderland!"
-        obj['b64_img_str'] = loaded_b64_img_str
+        add_image(obj)
         return jsonify(obj)
 
     app.run(host='0.0.0.0', port=2000, debug=True)
@@ -341,15 +342,15 @@ def terminal(argv):
     result, msg = photoshop.control("open", {'image_path': image_path})
     assert result
     turn_info = {"turn": 0, "agenda_idx": 10}
-    session.add_turn(session_id, system.state.to_json(),
-                     photoshop.to_json(), turn_info)
+    session.add_turn(session_id, system.state.to_json(session.blobs),
+                     photoshop.to_json(session.blobs), turn_info)
     photoshop_act = {}
     while True:
         # Load from session
         logger.info("Loading from session {}".format(session_id))
         dialogue = session.retrieve(session_id)
-        system.state.from_json(dialogue["system_state"])
-        photoshop.from_json(dialogue["photoshop_state"])
+        system.state.from_json(dialogue["system_state"], session.blobs)
+        photoshop.from_json(dialogue["photoshop_state"], session.blobs)
 
         user_utt = input("User: ")
 
@@ -372,8 +373,8 @@ def terminal(argv):
         logger.info("Saving session")
         turn_info = {"user": user_utt,
                      "system": sys_utt, "turn": system.turn_id}
-        state_json = system.state.to_json()
-        ps_json = photoshop.to_json()
+        state_json = system.state.to_json(session.blobs)
+        ps_json = photoshop.to_json(session.blobs)
         session.add_turn(session_id, state_json, ps_json, turn_info)
 
 
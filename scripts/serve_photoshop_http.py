@@ -0,0 +1,33 @@
+import argparse
+import logging
+import os
+import sys
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.transport import PhotoshopHTTPServer
+
+
+def main(args):
+    server = PhotoshopHTTPServer(SimplePhotoshop(), (args.host, args.port),
+                                 profile=args.profile)
+    print("Serving SimplePhotoshop on {}".format(server.uri))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Local SimplePhotoshop HTTP server with the /batch "
+                    "and /action endpoints, set photoshop.uri to its address")
+    parser.add_argument('--host', type=str, default='localhost')
+    parser.add_argument('--port', type=int, default=2005)
+    parser.add_argument('--profile', type=str, default='lossless-fast',
+                        help="codec profile of images in /batch responses")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,36 @@
+import argparse
+import logging
+import os
+import sys
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root_dir)
+
+from cie.photoshop.sps import SimplePhotoshop
+from cie.photoshop.transport import SharedMemoryPhotoshopServer
+
+
+def main(args):
+    if os.path.exists(args.address):  # Stale socket of a previous run
+        os.remove(args.address)
+    server = SharedMemoryPhotoshopServer(SimplePhotoshop(), args.address,
+                                         args.authkey)
+    print("Serving SimplePhotoshop on {}".format(server.address))
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Same host shared memory SimplePhotoshop server, "
+                    "set photoshop.shm_address to the same address "
+                    "and photoshop.shm_authkey to the same key")
+    parser.add_argument('--address', type=str, default='/tmp/cie-photoshop.sock')
+    parser.add_argument('--authkey', type=str, default=None,
+                        help="defaults to the CIE_PHOTOSHOP_AUTHKEY "
+                             "environment variable")
+    args = parser.parse_args()
+
+    main(args)